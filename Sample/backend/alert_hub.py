@@ -0,0 +1,184 @@
+"""
+Smart Home Cybersecurity Training Platform - Alert Fan-out Hub
+In-memory publish/subscribe hub behind the /api/alerts/stream Server-Sent
+Events endpoint. Each subscriber has its own bounded buffer, so a slow
+browser tab can only lose its own oldest alerts, never block publishers.
+"""
+
+import asyncio
+import json
+import logging
+import queue
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    """One connected SSE client."""
+
+    def __init__(self, buffer_size):
+        self.queue = queue.Queue(maxsize=buffer_size)
+        self.dropped = 0
+        self.connected_at = time.time()
+
+    def offer(self, event):
+        """Queue an event, discarding the oldest one if the buffer is full."""
+        while True:
+            try:
+                self.queue.put_nowait(event)
+                return
+            except queue.Full:
+                try:
+                    self.queue.get_nowait()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+
+
+class AsyncSubscription:
+    """
+    One SSE client served by the asyncio backend.
+    publish() may run on any thread, so events are handed to the client's
+    event loop with call_soon_threadsafe.
+    """
+
+    def __init__(self, buffer_size, loop):
+        self.queue = asyncio.Queue(maxsize=buffer_size)
+        self.loop = loop
+        self.dropped = 0
+        self.connected_at = time.time()
+
+    def offer(self, event):
+        try:
+            self.loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:
+            # Event loop already closed; the client is gone
+            pass
+
+    def _put(self, event):
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(event)
+
+
+class AlertHub:
+    """
+    Fan-out hub for security alerts.
+    Keeps a short history so reconnecting clients can resume from their
+    Last-Event-ID without missing alerts.
+    """
+
+    def __init__(self, history_size=200, buffer_size=100, max_subscribers=500):
+        """
+        Args:
+            history_size: Recent alerts kept for Last-Event-ID resume
+            buffer_size: Alerts buffered per subscriber before dropping oldest
+            max_subscribers: Maximum concurrent stream clients
+        """
+        self.buffer_size = buffer_size
+        self.max_subscribers = max_subscribers
+
+        self._lock = threading.Lock()
+        self._history = deque(maxlen=history_size)
+        self._subscribers = set()
+        # Ids start at the current time in microseconds so they keep
+        # increasing across restarts and Last-Event-ID stays meaningful
+        self._next_id = time.time_ns() // 1000
+
+        self.published = 0
+
+    def publish(self, event):
+        """
+        Assign an id to event and deliver it to every subscriber.
+        Args:
+            event: JSON-serializable dict
+        Returns:
+            The event id
+        """
+        with self._lock:
+            event_id = self._next_id
+            self._next_id += 1
+            record = (event_id, json.dumps(dict(event, id=event_id)))
+            self._history.append(record)
+            subscribers = list(self._subscribers)
+            self.published += 1
+
+        for subscription in subscribers:
+            subscription.offer(record)
+        return event_id
+
+    def subscribe(self, last_event_id=None, loop=None):
+        """
+        Register a new subscriber.
+        Alerts newer than last_event_id still in history are queued first.
+        Args:
+            last_event_id: Id of the last alert the client received
+            loop: Event loop of an asyncio client (None for threaded clients)
+        Returns:
+            Subscription, or None if max_subscribers is reached
+        """
+        if loop is not None:
+            subscription = AsyncSubscription(self.buffer_size, loop)
+        else:
+            subscription = Subscription(self.buffer_size)
+        with self._lock:
+            if len(self._subscribers) >= self.max_subscribers:
+                return None
+            if last_event_id is not None:
+                for record in self._history:
+                    if record[0] > last_event_id:
+                        subscription.offer(record)
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def stream(self, subscription, heartbeat=15.0, retry_ms=3000):
+        """
+        Generator of SSE-formatted text for one subscriber.
+        Sends a comment line every heartbeat seconds while idle, which keeps
+        proxies from closing the connection and detects gone clients.
+        """
+        try:
+            yield f"retry: {retry_ms}\n\n"
+            while True:
+                try:
+                    event_id, data = subscription.queue.get(timeout=heartbeat)
+                except queue.Empty:
+                    yield ": heartbeat\n\n"
+                    continue
+                yield f"id: {event_id}\nevent: alert\ndata: {data}\n\n"
+        finally:
+            self.unsubscribe(subscription)
+
+    async def stream_async(self, subscription, heartbeat=15.0, retry_ms=3000):
+        """Async generator equivalent of stream() for AsyncSubscription."""
+        try:
+            yield f"retry: {retry_ms}\n\n"
+            while True:
+                try:
+                    event_id, data = await asyncio.wait_for(subscription.queue.get(), heartbeat)
+                except asyncio.TimeoutError:
+                    yield ": heartbeat\n\n"
+                    continue
+                yield f"id: {event_id}\nevent: alert\ndata: {data}\n\n"
+        finally:
+            self.unsubscribe(subscription)
+
+    def stats(self):
+        with self._lock:
+            subscribers = list(self._subscribers)
+            return {
+                'subscribers': len(subscribers),
+                'max_subscribers': self.max_subscribers,
+                'published': self.published,
+                'history': len(self._history),
+                'dropped': sum(s.dropped for s in subscribers),
+                'max_buffered': max((s.queue.qsize() for s in subscribers), default=0)
+            }
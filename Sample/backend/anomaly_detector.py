@@ -0,0 +1,401 @@
+"""
+Smart Home Cybersecurity Training Platform - Batch Anomaly Scoring
+Looks at how each device's traffic behaves over time rather than at single
+messages. Detection workers record (device, time, action) for every
+message; every few seconds the recent window is scored for all devices at
+once with NumPy, and each device's features are compared with its own
+running baseline:
+
+    rate            messages in the window
+    action_entropy  Shannon entropy (bits) of the actions sent
+    burstiness      coefficient of variation of inter-arrival times
+    new_actions     share of messages with an action never seen before
+
+Each device has one baseline for daytime and one for off-hours, so a
+device that is busy at night only when it normally is passes, and one
+that is normally silent at night is caught when it is used. A device
+whose features deviate from the baseline for the current period by more
+than the threshold (in standard deviations) is reported as an Anomaly.
+
+Baselines start once a device has been seen for a full window;
+new_actions has a fixed baseline of zero, since every action a device
+normally sends has been seen by then.
+"""
+
+import logging
+import threading
+import time
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+FEATURES = ('rate', 'action_entropy', 'burstiness', 'new_actions')
+RATE, ENTROPY, BURSTINESS, NEW_ACTIONS = range(len(FEATURES))
+
+# Only an increase is suspicious for these; entropy and burstiness are two-sided
+ONE_SIDED = np.array([True, False, False, True])
+
+# Smallest standard deviation assumed per feature (and as a share of the
+# baseline mean), so a device whose baseline never varied is not flagged
+# for a tiny change. Rate also never uses less than the Poisson noise of
+# its mean, sqrt(mean): overlapping windows make the learned variance of a
+# message count an underestimate.
+STD_FLOORS = np.array([2.0, 0.25, 0.25, 0.05])
+RELATIVE_STD_FLOOR = 0.1
+
+# Baseline periods
+DAYTIME, OFF_HOURS = 0, 1
+PERIODS = 2
+
+# Action codes reserved for messages without an action and for actions
+# beyond max_actions
+NO_ACTION, OTHER_ACTION = 0, 1
+
+
+class Anomaly:
+    """One device whose recent traffic deviates from its baseline."""
+
+    __slots__ = ('device', 'score', 'events', 'reasons')
+
+    def __init__(self, device, score, events, reasons):
+        self.device = device
+        self.score = score
+        self.events = events        # Messages from the device in the window
+        self.reasons = reasons      # [(feature, value, baseline, z)], highest z first
+
+    def describe(self):
+        return ', '.join(
+            f"{feature} {value:.3g} (baseline {baseline:.3g}, z={z:.1f})"
+            for feature, value, baseline, z in self.reasons
+        )
+
+
+class AnomalyDetector:
+    """
+    Windowed, vectorized anomaly scoring of device telemetry.
+    record() is cheap and thread-safe; score() does the work and is meant
+    to run on one background thread (see start()).
+    """
+
+    def __init__(self, window=60.0, threshold=4.0, warmup=18, min_events=5, alpha=0.05,
+                 off_hours=(0, 6), cooldown=None, max_devices=10000, max_actions=64,
+                 max_events=1000000, on_anomalies=None):
+        """
+        Args:
+            window: Seconds of telemetry scored per pass
+            threshold: z-score at which a feature marks a device as anomalous
+            warmup: Passes a device's baseline is learned (per period)
+                    before it is scored; consecutive windows overlap, so
+                    this should cover a few windows
+            min_events: Messages a device needs in the window before its
+                        entropy, burstiness and new_actions are scored
+            alpha: Weight of each pass in the running baselines
+            off_hours: (start, end) local hours with their own baselines;
+                       wraps past midnight when start > end
+            cooldown: Seconds before a reported device is reported again
+                      (defaults to window)
+            max_devices: Devices tracked; messages from further devices are ignored
+            max_actions: Distinct actions tracked; further ones share one code
+            max_events: Messages held in the window and between passes;
+                        further messages are dropped until the next pass
+            on_anomalies: Called with the list of Anomaly found by each
+                          background pass
+        """
+        self.window = window
+        self.threshold = threshold
+        self.warmup = warmup
+        self.min_events = min_events
+        self.alpha = alpha
+        self.off_hours = off_hours
+        self.cooldown = window if cooldown is None else cooldown
+        self.max_devices = max_devices
+        self.max_actions = max(max_actions, 2)
+        self.max_events = max_events
+        self.on_anomalies = on_anomalies
+
+        # Interning and pending messages, guarded by _lock
+        self._lock = threading.Lock()
+        self._devices = {}
+        self._device_names = []
+        self._first_seen = []
+        self._actions = {}
+        self._pending_devices = []
+        self._pending_ts = []
+        self._pending_actions = []
+
+        # Window and baselines, only touched by score() under _score_lock
+        self._score_lock = threading.Lock()
+        self._window_devices = np.zeros(0, np.int32)
+        self._window_ts = np.zeros(0, np.float64)
+        self._window_actions = np.zeros(0, np.int32)
+        self._capacity = 0
+        # Baselines are indexed [period, device]
+        self._mean = np.zeros((PERIODS, 0, len(FEATURES)))
+        self._var = np.zeros((PERIODS, 0, len(FEATURES)))
+        self._rate_passes = np.zeros((PERIODS, 0), np.int64)
+        self._shape_passes = np.zeros((PERIODS, 0), np.int64)
+        self._seen_actions = np.zeros((0, self.max_actions), bool)
+        self._last_reported = np.zeros(0)
+
+        self._stop = threading.Event()
+        self._thread = None
+
+        self.recorded = 0
+        self.dropped = 0
+        self.untracked = 0
+        self.passes = 0
+        self.anomalies = 0
+        self.errors = 0
+        self.last_pass_ms = 0.0
+        self.max_pass_ms = 0.0
+
+    def record(self, device, ts, action=None):
+        """
+        Record one message.
+        Args:
+            device: Device name
+            ts: Receive time (epoch seconds)
+            action: The payload's action field, if any
+        """
+        with self._lock:
+            code = self._devices.get(device)
+            if code is None:
+                if len(self._device_names) >= self.max_devices:
+                    self.untracked += 1
+                    return
+                code = self._devices[device] = len(self._device_names)
+                self._device_names.append(device)
+                self._first_seen.append(ts)
+            if len(self._pending_ts) >= self.max_events:
+                self.dropped += 1
+                return
+            if isinstance(action, str):
+                action_code = self._actions.get(action)
+                if action_code is None:
+                    if len(self._actions) + 2 < self.max_actions:
+                        action_code = self._actions[action] = len(self._actions) + 2
+                    else:
+                        action_code = OTHER_ACTION
+            else:
+                action_code = NO_ACTION
+            self._pending_devices.append(code)
+            self._pending_ts.append(ts)
+            self._pending_actions.append(action_code)
+            self.recorded += 1
+
+    # ==================== SCORING ====================
+
+    def score(self, now=None):
+        """
+        Score every device over the last window seconds and update the baselines.
+        Args:
+            now: Current time in epoch seconds (defaults to time.time())
+        Returns:
+            List of Anomaly, highest score first
+        """
+        now = time.time() if now is None else now
+        start = time.perf_counter()
+        with self._score_lock:
+            with self._lock:
+                devices = np.array(self._pending_devices, np.int32)
+                ts = np.array(self._pending_ts, np.float64)
+                actions = np.array(self._pending_actions, np.int32)
+                self._pending_devices, self._pending_ts, self._pending_actions = [], [], []
+                names = list(self._device_names)
+                first_seen = np.array(self._first_seen, np.float64)
+            anomalies = self._score(now, names, first_seen, devices, ts, actions)
+
+        self.passes += 1
+        self.anomalies += len(anomalies)
+        self.last_pass_ms = (time.perf_counter() - start) * 1000
+        self.max_pass_ms = max(self.max_pass_ms, self.last_pass_ms)
+        return anomalies
+
+    def _score(self, now, names, first_seen, devices, ts, actions):
+        num_devices = len(names)
+        self._grow(num_devices)
+
+        # Slide the window: add new messages, drop those older than window.
+        # The window is kept sorted by (device, time); the new messages are
+        # sorted the same way, so a stable sort by device of the two runs is
+        # a linear merge rather than a full sort
+        order = np.lexsort((ts, devices))
+        devices = np.concatenate((self._window_devices, devices[order]))
+        ts = np.concatenate((self._window_ts, ts[order]))
+        actions = np.concatenate((self._window_actions, actions[order]))
+        order = np.argsort(devices, kind='stable')
+        devices, ts, actions = devices[order], ts[order], actions[order]
+        keep = ts >= now - self.window
+        if np.count_nonzero(keep) > self.max_events:
+            keep &= ts >= np.partition(ts[keep], -self.max_events)[-self.max_events]
+        if not keep.all():
+            devices, ts, actions = devices[keep], ts[keep], actions[keep]
+        # A message recorded after a newer one of the same device (another
+        # worker was faster) breaks the time order; re-sort fully then
+        if np.any((np.diff(ts) < 0) & (devices[1:] == devices[:-1])):
+            order = np.lexsort((ts, devices))
+            devices, ts, actions = devices[order], ts[order], actions[order]
+        self._window_devices, self._window_ts, self._window_actions = devices, ts, actions
+
+        features = self._features(num_devices, devices, ts, actions)
+        counts = features[:, RATE]
+
+        # z-score of each feature against the device's baseline for this period
+        period = self.period(now)
+        mean = self._mean[period, :num_devices]
+        var = self._var[period, :num_devices]
+        rate_passes = self._rate_passes[period, :num_devices]
+        shape_passes = self._shape_passes[period, :num_devices]
+        std = np.maximum(np.sqrt(var), np.maximum(STD_FLOORS, RELATIVE_STD_FLOOR * np.abs(mean)))
+        std[:, RATE] = np.maximum(std[:, RATE], np.sqrt(mean[:, RATE]))
+        z = (features - mean) / std
+        z = np.where(ONE_SIDED, z, np.abs(z))
+        rate_ready = rate_passes >= self.warmup
+        shape_ready = (shape_passes >= self.warmup) & (counts >= self.min_events)
+        z[:, RATE] = np.where(rate_ready, z[:, RATE], 0.0)
+        z[:, RATE + 1:] = np.where(shape_ready[:, None], z[:, RATE + 1:], 0.0)
+        scores = z.max(axis=1)
+        flagged = scores >= self.threshold
+
+        report = np.flatnonzero(flagged & (now - self._last_reported[:num_devices] >= self.cooldown))
+        anomalies = []
+        for index in report:
+            reasons = [
+                (FEATURES[f], float(features[index, f]), float(mean[index, f]), float(z[index, f]))
+                for f in np.argsort(-z[index]) if z[index, f] >= self.threshold
+            ]
+            anomalies.append(Anomaly(names[index], float(scores[index]), int(counts[index]), reasons))
+        self._last_reported[report] = now
+        anomalies.sort(key=lambda anomaly: -anomaly.score)
+
+        # Update the baselines with this pass, leaving flagged devices out so
+        # an attack does not become the new normal. Only devices seen for a
+        # full window are learned (a partial window would understate the
+        # rate); rate is then tracked through silent windows as well.
+        learn = ~flagged & (now - first_seen >= self.window)
+        shape_learn = learn & (counts >= self.min_events)
+        self._update_baseline(mean, var, RATE, learn, features, rate_passes)
+        for feature in (ENTROPY, BURSTINESS):
+            self._update_baseline(mean, var, feature, shape_learn, features, shape_passes)
+        rate_passes += learn
+        shape_passes += shape_learn
+        self._seen_actions[devices, actions] = True
+        return anomalies
+
+    def period(self, now):
+        """OFF_HOURS if now (epoch seconds) falls in the off-hours, else DAYTIME."""
+        start, end = self.off_hours
+        hour = time.localtime(now).tm_hour
+        if start <= end:
+            return OFF_HOURS if start <= hour < end else DAYTIME
+        return OFF_HOURS if hour >= start or hour < end else DAYTIME
+
+    def _features(self, num_devices, devices, ts, actions):
+        """
+        (num_devices, len(FEATURES)) matrix of window features.
+        The messages must be sorted by (device, time).
+        """
+        counts = np.bincount(devices, minlength=num_devices).astype(np.float64)
+        per_message = np.maximum(counts, 1.0)
+
+        # Action entropy from per-(device, action) counts
+        pairs = np.bincount(devices * self.max_actions + actions,
+                            minlength=num_devices * self.max_actions).reshape(num_devices, self.max_actions)
+        share = pairs / per_message[:, None]
+        log_share = np.log2(share, out=np.zeros_like(share), where=pairs > 0)
+        entropy = -(share * log_share).sum(axis=1)
+
+        # Inter-arrival times between consecutive messages of the same device
+        same = devices[1:] == devices[:-1]
+        gaps = np.diff(ts)[same]
+        gap_devices = devices[1:][same]
+        gap_counts = np.maximum(np.bincount(gap_devices, minlength=num_devices), 1)
+        gap_mean = np.bincount(gap_devices, weights=gaps, minlength=num_devices) / gap_counts
+        gap_square = np.bincount(gap_devices, weights=gaps * gaps, minlength=num_devices) / gap_counts
+        gap_std = np.sqrt(np.maximum(gap_square - gap_mean * gap_mean, 0.0))
+        burstiness = np.divide(gap_std, gap_mean, out=np.zeros(num_devices), where=gap_mean > 0)
+
+        # Share of messages whose action the device never sent before
+        new = ~self._seen_actions[devices, actions]
+        new_share = np.bincount(devices, weights=new, minlength=num_devices) / per_message
+
+        return np.column_stack((counts, entropy, burstiness, new_share))
+
+    def _update_baseline(self, mean, var, feature, update, features, passes):
+        """
+        Exponentially weighted mean and variance, updated in place. Until a
+        device has had 1 / alpha passes, each pass is weighted
+        1 / (passes + 1), so the baseline starts as a plain running average.
+        """
+        alpha = np.maximum(self.alpha, 1.0 / (passes[update] + 1))
+        diff = features[update, feature] - mean[update, feature]
+        mean[update, feature] += alpha * diff
+        var[update, feature] = (1 - alpha) * (var[update, feature] + alpha * diff * diff)
+
+    def _grow(self, num_devices):
+        if num_devices <= self._capacity:
+            return
+        capacity = max(num_devices, self._capacity * 2, 64)
+        extra = capacity - self._capacity
+        self._mean = np.concatenate((self._mean, np.zeros((PERIODS, extra, len(FEATURES)))), axis=1)
+        self._var = np.concatenate((self._var, np.zeros((PERIODS, extra, len(FEATURES)))), axis=1)
+        self._rate_passes = np.concatenate((self._rate_passes, np.zeros((PERIODS, extra), np.int64)), axis=1)
+        self._shape_passes = np.concatenate((self._shape_passes, np.zeros((PERIODS, extra), np.int64)), axis=1)
+        self._seen_actions = np.vstack((self._seen_actions, np.zeros((extra, self.max_actions), bool)))
+        self._last_reported = np.concatenate((self._last_reported, np.full(extra, -np.inf)))
+        self._capacity = capacity
+
+    # ==================== BACKGROUND THREAD ====================
+
+    def start(self, interval=10.0):
+        """
+        Score every interval seconds on a background thread, passing any
+        anomalies to on_anomalies.
+        """
+        if self._thread is not None:
+            return
+        self._stop.clear()
+
+        def run():
+            while not self._stop.wait(interval):
+                try:
+                    anomalies = self.score()
+                    if anomalies and self.on_anomalies is not None:
+                        self.on_anomalies(anomalies)
+                except Exception as e:
+                    self.errors += 1
+                    logger.error(f"Error scoring device anomalies: {e}")
+
+        self._thread = threading.Thread(target=run, name='anomaly-scoring', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5.0):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join(timeout)
+            self._thread = None
+
+    def stats(self):
+        with self._lock:
+            devices = len(self._device_names)
+            actions = len(self._actions)
+            pending = len(self._pending_ts)
+        return {
+            'running': self._thread is not None and self._thread.is_alive(),
+            'window': self.window,
+            'threshold': self.threshold,
+            'devices': devices,
+            'max_devices': self.max_devices,
+            'actions': actions,
+            'pending': pending,
+            'window_events': len(self._window_ts),
+            'recorded': self.recorded,
+            'dropped': self.dropped,
+            'untracked': self.untracked,
+            'passes': self.passes,
+            'anomalies': self.anomalies,
+            'errors': self.errors,
+            'last_pass_ms': round(self.last_pass_ms, 3),
+            'max_pass_ms': round(self.max_pass_ms, 3)
+        }
@@ -3,9 +3,8 @@ Smart Home Cybersecurity Training Platform - Backend
 Main Flask application with MQTT integration, API endpoints, and security features.
 """
 
-from flask import Flask, jsonify, request, session
+from flask import Flask, Response, jsonify, request, session, stream_with_context
 from flask_cors import CORS
-from flask_session import Session
 import sqlite3
 import threading
 import paho.mqtt.client as mqtt
@@ -14,6 +13,29 @@ from datetime import datetime
 import logging
 import os
 import secrets
+import atexit
+import time
+
+from log_sink import LogSink
+from migrations import migrate
+from db import Database
+from pipeline import IngestPipeline, device_from_topic
+from rule_engine import RuleEngine
+from rate_limiter import RateDetector, RateReaper
+from anomaly_detector import AnomalyDetector
+from alert_hub import AlertHub
+from authz import AuthzIndex, valid_device_name
+from embedded_broker import EmbeddedClient
+from device_commands import (plan_commands, publish_planned, audit_events, response_body,
+                             CommandSigner, BACKEND_CLIENT_ID)
+from device_shadow import DeviceShadowStore
+from retention import RetentionManager
+from event_stats import EventStats
+from payload_codec import parse_payload
+from payload_store import StoredPayload, load_payloads, payload_filter
+from log_search import parse_search_query, build_search_query, SORT_ORDERS
+from session_store import SessionStore, StoreSessionInterface
+from metrics import Registry, BATCH_SIZE_BUCKETS
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -22,60 +44,269 @@ logger = logging.getLogger(__name__)
 # Initialize Flask app
 app = Flask(__name__)
 app.config['SECRET_KEY'] = secrets.token_hex(16)  # Generate secure session key
-app.config['SESSION_TYPE'] = 'filesystem'
 
 # Enable CORS for frontend communication
 CORS(app, supports_credentials=True)
 
-# Initialize session management
-Session(app)
+# Backend mode: 'sync' (Flask + paho thread), 'async' (see asgi_app.py)
+# or 'scaleout' (multi-process detection, see scaleout.py)
+BACKEND_MODE = os.environ.get('BACKEND_MODE', 'sync')
+
+# Multi-process scale-out configuration (BACKEND_MODE=scaleout)
+SCALEOUT_WORKERS = int(os.environ.get('SCALEOUT_WORKERS', os.cpu_count() or 2))
+MQTT_SHARE_GROUP = 'smart_home_backend'   # MQTT v5 shared subscription group
 
 # Database configuration
 DATABASE = 'smart_home_logs.db'
+DB_READ_POOL_SIZE = 8               # Idle read connections kept open
+DB_CACHE_SIZE_KB = 16384            # Page cache per connection (KiB)
+DB_MMAP_SIZE = 256 * 1024 * 1024    # Bytes memory-mapped per connection
+DB_STATEMENT_CACHE = 256            # Prepared statements cached per connection
+
+# Pooled read connections and dedicated writer connections (see db.py)
+db = Database(
+    DATABASE,
+    pool_size=DB_READ_POOL_SIZE,
+    cache_size_kb=DB_CACHE_SIZE_KB,
+    mmap_size=DB_MMAP_SIZE,
+    statement_cache=DB_STATEMENT_CACHE
+)
+
+# Session configuration
+SESSION_TTL = 86400.0           # Seconds a session lives after its last save
+SESSION_CACHE_SIZE = 10000      # Sessions cached in memory (LRU)
+SESSION_SWEEP_INTERVAL = 300.0  # Seconds between expired-session sweeps
+
+# Server-side sessions: in-memory LRU, written through to SQLite
+session_store = SessionStore(db, ttl=SESSION_TTL, cache_size=SESSION_CACHE_SIZE)
+app.session_interface = StoreSessionInterface(session_store)
+
+# Rows fetched per query when streaming /api/logs as NDJSON
+LOG_STREAM_CHUNK_SIZE = 1000
+
+# /api/logs/search result limits
+LOG_SEARCH_DEFAULT_LIMIT = 50
+LOG_SEARCH_MAX_LIMIT = 500
+
+# Server-Sent Events alert stream configuration
+ALERT_HISTORY_SIZE = 200       # Alerts kept for Last-Event-ID resume
+ALERT_BUFFER_SIZE = 100        # Alerts buffered per subscriber
+ALERT_MAX_SUBSCRIBERS = 500
+ALERT_HEARTBEAT = 15.0         # Seconds between keep-alive comments
+
+# Device shadow configuration
+SHADOW_SNAPSHOT_INTERVAL = 30.0  # Seconds between SQLite snapshots (0 disables)
+SHADOW_MAX_DEVICES = 10000       # Devices with a shadow (names come from broker topics)
+
+# /api/stats configuration
+STATS_TOP_DEVICES = 5          # Default number of most targeted devices
+
+# Log retention configuration
+RETENTION_INTERVAL = 60.0           # Seconds between retention passes (0 disables)
+RAW_LOG_RETENTION = 3600.0          # Seconds DEVICE_UPDATE rows stay raw before rollup
+EVENT_LOG_RETENTION = 30 * 86400.0  # Seconds ATTACK/DEFENSE rows are kept
+ROLLUP_RETENTION = 90 * 86400.0     # Seconds per-minute device rollups are kept
+RETENTION_BATCH_SIZE = 500          # Rows expired per transaction
+LOG_ARCHIVE_DIR = 'archive'         # Compressed NDJSON archives (None disables)
+
+# Write-behind log sink configuration
+LOG_SINK_BATCH_SIZE = 500      # Max rows per transaction
+LOG_SINK_MAX_DELAY = 0.05      # Max seconds a row waits before flush
+LOG_SINK_QUEUE_SIZE = 10000    # Rows buffered before backpressure/drops
 
 # MQTT configuration
+# 'paho' talks to MQTT_BROKER; 'embedded' uses the in-process broker in
+# embedded_broker.py (offline simulations and benchmarks, sync mode only)
+MQTT_TRANSPORT = os.environ.get('MQTT_TRANSPORT', 'paho')
 MQTT_BROKER = 'localhost'  # Change to 'mosquitto' if running in Docker
 MQTT_PORT = 1883
 MQTT_WEBSOCKET_PORT = 9001
+MQTT_MAX_INFLIGHT = 100        # Unacknowledged QoS 1/2 messages in flight
+
+# Bulk device command configuration (/api/control-devices)
+BULK_MAX_COMMANDS = 200        # Commands accepted per request
+BULK_COMMAND_QOS = 1           # Default QoS for bulk commands
+BULK_PUBLISH_TIMEOUT = 5.0     # Seconds to wait for the broker to acknowledge a batch
+
+# Ingestion pipeline configuration
+DETECTION_WORKERS = 4          # Detection worker threads
+INGEST_QUEUE_SIZE = 10000      # Messages buffered per worker
+
+# Detection rules configuration
+RULES_FILE = 'rules.json'
+RULES_RELOAD_INTERVAL = 2.0    # Seconds between rules file change checks
+
+# Device control authorization policy (hot-reloaded like the rules file)
+POLICY_FILE = 'policy.json'
+POLICY_RELOAD_INTERVAL = 2.0   # Seconds between policy file change checks
+INGEST_AUTHZ_CHECK = True      # Check commands published straight to the broker
+
+# Rate-based DoS detection configuration (token bucket per key)
+DEVICE_RATE_LIMIT = 5.0        # Sustained messages/sec per device
+DEVICE_RATE_BURST = 20         # Messages allowed in a short spike per device
+CLIENT_RATE_LIMIT = 10.0       # Sustained messages/sec per publishing client
+CLIENT_RATE_BURST = 40
+RATE_QUIET_PERIOD = 5.0        # Seconds under the limit before a burst ends
+RATE_MAX_KEYS = 10000          # Keys tracked per detector (LRU eviction)
+RATE_REAP_INTERVAL = 1.0       # Seconds between sweeps ending quiet bursts (0 disables)
+
+# Batch anomaly scoring of device behaviour over time (anomaly_detector.py)
+ANOMALY_INTERVAL = 10.0        # Seconds between scoring passes (0 disables)
+ANOMALY_WINDOW = 60.0          # Seconds of telemetry scored per pass
+ANOMALY_THRESHOLD = 4.0        # Standard deviations from a device's baseline
+ANOMALY_WARMUP = 18            # Passes a device's baseline is learned before scoring
+ANOMALY_OFF_HOURS = (0, 6)     # Local hours [start, end) with their own baselines
+ANOMALY_MAX_DEVICES = 10000    # Devices tracked
 
 # Global MQTT client
 mqtt_client = None
 
-# Authorized devices (demo user has access to all devices)
-AUTHORIZED_DEVICES = {
-    'user1': ['light1', 'light2', 'thermostat', 'lock'],
-    'user2': ['light1']
-}
+# scaleout.Supervisor when running with BACKEND_MODE=scaleout
+supervisor = None
+
+# ==================== METRICS ====================
+# Exposed in Prometheus text format at /metrics
+metrics_registry = Registry()
+MQTT_MESSAGES = metrics_registry.counter(
+    'smart_home_mqtt_messages_total', 'MQTT messages received (topic: a default device or "other")',
+    ('topic',))
+MQTT_CONNECTS = metrics_registry.counter(
+    'smart_home_mqtt_connects_total', 'Successful MQTT (re)connections')
+MQTT_DISCONNECTS = metrics_registry.counter(
+    'smart_home_mqtt_disconnects_total', 'Unexpected MQTT disconnections')
+RULE_EVAL_SECONDS = metrics_registry.histogram(
+    'smart_home_rule_eval_seconds', 'Detection rule evaluation time', labelnames=('rule',))
+LOG_WRITE_SECONDS = metrics_registry.histogram(
+    'smart_home_log_write_seconds', 'Log sink batch commit time')
+LOG_BATCH_ROWS = metrics_registry.histogram(
+    'smart_home_log_batch_rows', 'Rows per log sink batch', buckets=BATCH_SIZE_BUCKETS)
+DB_QUERY_SECONDS = metrics_registry.histogram(
+    'smart_home_db_query_seconds', 'SQLite query time per endpoint', labelnames=('endpoint',))
+
+# Gauges read live component state at scrape time
+metrics_registry.gauge(
+    'smart_home_ingest_queue_depth', 'Messages waiting for a detection worker',
+    lambda: ingest_pipeline.stats()['queue_depth'])
+metrics_registry.callback_counter(
+    'smart_home_ingest_dropped_total', 'Messages dropped by the ingestion pipeline',
+    lambda: ingest_pipeline.dropped)
+metrics_registry.gauge(
+    'smart_home_log_sink_queue_depth', 'Log rows waiting to be written',
+    lambda: log_sink.stats()['queue_depth'])
+metrics_registry.callback_counter(
+    'smart_home_log_sink_dropped_total', 'Log rows dropped under backpressure',
+    lambda: log_sink.dropped)
+metrics_registry.gauge(
+    'smart_home_alert_subscribers', 'Connected alert stream clients',
+    lambda: alert_hub.stats()['subscribers'])
+metrics_registry.gauge(
+    'smart_home_mqtt_connected', 'Whether the MQTT client is connected',
+    lambda: int(mqtt_client is not None and mqtt_client.is_connected()))
+
+def observe_log_batch(rows, seconds):
+    """LogSink on_batch hook."""
+    LOG_WRITE_SECONDS.observe(seconds)
+    LOG_BATCH_ROWS.observe(rows)
+
+def observe_rule(rule_name, seconds):
+    """RuleEngine observer hook."""
+    RULE_EVAL_SECONDS.observe(seconds, (rule_name,))
+
+# Batched log writer (started in __main__ after init_db)
+log_sink = LogSink(
+    DATABASE,
+    batch_size=LOG_SINK_BATCH_SIZE,
+    max_delay=LOG_SINK_MAX_DELAY,
+    max_queue=LOG_SINK_QUEUE_SIZE,
+    connect=db.connect,
+    on_batch=observe_log_batch
+)
+
+# In-memory fan-out of alerts to SSE subscribers
+alert_hub = AlertHub(
+    history_size=ALERT_HISTORY_SIZE,
+    buffer_size=ALERT_BUFFER_SIZE,
+    max_subscribers=ALERT_MAX_SUBSCRIBERS
+)
+
+# Attack detection rules (hot-reloaded from RULES_FILE)
+rule_engine = RuleEngine(RULES_FILE, observer=observe_rule)
+
+# Flood detectors keyed by device name and by publishing client
+device_rates = RateDetector(
+    'device',
+    rate=DEVICE_RATE_LIMIT,
+    burst=DEVICE_RATE_BURST,
+    quiet_period=RATE_QUIET_PERIOD,
+    max_keys=RATE_MAX_KEYS
+)
+client_rates = RateDetector(
+    'client',
+    rate=CLIENT_RATE_LIMIT,
+    burst=CLIENT_RATE_BURST,
+    quiet_period=RATE_QUIET_PERIOD,
+    max_keys=RATE_MAX_KEYS
+)
+
+# Signs the commands this backend publishes (see device_commands.CommandSigner)
+command_signer = CommandSigner()
+
+# Devices shown before any state has been reported
+DEFAULT_DEVICES = [
+    {'name': 'light1', 'type': 'light', 'state': 'off'},
+    {'name': 'light2', 'type': 'light', 'state': 'off'},
+    {'name': 'thermostat', 'type': 'thermostat', 'state': '20°C'},
+    {'name': 'lock', 'type': 'lock', 'state': 'locked'}
+]
+
+# Topics with their own metrics label; publishers choose topics freely, so
+# any other topic is counted as 'other' to keep the series count bounded
+METRIC_TOPICS = frozenset(f"/devices/{device['name']}" for device in DEFAULT_DEVICES)
+
+def topic_label(topic):
+    """Bounded 'topic' label value for the MQTT message counter."""
+    return topic if topic in METRIC_TOPICS else 'other'
+
+# Last known state of every device seen on /devices/#
+device_shadows = DeviceShadowStore(max_devices=SHADOW_MAX_DEVICES)
+
+# Sliding-window event counters behind /api/stats
+event_stats = EventStats()
+
+# Rolls up, archives and expires old log rows in the background
+log_retention = RetentionManager(
+    DATABASE,
+    db.connect,
+    raw_retention=RAW_LOG_RETENTION,
+    event_retention=EVENT_LOG_RETENTION,
+    rollup_retention=ROLLUP_RETENTION,
+    archive_dir=LOG_ARCHIVE_DIR,
+    batch_size=RETENTION_BATCH_SIZE
+)
+for default_device in DEFAULT_DEVICES:
+    device_shadows.seed(default_device['name'], default_device['type'], default_device['state'])
+
+# Who may control which device (hot-reloaded from POLICY_FILE); wildcard
+# grants are pre-expanded over the default devices
+authz = AuthzIndex(POLICY_FILE, known_devices=[device['name'] for device in DEFAULT_DEVICES])
 
 # ==================== DATABASE SETUP ====================
 
 def init_db():
-    """Initialize SQLite database with logs table."""
-    if not os.path.exists(DATABASE):
-        conn = sqlite3.connect(DATABASE)
-        c = conn.cursor()
-        
-        # Create logs table to store MQTT events, attacks, and defenses
-        c.execute('''
-            CREATE TABLE IF NOT EXISTS logs (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                timestamp TEXT NOT NULL,
-                message TEXT NOT NULL,
-                log_type TEXT NOT NULL,
-                source TEXT,
-                device TEXT,
-                user TEXT,
-                severity TEXT
-            )
-        ''')
-        
-        conn.commit()
-        conn.close()
-        logger.info("Database initialized successfully")
+    """
+    Initialize SQLite database with logs table.
+    Applies any pending schema migrations, so existing databases are
+    upgraded as well as new ones created.
+    """
+    version = migrate(DATABASE)
+    logger.info(f"Database initialized successfully (schema version {version})")
 
-def log_event(message, log_type, source=None, device=None, user=None, severity='INFO'):
+def log_event(message, log_type, source=None, device=None, user=None, severity='INFO',
+              category=None, payload=None):
     """
     Log an event to the database.
+    Rows are queued on the write-behind log sink and committed in batches,
+    and counted in event_stats for /api/stats.
     Args:
         message: Description of the event
         log_type: 'ATTACK', 'DEFENSE', 'DEVICE_UPDATE', 'AUTH'
@@ -83,29 +314,57 @@ def log_event(message, log_type, source=None, device=None, user=None, severity='
         device: Device affected
         user: User who triggered the event
         severity: 'INFO', 'WARNING', 'CRITICAL'
+        category: Attack type for ATTACK events (e.g. detection rule name)
+        payload: StoredPayload of the MQTT message the event is about;
+                 stored once per distinct payload and referenced by id
     """
     try:
-        conn = sqlite3.connect(DATABASE)
-        c = conn.cursor()
-        timestamp = datetime.now().isoformat()
-        c.execute('''
-            INSERT INTO logs (timestamp, message, log_type, source, device, user, severity)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (timestamp, message, log_type, source, device, user, severity))
-        conn.commit()
-        conn.close()
-        logger.info(f"[{log_type}] {message}")
+        now = datetime.now()
+        log_sink.submit((
+            now.isoformat(), int(now.timestamp() * 1000),
+            message, log_type, source, device, user, severity, payload
+        ))
+        event_stats.record(log_type, device, severity, category)
+        # High-rate telemetry only at DEBUG; %-args are formatted only if emitted
+        logger.log(logging.DEBUG if log_type == 'DEVICE_UPDATE' else logging.INFO, "[%s] %s", log_type, message)
     except Exception as e:
         logger.error(f"Error logging event: {e}")
 
+def log_events(events):
+    """
+    Log several events at once. Their rows are queued as one group, so the
+    log sink commits them in a single transaction.
+    Args:
+        events: List of log_event keyword argument dicts
+    """
+    try:
+        now = datetime.now()
+        timestamp, ts = now.isoformat(), int(now.timestamp() * 1000)
+        log_sink.submit_many([
+            (timestamp, ts, event['message'], event['log_type'], event.get('source'),
+             event.get('device'), event.get('user'), event.get('severity', 'INFO'),
+             event.get('payload'))
+            for event in events
+        ])
+        for event in events:
+            event_stats.record(event['log_type'], event.get('device'), event.get('severity', 'INFO'),
+                               event.get('category'))
+            logger.log(logging.DEBUG if event['log_type'] == 'DEVICE_UPDATE' else logging.INFO,
+                       "[%s] %s", event['log_type'], event['message'])
+    except Exception as e:
+        logger.error(f"Error logging events: {e}")
+
 # ==================== MQTT HANDLERS ====================
 
 def on_connect(client, userdata, flags, rc):
     """Callback for when MQTT client connects."""
     if rc == 0:
+        MQTT_CONNECTS.inc()
         logger.info("Connected to MQTT broker")
-        # Subscribe to all device topics for monitoring
-        client.subscribe('/devices/#')
+        # Subscribe to all device topics for monitoring (in scale-out mode
+        # the detection workers subscribe through a shared group instead)
+        if BACKEND_MODE != 'scaleout':
+            client.subscribe('/devices/#')
         log_event("Connected to MQTT broker", "DEVICE_UPDATE")
     else:
         logger.error(f"Failed to connect to MQTT broker with code {rc}")
@@ -113,102 +372,255 @@ def on_connect(client, userdata, flags, rc):
 def on_message(client, userdata, msg):
     """
     Callback for when MQTT message is received.
+    Runs on paho's network thread, so it only hands the raw message to the
+    ingestion pipeline; detection happens in process_message on a worker.
+    """
+    MQTT_MESSAGES.inc((topic_label(msg.topic),))
+    ingest_pipeline.submit(msg.topic, msg.payload, time.time())
+
+def process_message(topic, raw_payload, receive_ts):
+    """
+    Process one MQTT message on a detection worker.
     Implements attack detection logic.
+    Args:
+        topic: MQTT topic the message was published to
+        raw_payload: Payload bytes as received from the broker
+        receive_ts: Time the message was received (epoch seconds)
     """
-    topic = msg.topic
-    payload = msg.payload.decode()
-    
-    logger.info(f"MQTT Message - Topic: {topic}, Payload: {payload}")
+    # Lazy %-formatting: this runs per message and is usually filtered out
+    logger.debug("MQTT Message - Topic: %s, Payload: %r", topic, raw_payload)
     
     try:
-        # Parse the payload
-        data = json.loads(payload) if payload.startswith('{') else {'value': payload}
+        # Parse the payload straight from bytes (orjson when installed)
+        data, is_object = parse_payload(raw_payload)
         
         # Extract device name from topic (e.g., /devices/light1 -> light1)
-        device_name = topic.split('/')[-1]
+        device_name = device_from_topic(topic)
         
-        # ==================== ATTACK DETECTION LOGIC ====================
-        # Check if this message is authorized
-        # For demo purposes: check if the command format is suspicious
+        # Update the device shadow with the reported state
+        device_shadows.update(device_name, receive_ts, data)
         
-        is_attack = False
-        attack_reason = None
+        # Feed the batch anomaly scorer (floods included)
+        anomaly_detector.record(device_name, receive_ts, data.get('action'))
         
-        # Rule 1: Check for suspicious commands with 'attack' flag
-        if 'attack' in data and data['attack'] is True:
-            is_attack = True
-            attack_reason = "Unauthorized attack flag detected in payload"
-            severity = "CRITICAL"
+        # ==================== ATTACK DETECTION LOGIC ====================
+        # Check the payload against the detection rules that could match it.
+        # Most telemetry contains none of the rule keys; a byte scan of the
+        # raw payload rules that out without evaluating any rule.
+        if is_object and not rule_engine.may_match(raw_payload):
+            matches = []
+        else:
+            matches = rule_engine.evaluate(topic, data)
         
-        # Rule 2: Check for commands with bypass authentication flag
-        if 'bypass_auth' in data and data['bypass_auth'] is True:
-            is_attack = True
-            attack_reason = "Attempted to bypass authentication"
-            severity = "CRITICAL"
+        is_attack = bool(matches)
+        if is_attack:
+            # Later rules override earlier ones, as the original if-chain did
+            rule = matches[-1]
+            attack_reason = rule.reason
+            attack_type = rule.name
+            severity = rule.severity
         
-        # Rule 3: Detect rapid successive commands (basic DoS detection)
-        # This is a simplified version; in production, use proper rate limiting
-        if 'rapid_fire' in data and data.get('rapid_fire', False):
+        # ==================== AUTHORIZATION AT INGEST ====================
+        # Commands published straight to the broker skip /api/control-device;
+        # check the user they claim to come from against the same policy
+        claimed_user = data.get('user')
+        if (INGEST_AUTHZ_CHECK and not is_attack and isinstance(claimed_user, str)
+                and not authz.allowed(claimed_user, device_name)):
             is_attack = True
-            attack_reason = "Rapid fire command detected (potential DoS attack)"
-            severity = "WARNING"
+            attack_reason = f"User {claimed_user} is not authorized to control {device_name}"
+            attack_type = 'unauthorized_publish'
+            severity = 'WARNING'
+        
+        # ==================== RATE-BASED DOS DETECTION ====================
+        # Publishers identify themselves in the payload (e.g., 'user' from the Attack page)
+        client_id = data.get('client_id') or data.get('user')
+        throttled = False
+        for detector, key in ((device_rates, device_name), (client_rates, client_id)):
+            if not isinstance(key, str):
+                continue
+            if (detector is client_rates and key == BACKEND_CLIENT_ID
+                    and command_signer.verify(data, receive_ts)):
+                # Commands this backend published (e.g. a bulk request);
+                # a payload merely claiming the client_id is rate-limited
+                continue
+            limited, events = detector.hit(key, receive_ts, attack_type if is_attack else None)
+            throttled = throttled or limited
+            for event in events:
+                report_burst(detector, event, topic)
         
         # ==================== LOG EVENTS ====================
+        if throttled:
+            # Part of a flood already reported once as an ATTACK; counted
+            # (with any rule it matched) in the burst summary instead of
+            # logged and alerted row by row
+            return
+        
+        # The log row references the stored payload
+        payload = StoredPayload(raw_payload, data, is_object)
+        
         if is_attack:
             # Log as attack - DEFENSE ACTION
             log_event(
-                message=f"ATTACK DETECTED: {attack_reason}. Device: {device_name}, Payload: {payload}",
+                message=f"ATTACK DETECTED: {attack_reason}. Device: {device_name}",
                 log_type="ATTACK",
                 source=topic,
                 device=device_name,
-                severity=severity
+                severity=severity,
+                category=attack_type,
+                payload=payload
             )
             # Broadcast alert to connected clients
-            broadcast_alert(f"🚨 Attack Detected: {attack_reason}", severity)
+            broadcast_alert(f"🚨 Attack Detected: {attack_reason}", severity, device=device_name, source=topic)
         else:
             # Log as normal device update
             log_event(
-                message=f"Device update: {device_name} - {payload}",
+                message=f"Device update: {device_name}",
                 log_type="DEVICE_UPDATE",
                 source=topic,
                 device=device_name,
-                severity="INFO"
+                severity="INFO",
+                payload=payload
             )
     
     except Exception as e:
         logger.error(f"Error processing MQTT message: {e}")
 
+def report_burst(detector, event, topic):
+    """
+    Log the start or end of a message flood detected by a rate detector.
+    A burst produces one ATTACK row when it starts and one DEFENSE summary
+    when it ends, however many messages it contained; detection rules
+    matched by messages over the limit are counted in that summary.
+    """
+    device = event.key if detector is device_rates else None
+    user = event.key if detector is client_rates else None
+    
+    if event.kind == 'start':
+        attack_reason = (
+            f"Message flood from {detector.name} {event.key} "
+            f"(over {detector.rate:g} msg/s, burst {detector.burst:g})"
+        )
+        log_event(
+            message=f"ATTACK DETECTED: {attack_reason} (potential DoS attack)",
+            log_type="ATTACK",
+            source=topic,
+            device=device,
+            user=user,
+            severity="WARNING",
+            category='message_flood'
+        )
+        broadcast_alert(f"🚨 Attack Detected: {attack_reason}", "WARNING", device=device, source=topic)
+    else:
+        matched = ', '.join(f"{reason} x{count}" for reason, count in sorted(event.reasons.items()))
+        if event.kind == 'end':
+            message = (
+                f"DoS burst from {detector.name} {event.key} ended: "
+                f"{event.count} messages over the limit in {event.duration:.1f}s"
+            )
+            if matched:
+                message += f"; matched rules: {matched}"
+        else:
+            # 'matches': counted by a scale-out worker that did not end the burst
+            message = f"DoS burst from {detector.name} {event.key}: matched rules {matched}"
+        log_event(
+            message=message,
+            log_type="DEFENSE",
+            device=device,
+            user=user,
+            severity="WARNING" if matched else "INFO"
+        )
+
+def report_anomalies(anomalies):
+    """
+    Log devices flagged by a batch anomaly scoring pass.
+    Runs on the anomaly scoring thread; each device is reported at most
+    once per window.
+    """
+    for anomaly in anomalies:
+        attack_reason = f"Anomalous traffic from {anomaly.device}: {anomaly.describe()}"
+        log_event(
+            message=f"ATTACK DETECTED: {attack_reason}",
+            log_type="ATTACK",
+            source=f"/devices/{anomaly.device}",
+            device=anomaly.device,
+            severity="WARNING",
+            category='anomaly'
+        )
+        broadcast_alert(f"🚨 Attack Detected: {attack_reason}", "WARNING", device=anomaly.device)
+
+# Ends bursts (and evicts keys) that went quiet with no further message;
+# the detectors are looked up per pass as scale-out replaces them
+rate_reaper = RateReaper(
+    lambda: (device_rates, client_rates),
+    on_event=lambda detector, event: report_burst(detector, event, None)
+)
+
+# Scores recent telemetry of all devices every ANOMALY_INTERVAL seconds
+anomaly_detector = AnomalyDetector(
+    window=ANOMALY_WINDOW,
+    threshold=ANOMALY_THRESHOLD,
+    warmup=ANOMALY_WARMUP,
+    off_hours=ANOMALY_OFF_HOURS,
+    max_devices=ANOMALY_MAX_DEVICES,
+    on_anomalies=report_anomalies
+)
+
+# MQTT ingestion pipeline (started in __main__ before connect_mqtt)
+ingest_pipeline = IngestPipeline(
+    process_message,
+    workers=DETECTION_WORKERS,
+    queue_size=INGEST_QUEUE_SIZE
+)
+
 def on_disconnect(client, userdata, rc):
     """Callback for when MQTT client disconnects."""
     if rc != 0:
+        MQTT_DISCONNECTS.inc()
         logger.warning(f"Unexpected disconnection with code {rc}")
 
-def broadcast_alert(message, severity='INFO'):
+def broadcast_alert(message, severity='INFO', device=None, source=None):
     """
     Broadcast security alert to all connected clients.
-    In production, use WebSocket or Server-Sent Events (SSE).
-    For now, we'll store alerts in a special log table accessed via API.
+    Pushed to /api/alerts/stream subscribers through the alert hub and
+    also stored in the logs table as a DEFENSE event.
     """
-    log_event(message, "DEFENSE", severity=severity)
+    alert_hub.publish({
+        'message': message,
+        'severity': severity,
+        'device': device,
+        'source': source,
+        'timestamp': datetime.now().isoformat()
+    })
+    log_event(message, "DEFENSE", device=device, severity=severity)
 
 # ==================== MQTT CONNECTION ====================
 
+def create_mqtt_client(client_id):
+    """
+    Create an MQTT client for MQTT_TRANSPORT.
+    Both kinds take the same callbacks and calls (paho callback API v1).
+    """
+    if MQTT_TRANSPORT == 'embedded':
+        return EmbeddedClient(client_id)
+    try:
+        # For paho-mqtt 2.0+
+        return mqtt.Client(mqtt.CallbackAPIVersion.VERSION1, client_id=client_id)
+    except AttributeError:
+        # For paho-mqtt 1.x
+        return mqtt.Client(client_id=client_id)
+
 def connect_mqtt():
     """Initialize and connect to MQTT broker."""
     global mqtt_client
     
     try:
-        # Create MQTT client - handle both old and new versions
-        try:
-            # For paho-mqtt 2.0+
-            mqtt_client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION1, client_id="flask_backend")
-        except AttributeError:
-            # For paho-mqtt 1.x
-            mqtt_client = mqtt.Client(client_id="flask_backend")
+        mqtt_client = create_mqtt_client("flask_backend")
         
         mqtt_client.on_connect = on_connect
         mqtt_client.on_message = on_message
         mqtt_client.on_disconnect = on_disconnect
+        # Let bulk commands pipeline instead of queueing behind 20 acks
+        mqtt_client.max_inflight_messages_set(MQTT_MAX_INFLIGHT)
         
         mqtt_client.connect(MQTT_BROKER, MQTT_PORT, keepalive=60)
         
@@ -296,24 +708,32 @@ def get_session():
 def get_devices():
     """
     Get list of available devices.
-    Returns devices accessible to the current user.
+    Returns the last known state of every device from the device shadow
+    store, flagging which ones the current user may control.
+    Supports If-None-Match revalidation.
     """
     try:
         user = session.get('user')
         if not user:
             return jsonify({'error': 'Not authenticated'}), 401
         
-        # Get authorized devices for user
-        devices = AUTHORIZED_DEVICES.get(user, [])
+        # Cheap revalidation: the ETag only depends on the shadow store
+        # version, the policy and the user
+        policy = authz.policy
+        etag = device_shadows.etag(policy.digest, user)
+        if request.if_none_match.contains_weak(etag):
+            response = Response(status=304)
+            response.set_etag(etag, weak=True)
+            return response
         
-        return jsonify({
-            'devices': [
-                {'name': 'light1', 'type': 'light', 'state': 'off'},
-                {'name': 'light2', 'type': 'light', 'state': 'off'},
-                {'name': 'thermostat', 'type': 'thermostat', 'state': '20°C'},
-                {'name': 'lock', 'type': 'lock', 'state': 'locked'}
-            ]
-        }), 200
+        devices = device_shadows.list_devices(time.time())
+        for device in devices:
+            device['authorized'] = policy.allowed(user, device['name'])
+        
+        response = jsonify({'devices': devices})
+        response.set_etag(etag, weak=True)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response, 200
     except Exception as e:
         logger.error(f"Error fetching devices: {e}")
         return jsonify({'error': str(e)}), 500
@@ -332,21 +752,24 @@ def control_device():
         data = request.get_json()
         device = data.get('device')
         action = data.get('action')
+        if not valid_device_name(device):
+            return jsonify({'error': 'device must be a single topic level (no /, + or #)'}), 400
         
         # Check if user is authorized for this device
-        if user not in AUTHORIZED_DEVICES or device not in AUTHORIZED_DEVICES[user]:
+        if not authz.allowed(user, device):
             log_event(
                 message=f"User {user} attempted unauthorized control of {device}",
                 log_type="ATTACK",
                 device=device,
                 user=user,
-                severity="WARNING"
+                severity="WARNING",
+                category='unauthorized_control'
             )
             return jsonify({'error': 'Unauthorized device access'}), 403
         
         # Publish command to MQTT topic
         topic = f'/devices/{device}'
-        payload = json.dumps({'action': action, 'user': user})
+        payload = command_signer.payload(action, user)
         
         if mqtt_client:
             mqtt_client.publish(topic, payload)
@@ -364,71 +787,350 @@ def control_device():
         logger.error(f"Device control error: {e}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/control-devices', methods=['POST'])
+def control_devices():
+    """
+    Control several devices in one request.
+    Body: {'commands': [{'device': name, 'action': action}, ...], 'qos': 0-2}
+    Every command is authorized against the same policy snapshot, allowed
+    ones are published back to back and acknowledged as a batch, and the
+    audit rows are committed in one transaction.
+    Returns per-command results in request order.
+    """
+    try:
+        user = session.get('user')
+        if not user:
+            return jsonify({'error': 'Not authenticated'}), 401
+        
+        data = request.get_json(silent=True) or {}
+        commands = data.get('commands')
+        if not isinstance(commands, list) or not commands:
+            return jsonify({'error': 'commands must be a non-empty list'}), 400
+        if len(commands) > BULK_MAX_COMMANDS:
+            return jsonify({'error': f'At most {BULK_MAX_COMMANDS} commands per request'}), 400
+        qos = data.get('qos', BULK_COMMAND_QOS)
+        if qos not in (0, 1, 2):
+            return jsonify({'error': 'qos must be 0, 1 or 2'}), 400
+        
+        if not mqtt_client:
+            return jsonify({'error': 'MQTT connection failed'}), 500
+        
+        results = plan_commands(commands, user, authz.policy, command_signer)
+        publish_planned(mqtt_client, results, qos=qos, timeout=BULK_PUBLISH_TIMEOUT)
+        log_events(audit_events(user, results))
+        
+        return jsonify(response_body(results)), 200
+    except Exception as e:
+        logger.error(f"Bulk device control error: {e}")
+        return jsonify({'error': str(e)}), 500
+
+def encode_cursor(row):
+    """Build an opaque keyset cursor from the last row of a page."""
+    return f"{row['ts']}:{row['id']}"
+
+def decode_cursor(cursor):
+    """
+    Parse a cursor produced by encode_cursor.
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    ts, row_id = cursor.split(':', 1)
+    return int(ts), int(row_id)
+
+def payload_filter_args(args):
+    """Payload field filters (action, payload_user, flag, client_id) from query arguments."""
+    return {name: args.get(name) for name in ('action', 'payload_user', 'flag', 'client_id')}
+
+def build_log_query(log_type=None, device=None, since=None, until=None,
+                    action=None, payload_user=None, flag=None, client_id=None):
+    """
+    Build the WHERE clause shared by paged and streamed log queries.
+    action, payload_user, flag and client_id filter on the parsed payload
+    fields.
+    Returns:
+        (query, params) ready for a keyset condition and ORDER BY
+    Raises:
+        ValueError: If flag is not a known payload flag
+    """
+    query = 'SELECT * FROM logs WHERE 1=1'
+    params = []
+    
+    if log_type:
+        query += ' AND log_type = ?'
+        params.append(log_type)
+    
+    if device:
+        query += ' AND device = ?'
+        params.append(device)
+    
+    if since is not None:
+        query += ' AND ts >= ?'
+        params.append(since)
+    
+    if until is not None:
+        query += ' AND ts < ?'
+        params.append(until)
+    
+    clause, clause_params = payload_filter(action, payload_user, flag, client_id)
+    query += clause
+    params.extend(clause_params)
+    
+    return query, params
+
+def fetch_log_page(conn, query, params, cursor, limit):
+    """
+    Fetch one page of logs newest-first, starting after cursor.
+    (ts, id) is unique and covered by the ts indexes (rowid is implicit),
+    so each page is an index seek rather than an OFFSET scan.
+    """
+    if cursor:
+        query += ' AND (ts, id) < (?, ?)'
+        params = params + list(cursor)
+    query += ' ORDER BY ts DESC, id DESC LIMIT ?'
+    return conn.execute(query, params + [limit]).fetchall()
+
+def stream_logs_ndjson(query, params, cursor, limit, chunk_size=LOG_STREAM_CHUNK_SIZE):
+    """
+    Yield matching logs as NDJSON lines, one keyset page at a time.
+    Memory use is bounded by chunk_size however many rows match.
+    """
+    with db.read() as conn:
+        remaining = limit
+        while remaining is None or remaining > 0:
+            size = chunk_size if remaining is None else min(chunk_size, remaining)
+            with DB_QUERY_SECONDS.time(('logs_ndjson',)):
+                rows = fetch_log_page(conn, query, params, cursor, size)
+            if not rows:
+                break
+            yield ''.join(json.dumps(log) + '\n' for log in load_payloads(conn, rows))
+            cursor = (rows[-1]['ts'], rows[-1]['id'])
+            if remaining is not None:
+                remaining -= len(rows)
+            if len(rows) < size:
+                break
+
 @app.route('/api/logs', methods=['GET'])
 def get_logs():
     """
     Retrieve logs from database.
-    Can filter by log_type, device, or user.
+    Can filter by log_type, device, time range (since/until, epoch ms) or
+    payload fields (action, payload_user, flag, client_id).
+    Pages with a keyset cursor: pass the returned next_cursor as ?cursor=
+    to get the following page. With ?format=ndjson the matching rows are
+    streamed instead (limit is optional), for exports.
     """
     try:
         # Get query parameters for filtering
         log_type = request.args.get('type')
         device = request.args.get('device')
-        limit = request.args.get('limit', 100, type=int)
+        since = request.args.get('since', type=int)
+        until = request.args.get('until', type=int)
+        output_format = request.args.get('format', 'json')
         
-        conn = sqlite3.connect(DATABASE)
-        conn.row_factory = sqlite3.Row
-        c = conn.cursor()
+        try:
+            cursor = decode_cursor(request.args['cursor']) if request.args.get('cursor') else None
+        except ValueError:
+            return jsonify({'error': 'Invalid cursor'}), 400
         
-        # Build query with filters
-        query = 'SELECT * FROM logs WHERE 1=1'
-        params = []
+        try:
+            query, params = build_log_query(log_type, device, since, until,
+                                            **payload_filter_args(request.args))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        if log_type:
-            query += ' AND log_type = ?'
-            params.append(log_type)
+        if output_format == 'ndjson':
+            limit = request.args.get('limit', type=int)
+            return Response(
+                stream_with_context(stream_logs_ndjson(query, params, cursor, limit)),
+                mimetype='application/x-ndjson'
+            )
         
-        if device:
-            query += ' AND device = ?'
-            params.append(device)
+        limit = request.args.get('limit', 100, type=int)
         
-        query += ' ORDER BY timestamp DESC LIMIT ?'
-        params.append(limit)
+        # Fetch one extra row to know whether another page exists
+        with db.read() as conn, DB_QUERY_SECONDS.time(('logs',)):
+            rows = fetch_log_page(conn, query, params, cursor, limit + 1)
+            logs = load_payloads(conn, rows[:limit])
         
-        c.execute(query, params)
-        logs = [dict(row) for row in c.fetchall()]
-        conn.close()
+        next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit and limit > 0 else None
         
-        return jsonify({'logs': logs}), 200
+        return jsonify({'logs': logs, 'next_cursor': next_cursor}), 200
     except Exception as e:
         logger.error(f"Error fetching logs: {e}")
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/logs/attack', methods=['GET'])
 def get_attack_logs():
-    """Get only attack logs (security alerts)."""
+    """
+    Get only attack logs (security alerts).
+    Supports the same ?cursor= keyset paging and payload field filters
+    (e.g. ?client_id=) as /api/logs.
+    """
     try:
         limit = request.args.get('limit', 50, type=int)
         
-        conn = sqlite3.connect(DATABASE)
-        conn.row_factory = sqlite3.Row
-        c = conn.cursor()
+        try:
+            cursor = decode_cursor(request.args['cursor']) if request.args.get('cursor') else None
+        except ValueError:
+            return jsonify({'error': 'Invalid cursor'}), 400
+        
+        try:
+            query, params = build_log_query(log_type='ATTACK', **payload_filter_args(request.args))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        c.execute('''
-            SELECT * FROM logs 
-            WHERE log_type = 'ATTACK' 
-            ORDER BY timestamp DESC 
-            LIMIT ?
-        ''', (limit,))
+        with db.read() as conn, DB_QUERY_SECONDS.time(('logs_attack',)):
+            rows = fetch_log_page(conn, query, params, cursor, limit + 1)
+            logs = load_payloads(conn, rows[:limit])
         
-        logs = [dict(row) for row in c.fetchall()]
-        conn.close()
+        next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit and limit > 0 else None
         
-        return jsonify({'attacks': logs}), 200
+        return jsonify({'attacks': logs, 'next_cursor': next_cursor}), 200
     except Exception as e:
         logger.error(f"Error fetching attack logs: {e}")
         return jsonify({'error': str(e)}), 500
 
+def parse_search_args(args):
+    """
+    Turn /api/logs/search query arguments into a search query.
+    Raises:
+        ValueError: On a missing or malformed query or parameter
+    Returns:
+        (query, params, limit, offset)
+    """
+    match = parse_search_query(args.get('q', ''))
+    order = args.get('order', 'rank')
+    if order not in SORT_ORDERS:
+        raise ValueError(f"order must be one of {', '.join(SORT_ORDERS)}")
+    limit = args.get('limit', LOG_SEARCH_DEFAULT_LIMIT, type=int)
+    offset = args.get('offset', 0, type=int)
+    if limit is None or not 0 < limit <= LOG_SEARCH_MAX_LIMIT or offset is None or offset < 0:
+        raise ValueError(f'limit must be 1-{LOG_SEARCH_MAX_LIMIT} and offset non-negative')
+    
+    query, params = build_search_query(
+        match,
+        log_type=args.get('type'),
+        device=args.get('device'),
+        user=args.get('user'),
+        severity=args.get('severity'),
+        since=args.get('since', type=int),
+        until=args.get('until', type=int),
+        order=order,
+        **payload_filter_args(args)
+    )
+    return query + ' LIMIT ? OFFSET ?', params + [limit + 1, offset], limit, offset
+
+@app.route('/api/logs/search', methods=['GET'])
+def search_logs():
+    """
+    Full-text search over log message, source and user.
+    ?q= takes terms, "phrases", prefix* terms and column:term filters;
+    type, device, user, severity, since/until (epoch ms) and the payload
+    fields action, payload_user, flag and client_id narrow the results. Sorted by relevance (order=rank) or newest first
+    (order=recent); page with limit/offset.
+    """
+    try:
+        try:
+            query, params, limit, offset = parse_search_args(request.args)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        try:
+            with db.read() as conn, DB_QUERY_SECONDS.time(('logs_search',)):
+                rows = conn.execute(query, params).fetchall()
+                results = load_payloads(conn, rows[:limit])
+        except sqlite3.OperationalError as e:
+            # e.g. a phrase FTS5 cannot parse
+            return jsonify({'error': f'Invalid search query: {e}'}), 400
+        
+        next_offset = offset + limit if len(rows) > limit else None
+        return jsonify({'results': results, 'next_offset': next_offset}), 200
+    except Exception as e:
+        logger.error(f"Error searching logs: {e}")
+        return jsonify({'error': str(e)}), 500
+
+def build_rollup_query(device=None, since=None, until=None):
+    """Build the SELECT and params for device_update_rollups filters."""
+    query = 'SELECT * FROM device_update_rollups WHERE 1=1'
+    params = []
+    if device:
+        query += ' AND device = ?'
+        params.append(device)
+    if since is not None:
+        query += ' AND minute >= ?'
+        params.append(since)
+    if until is not None:
+        query += ' AND minute < ?'
+        params.append(until)
+    query += ' ORDER BY minute DESC, device LIMIT ?'
+    return query, params
+
+@app.route('/api/logs/rollups', methods=['GET'])
+def get_log_rollups():
+    """
+    Per-device, per-minute DEVICE_UPDATE aggregates for rows that have
+    aged out of the raw logs table. Filter by device and since/until
+    (epoch ms, matched against the minute bucket).
+    """
+    try:
+        query, params = build_rollup_query(
+            request.args.get('device'),
+            request.args.get('since', type=int),
+            request.args.get('until', type=int)
+        )
+        limit = request.args.get('limit', 1000, type=int)
+        
+        with db.read() as conn, DB_QUERY_SECONDS.time(('logs_rollups',)):
+            rows = conn.execute(query, params + [limit]).fetchall()
+        
+        return jsonify({'rollups': [dict(row) for row in rows]}), 200
+    except Exception as e:
+        logger.error(f"Error fetching log rollups: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/stats', methods=['GET'])
+def get_stats():
+    """
+    Event and attack counts over the last 1m, 1h and 24h, by log type,
+    attack type, device and severity, plus the top=N most targeted devices.
+    Served from in-memory counters; never queries the logs table.
+    """
+    top_n = max(request.args.get('top', STATS_TOP_DEVICES, type=int), 0)
+    return jsonify({
+        'windows': event_stats.snapshot(top_n),
+        'generated_at': datetime.now().isoformat()
+    }), 200
+
+@app.route('/api/alerts/stream', methods=['GET'])
+def stream_alerts():
+    """
+    Stream security alerts as Server-Sent Events.
+    Browsers reconnect automatically and send Last-Event-ID, so alerts
+    published while they were disconnected are replayed from history.
+    """
+    try:
+        last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+        try:
+            last_event_id = int(last_event_id) if last_event_id else None
+        except ValueError:
+            last_event_id = None
+        
+        subscription = alert_hub.subscribe(last_event_id)
+        if subscription is None:
+            return jsonify({'error': 'Too many alert stream subscribers'}), 503
+        
+        return Response(
+            alert_hub.stream(subscription, heartbeat=ALERT_HEARTBEAT),
+            mimetype='text/event-stream',
+            headers={
+                'Cache-Control': 'no-cache',
+                'X-Accel-Buffering': 'no'
+            }
+        )
+    except Exception as e:
+        logger.error(f"Error opening alert stream: {e}")
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/logs/clear', methods=['POST'])
 def clear_logs():
     """Clear all logs (for demo/reset purposes)."""
@@ -437,11 +1139,13 @@ def clear_logs():
         if not user:
             return jsonify({'error': 'Not authenticated'}), 401
         
-        conn = sqlite3.connect(DATABASE)
-        c = conn.cursor()
-        c.execute('DELETE FROM logs')
-        conn.commit()
-        conn.close()
+        # Make sure queued rows are written before they are deleted
+        log_sink.flush()
+        
+        # Drop and recreate the table instead of deleting row by row
+        with DB_QUERY_SECONDS.time(('logs_clear',)):
+            log_retention.clear_logs()
+        event_stats.reset()
         
         log_event(
             message=f"Logs cleared by {user}",
@@ -455,24 +1159,201 @@ def clear_logs():
         logger.error(f"Error clearing logs: {e}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/rules', methods=['GET'])
+def get_rules():
+    """Get loaded detection rules with per-rule match counters and timing."""
+    try:
+        return jsonify(rule_engine.stats()), 200
+    except Exception as e:
+        logger.error(f"Error fetching rules: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/rules/reload', methods=['POST'])
+def reload_rules():
+    """Reload detection rules from the rules file without a restart."""
+    try:
+        user = session.get('user')
+        if not user:
+            return jsonify({'error': 'Not authenticated'}), 401
+        
+        if not rule_engine.load():
+            return jsonify({
+                'success': False,
+                'message': rule_engine.last_error or 'Rules file not found'
+            }), 400
+        
+        log_event(
+            message=f"Detection rules reloaded by {user}",
+            log_type="DEFENSE",
+            user=user,
+            severity="INFO"
+        )
+        return jsonify({'success': True, 'rules': rule_engine.stats()['rule_count']}), 200
+    except Exception as e:
+        logger.error(f"Error reloading rules: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/policy', methods=['GET'])
+def get_policy():
+    """Get the loaded authorization policy and the current user's devices."""
+    try:
+        user = session.get('user')
+        if not user:
+            return jsonify({'error': 'Not authenticated'}), 401
+        
+        policy = authz.policy
+        return jsonify({
+            **authz.stats(),
+            'user': user,
+            'devices': sorted(policy.grants.get(user, ()))
+        }), 200
+    except Exception as e:
+        logger.error(f"Error fetching policy: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/policy/reload', methods=['POST'])
+def reload_policy():
+    """Reload the authorization policy from the policy file without a restart."""
+    try:
+        user = session.get('user')
+        if not user:
+            return jsonify({'error': 'Not authenticated'}), 401
+        
+        if not authz.load():
+            return jsonify({
+                'success': False,
+                'message': authz.last_error or 'Policy file not found'
+            }), 400
+        
+        log_event(
+            message=f"Authorization policy reloaded by {user}",
+            log_type="DEFENSE",
+            user=user,
+            severity="INFO"
+        )
+        return jsonify({'success': True, 'users': len(authz.policy.users)}), 200
+    except Exception as e:
+        logger.error(f"Error reloading policy: {e}")
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint for monitoring."""
     return jsonify({
         'status': 'healthy',
         'mqtt_connected': mqtt_client is not None and mqtt_client.is_connected(),
-        'database': 'ok'
+        'mqtt_transport': MQTT_TRANSPORT,
+        'database': 'ok',
+        'db_connections': db.stats(),
+        'log_sink': log_sink.stats(),
+        'pipeline': ingest_pipeline.stats(),
+        'alerts': alert_hub.stats(),
+        'authz': authz.stats(),
+        'retention': log_retention.stats(),
+        'sessions': session_store.stats(),
+        'device_shadows': device_shadows.stats(),
+        'scaleout': supervisor.stats() if supervisor is not None else None,
+        'rate_detection': {
+            'device': device_rates.stats(),
+            'client': client_rates.stats(),
+            'reaper': rate_reaper.stats()
+        },
+        'anomaly_detection': anomaly_detector.stats()
     }), 200
 
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus scrape endpoint."""
+    return Response(metrics_registry.render(), mimetype='text/plain; version=0.0.4')
+
 # ==================== STARTUP ====================
 
-if __name__ == '__main__':
+def seed_event_stats():
+    """
+    Count logs from the last 24 hours into event_stats.
+    Attack types are not stored in the logs table, so seeded ATTACK rows
+    are counted under 'unknown'.
+    """
+    since_ms = int((time.time() - 86400) * 1000)
+    with db.read() as conn:
+        rows = conn.execute(
+            'SELECT ts, log_type, device, severity FROM logs WHERE ts >= ?',
+            (since_ms,)
+        )
+        for ts, log_type, device, severity in rows:
+            event_stats.record(log_type, device, severity, ts=ts / 1000)
+
+def start_services():
+    """
+    Start the background services shared by both backend modes.
+    Everything started here is stopped or flushed at exit.
+    """
     # Initialize database
     init_db()
+    atexit.register(db.close)
+    
+    # Expire old login sessions in the background
+    session_store.start_sweeper(SESSION_SWEEP_INTERVAL)
+    atexit.register(session_store.stop_sweeper)
+    
+    # Start the batched log writer and flush it on shutdown
+    log_sink.start()
+    atexit.register(log_sink.stop)
+    
+    # Warm-start device shadows from the last snapshot
+    if SHADOW_SNAPSHOT_INTERVAL:
+        with db.read() as conn:
+            device_shadows.load(conn)
+        device_shadows.start_snapshots(db.connect, DATABASE, SHADOW_SNAPSHOT_INTERVAL)
+        atexit.register(device_shadows.stop_snapshots)
+    
+    # Warm the /api/stats counters with the last day of logs (one indexed
+    # range scan at startup; requests are served from memory afterwards)
+    seed_event_stats()
+    
+    # Expire old logs in small batches in the background
+    if RETENTION_INTERVAL:
+        log_retention.start(RETENTION_INTERVAL)
+        atexit.register(log_retention.stop)
+    
+    # Load detection rules and watch the rules file for changes
+    rule_engine.load()
+    rule_engine.start_watcher(RULES_RELOAD_INTERVAL)
     
-    # Connect to MQTT broker
-    connect_mqtt()
+    # Load the authorization policy and watch it the same way
+    authz.load()
+    authz.start_watcher(POLICY_RELOAD_INTERVAL)
     
-    # Start Flask app on localhost:5000
-    # Note: Use debug=False in production
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    # End floods that stop outright, which no later message would report
+    if RATE_REAP_INTERVAL:
+        rate_reaper.start(RATE_REAP_INTERVAL)
+        atexit.register(rate_reaper.stop)
+    
+    # Score device behaviour over the recent window in the background
+    if ANOMALY_INTERVAL:
+        anomaly_detector.start(ANOMALY_INTERVAL)
+        atexit.register(anomaly_detector.stop)
+    
+    # Start detection workers; stopped before the log sink so queued
+    # messages are still logged on shutdown
+    ingest_pipeline.start()
+    atexit.register(ingest_pipeline.stop)
+
+if __name__ == '__main__':
+    if BACKEND_MODE == 'async':
+        # asyncio server (Quart + aiomqtt + aiosqlite) serving the same routes
+        from asgi_app import main
+        main()
+    elif BACKEND_MODE == 'scaleout':
+        # Supervisor + SCALEOUT_WORKERS detection processes
+        from scaleout import main
+        main()
+    else:
+        start_services()
+        
+        # Connect to MQTT broker
+        connect_mqtt()
+        
+        # Start Flask app on localhost:5000
+        # Note: Use debug=False in production
+        app.run(host='0.0.0.0', port=5000, debug=True)
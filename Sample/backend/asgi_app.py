@@ -0,0 +1,602 @@
+"""
+Smart Home Cybersecurity Training Platform - Async Backend
+asyncio entry point serving the same routes as app.py, built on Quart,
+an asyncio MQTT client (aiomqtt) and aiosqlite. Long-lived connections
+(alert streams, NDJSON exports) cost a coroutine instead of a thread.
+
+Detection, rate limiting, device shadows, rules, alerts and the log writer
+are shared with the threaded backend in app.py.
+
+Run with:
+    BACKEND_MODE=async python app.py
+"""
+
+import asyncio
+import json
+import logging
+import sqlite3
+import time
+from datetime import datetime
+
+import aiomqtt
+from quart import Quart, Response, jsonify, request, session
+from quart.sessions import SessionInterface
+
+import app as backend
+from authz import valid_device_name
+from async_db import AsyncDatabase
+from device_commands import plan_commands, publish_planned_async, audit_events, response_body
+from payload_store import payload_query, attach_payloads
+from session_store import StoreSessionInterface
+
+logger = logging.getLogger(__name__)
+
+# Connections in the aiosqlite read pool
+ASYNC_DB_POOL_SIZE = 4
+
+# Seconds between MQTT reconnect attempts
+MQTT_RECONNECT_DELAY = 5.0
+
+
+class AsyncStoreSessionInterface(SessionInterface):
+    """
+    Quart sessions in the Flask app's SessionStore, so both backends share
+    one session table and cache. Store calls (a SQLite read on a cache
+    miss, a write when the session is saved) run in a worker thread.
+    """
+
+    def __init__(self, store):
+        self._sessions = StoreSessionInterface(store)
+
+    async def open_session(self, app, request):
+        return await asyncio.to_thread(self._sessions.open_session, app, request)
+
+    async def save_session(self, app, session, response):
+        await asyncio.to_thread(self._sessions.save_session, app, session, response)
+
+
+# Initialize Quart app (same session key handling and store as the Flask app)
+asgi = Quart(__name__)
+asgi.config['SECRET_KEY'] = backend.app.config['SECRET_KEY']
+asgi.session_interface = AsyncStoreSessionInterface(backend.session_store)
+# Streaming responses (SSE, NDJSON exports) stay open indefinitely
+asgi.config['RESPONSE_TIMEOUT'] = None
+
+db = AsyncDatabase(backend.DATABASE, size=ASYNC_DB_POOL_SIZE, pragmas=backend.db.pragmas)
+
+# Connected asyncio MQTT client (None while disconnected)
+mqtt_client = None
+mqtt_task = None
+
+# ==================== CORS ====================
+
+@asgi.after_request
+async def add_cors_headers(response):
+    """Allow credentialed requests from the React frontend (as Flask-CORS does)."""
+    origin = request.headers.get('Origin')
+    if origin:
+        response.headers['Access-Control-Allow-Origin'] = origin
+        response.headers['Access-Control-Allow-Credentials'] = 'true'
+        response.headers['Vary'] = 'Origin'
+        if request.method == 'OPTIONS':
+            response.headers['Access-Control-Allow-Methods'] = 'GET, POST, OPTIONS'
+            response.headers['Access-Control-Allow-Headers'] = (
+                request.headers.get('Access-Control-Request-Headers', 'Content-Type')
+            )
+    return response
+
+# ==================== MQTT ====================
+
+async def run_mqtt():
+    """
+    Connect to the broker, subscribe to /devices/# and feed messages into
+    the shared ingestion pipeline. Reconnects until cancelled.
+    """
+    global mqtt_client
+
+    while True:
+        try:
+            async with aiomqtt.Client(
+                backend.MQTT_BROKER,
+                backend.MQTT_PORT,
+                identifier='flask_backend',
+                keepalive=60,
+                max_inflight_messages=backend.MQTT_MAX_INFLIGHT
+            ) as client:
+                mqtt_client = client
+                backend.MQTT_CONNECTS.inc()
+                logger.info("Connected to MQTT broker (async)")
+                await client.subscribe('/devices/#')
+                backend.log_event("Connected to MQTT broker", "DEVICE_UPDATE")
+
+                async for message in client.messages:
+                    # Same hand-off as on_message: detection runs on the
+                    # pipeline's worker threads, never on the event loop
+                    topic = str(message.topic)
+                    backend.MQTT_MESSAGES.inc((backend.topic_label(topic),))
+                    backend.ingest_pipeline.submit(topic, message.payload, time.time())
+        except aiomqtt.MqttError as e:
+            backend.MQTT_DISCONNECTS.inc()
+            logger.warning(f"MQTT connection error ({e}); retrying in {MQTT_RECONNECT_DELAY}s")
+        finally:
+            mqtt_client = None
+        await asyncio.sleep(MQTT_RECONNECT_DELAY)
+
+@asgi.before_serving
+async def startup():
+    global mqtt_task
+    backend.start_services()
+    await db.open()
+    mqtt_task = asyncio.create_task(run_mqtt())
+
+@asgi.after_serving
+async def shutdown():
+    if mqtt_task:
+        mqtt_task.cancel()
+    await db.close()
+
+# ==================== API ENDPOINTS ====================
+
+@asgi.route('/api/login', methods=['POST'])
+async def login():
+    """User login endpoint (see app.login)."""
+    try:
+        data = await request.get_json()
+        username = data.get('username')
+        password = data.get('password')
+
+        if username and password == 'demo':
+            session['user'] = username
+            session['authorized'] = True
+            backend.log_event(
+                message=f"User {username} logged in",
+                log_type="AUTH",
+                user=username,
+                severity="INFO"
+            )
+            return jsonify({
+                'success': True,
+                'message': 'Login successful',
+                'user': username
+            }), 200
+        else:
+            backend.log_event(
+                message=f"Failed login attempt for user {username}",
+                log_type="AUTH",
+                user=username,
+                severity="WARNING"
+            )
+            return jsonify({'success': False, 'message': 'Invalid credentials'}), 401
+    except Exception as e:
+        logger.error(f"Login error: {e}")
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+@asgi.route('/api/logout', methods=['POST'])
+async def logout():
+    """Logout endpoint - clear user session."""
+    try:
+        user = session.get('user')
+        session.clear()
+        backend.log_event(
+            message=f"User {user} logged out",
+            log_type="AUTH",
+            user=user,
+            severity="INFO"
+        )
+        return jsonify({'success': True, 'message': 'Logout successful'}), 200
+    except Exception as e:
+        logger.error(f"Logout error: {e}")
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+@asgi.route('/api/session', methods=['GET'])
+async def get_session():
+    """Get current user session information."""
+    if 'user' in session:
+        return jsonify({'authenticated': True, 'user': session['user']}), 200
+    return jsonify({'authenticated': False}), 401
+
+@asgi.route('/api/devices', methods=['GET'])
+async def get_devices():
+    """Get device shadows with If-None-Match revalidation (see app.get_devices)."""
+    try:
+        user = session.get('user')
+        if not user:
+            return jsonify({'error': 'Not authenticated'}), 401
+
+        policy = backend.authz.policy
+        etag = backend.device_shadows.etag(policy.digest, user)
+        if request.if_none_match.contains_weak(etag):
+            response = Response('', status=304)
+            response.set_etag(etag, weak=True)
+            return response
+
+        devices = backend.device_shadows.list_devices(time.time())
+        for device in devices:
+            device['authorized'] = policy.allowed(user, device['name'])
+
+        response = jsonify({'devices': devices})
+        response.set_etag(etag, weak=True)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response, 200
+    except Exception as e:
+        logger.error(f"Error fetching devices: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@asgi.route('/api/control-device', methods=['POST'])
+async def control_device():
+    """Control a device via MQTT (see app.control_device)."""
+    try:
+        user = session.get('user')
+        if not user:
+            return jsonify({'error': 'Not authenticated'}), 401
+
+        data = await request.get_json()
+        device = data.get('device')
+        action = data.get('action')
+        if not valid_device_name(device):
+            return jsonify({'error': 'device must be a single topic level (no /, + or #)'}), 400
+
+        if not backend.authz.allowed(user, device):
+            backend.log_event(
+                message=f"User {user} attempted unauthorized control of {device}",
+                log_type="ATTACK",
+                device=device,
+                user=user,
+                severity="WARNING",
+                category='unauthorized_control'
+            )
+            return jsonify({'error': 'Unauthorized device access'}), 403
+
+        topic = f'/devices/{device}'
+        payload = backend.command_signer.payload(action, user)
+
+        if mqtt_client:
+            await mqtt_client.publish(topic, payload)
+            backend.log_event(
+                message=f"Device control command sent: {device} -> {action}",
+                log_type="DEVICE_UPDATE",
+                device=device,
+                user=user,
+                source=topic
+            )
+            return jsonify({'success': True, 'message': 'Command sent'}), 200
+        else:
+            return jsonify({'error': 'MQTT connection failed'}), 500
+    except Exception as e:
+        logger.error(f"Device control error: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@asgi.route('/api/control-devices', methods=['POST'])
+async def control_devices():
+    """Control several devices in one request (see app.control_devices)."""
+    try:
+        user = session.get('user')
+        if not user:
+            return jsonify({'error': 'Not authenticated'}), 401
+
+        data = await request.get_json(silent=True) or {}
+        commands = data.get('commands')
+        if not isinstance(commands, list) or not commands:
+            return jsonify({'error': 'commands must be a non-empty list'}), 400
+        if len(commands) > backend.BULK_MAX_COMMANDS:
+            return jsonify({'error': f'At most {backend.BULK_MAX_COMMANDS} commands per request'}), 400
+        qos = data.get('qos', backend.BULK_COMMAND_QOS)
+        if qos not in (0, 1, 2):
+            return jsonify({'error': 'qos must be 0, 1 or 2'}), 400
+
+        if not mqtt_client:
+            return jsonify({'error': 'MQTT connection failed'}), 500
+
+        results = plan_commands(commands, user, backend.authz.policy, backend.command_signer)
+        await publish_planned_async(mqtt_client, results, qos=qos, timeout=backend.BULK_PUBLISH_TIMEOUT)
+        backend.log_events(audit_events(user, results))
+
+        return jsonify(response_body(results)), 200
+    except Exception as e:
+        logger.error(f"Bulk device control error: {e}")
+        return jsonify({'error': str(e)}), 500
+
+async def fetch_log_page(query, params, cursor, limit):
+    """Async equivalent of app.fetch_log_page."""
+    if cursor:
+        query += ' AND (ts, id) < (?, ?)'
+        params = params + list(cursor)
+    query += ' ORDER BY ts DESC, id DESC LIMIT ?'
+    return await db.fetch_all(query, params + [limit])
+
+async def load_payloads(rows):
+    """Async equivalent of payload_store.load_payloads."""
+    query = payload_query(rows)
+    payload_rows = await db.fetch_all(*query) if query else []
+    return attach_payloads(rows, payload_rows)
+
+async def stream_logs_ndjson(query, params, cursor, limit, chunk_size=backend.LOG_STREAM_CHUNK_SIZE):
+    """Async equivalent of app.stream_logs_ndjson."""
+    remaining = limit
+    while remaining is None or remaining > 0:
+        size = chunk_size if remaining is None else min(chunk_size, remaining)
+        with backend.DB_QUERY_SECONDS.time(('logs_ndjson',)):
+            rows = await fetch_log_page(query, params, cursor, size)
+        if not rows:
+            break
+        yield ''.join(json.dumps(log) + '\n' for log in await load_payloads(rows))
+        cursor = (rows[-1]['ts'], rows[-1]['id'])
+        if remaining is not None:
+            remaining -= len(rows)
+        if len(rows) < size:
+            break
+
+@asgi.route('/api/logs', methods=['GET'])
+async def get_logs():
+    """Retrieve logs with keyset paging or NDJSON streaming (see app.get_logs)."""
+    try:
+        log_type = request.args.get('type')
+        device = request.args.get('device')
+        since = request.args.get('since', type=int)
+        until = request.args.get('until', type=int)
+        output_format = request.args.get('format', 'json')
+
+        try:
+            cursor = backend.decode_cursor(request.args['cursor']) if request.args.get('cursor') else None
+        except ValueError:
+            return jsonify({'error': 'Invalid cursor'}), 400
+
+        try:
+            query, params = backend.build_log_query(log_type, device, since, until,
+                                                    **backend.payload_filter_args(request.args))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        if output_format == 'ndjson':
+            limit = request.args.get('limit', type=int)
+            return Response(
+                stream_logs_ndjson(query, params, cursor, limit),
+                mimetype='application/x-ndjson'
+            )
+
+        limit = request.args.get('limit', 100, type=int)
+        with backend.DB_QUERY_SECONDS.time(('logs',)):
+            rows = await fetch_log_page(query, params, cursor, limit + 1)
+            logs = await load_payloads(rows[:limit])
+
+        next_cursor = backend.encode_cursor(rows[limit - 1]) if len(rows) > limit and limit > 0 else None
+
+        return jsonify({'logs': logs, 'next_cursor': next_cursor}), 200
+    except Exception as e:
+        logger.error(f"Error fetching logs: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@asgi.route('/api/logs/attack', methods=['GET'])
+async def get_attack_logs():
+    """Get only attack logs (security alerts)."""
+    try:
+        limit = request.args.get('limit', 50, type=int)
+
+        try:
+            cursor = backend.decode_cursor(request.args['cursor']) if request.args.get('cursor') else None
+        except ValueError:
+            return jsonify({'error': 'Invalid cursor'}), 400
+
+        try:
+            query, params = backend.build_log_query(log_type='ATTACK', **backend.payload_filter_args(request.args))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        with backend.DB_QUERY_SECONDS.time(('logs_attack',)):
+            rows = await fetch_log_page(query, params, cursor, limit + 1)
+            logs = await load_payloads(rows[:limit])
+
+        next_cursor = backend.encode_cursor(rows[limit - 1]) if len(rows) > limit and limit > 0 else None
+
+        return jsonify({'attacks': logs, 'next_cursor': next_cursor}), 200
+    except Exception as e:
+        logger.error(f"Error fetching attack logs: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@asgi.route('/api/logs/search', methods=['GET'])
+async def search_logs():
+    """Full-text search over log message, source and user (see app.search_logs)."""
+    try:
+        try:
+            query, params, limit, offset = backend.parse_search_args(request.args)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        try:
+            with backend.DB_QUERY_SECONDS.time(('logs_search',)):
+                rows = await db.fetch_all(query, params)
+                results = await load_payloads(rows[:limit])
+        except sqlite3.OperationalError as e:
+            return jsonify({'error': f'Invalid search query: {e}'}), 400
+
+        next_offset = offset + limit if len(rows) > limit else None
+        return jsonify({'results': results, 'next_offset': next_offset}), 200
+    except Exception as e:
+        logger.error(f"Error searching logs: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@asgi.route('/api/logs/rollups', methods=['GET'])
+async def get_log_rollups():
+    """Per-device, per-minute DEVICE_UPDATE aggregates (see app.get_log_rollups)."""
+    try:
+        query, params = backend.build_rollup_query(
+            request.args.get('device'),
+            request.args.get('since', type=int),
+            request.args.get('until', type=int)
+        )
+        limit = request.args.get('limit', 1000, type=int)
+        with backend.DB_QUERY_SECONDS.time(('logs_rollups',)):
+            rows = await db.fetch_all(query, params + [limit])
+        return jsonify({'rollups': [dict(row) for row in rows]}), 200
+    except Exception as e:
+        logger.error(f"Error fetching log rollups: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@asgi.route('/api/stats', methods=['GET'])
+async def get_stats():
+    """Windowed event and attack counts (see app.get_stats)."""
+    top_n = max(request.args.get('top', backend.STATS_TOP_DEVICES, type=int), 0)
+    return jsonify({
+        'windows': backend.event_stats.snapshot(top_n),
+        'generated_at': datetime.now().isoformat()
+    }), 200
+
+@asgi.route('/api/alerts/stream', methods=['GET'])
+async def stream_alerts():
+    """Stream security alerts as Server-Sent Events (see app.stream_alerts)."""
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        last_event_id = None
+
+    subscription = backend.alert_hub.subscribe(last_event_id, loop=asyncio.get_running_loop())
+    if subscription is None:
+        return jsonify({'error': 'Too many alert stream subscribers'}), 503
+
+    response = Response(
+        backend.alert_hub.stream_async(subscription, heartbeat=backend.ALERT_HEARTBEAT),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        }
+    )
+    response.timeout = None
+    return response
+
+@asgi.route('/api/logs/clear', methods=['POST'])
+async def clear_logs():
+    """Clear all logs (for demo/reset purposes)."""
+    try:
+        user = session.get('user')
+        if not user:
+            return jsonify({'error': 'Not authenticated'}), 401
+
+        # Make sure queued rows are written before they are deleted
+        await asyncio.to_thread(backend.log_sink.flush)
+        with backend.DB_QUERY_SECONDS.time(('logs_clear',)):
+            await asyncio.to_thread(backend.log_retention.clear_logs)
+        backend.event_stats.reset()
+
+        backend.log_event(
+            message=f"Logs cleared by {user}",
+            log_type="DEFENSE",
+            user=user,
+            severity="INFO"
+        )
+        return jsonify({'success': True, 'message': 'Logs cleared'}), 200
+    except Exception as e:
+        logger.error(f"Error clearing logs: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@asgi.route('/api/rules', methods=['GET'])
+async def get_rules():
+    """Get loaded detection rules with per-rule match counters and timing."""
+    return jsonify(backend.rule_engine.stats()), 200
+
+@asgi.route('/api/rules/reload', methods=['POST'])
+async def reload_rules():
+    """Reload detection rules from the rules file without a restart."""
+    user = session.get('user')
+    if not user:
+        return jsonify({'error': 'Not authenticated'}), 401
+
+    if not await asyncio.to_thread(backend.rule_engine.load):
+        return jsonify({
+            'success': False,
+            'message': backend.rule_engine.last_error or 'Rules file not found'
+        }), 400
+
+    backend.log_event(
+        message=f"Detection rules reloaded by {user}",
+        log_type="DEFENSE",
+        user=user,
+        severity="INFO"
+    )
+    return jsonify({'success': True, 'rules': backend.rule_engine.stats()['rule_count']}), 200
+
+@asgi.route('/api/policy', methods=['GET'])
+async def get_policy():
+    """Get the loaded authorization policy and the current user's devices."""
+    user = session.get('user')
+    if not user:
+        return jsonify({'error': 'Not authenticated'}), 401
+
+    policy = backend.authz.policy
+    return jsonify({
+        **backend.authz.stats(),
+        'user': user,
+        'devices': sorted(policy.grants.get(user, ()))
+    }), 200
+
+@asgi.route('/api/policy/reload', methods=['POST'])
+async def reload_policy():
+    """Reload the authorization policy from the policy file without a restart."""
+    user = session.get('user')
+    if not user:
+        return jsonify({'error': 'Not authenticated'}), 401
+
+    if not await asyncio.to_thread(backend.authz.load):
+        return jsonify({
+            'success': False,
+            'message': backend.authz.last_error or 'Policy file not found'
+        }), 400
+
+    backend.log_event(
+        message=f"Authorization policy reloaded by {user}",
+        log_type="DEFENSE",
+        user=user,
+        severity="INFO"
+    )
+    return jsonify({'success': True, 'users': len(backend.authz.policy.users)}), 200
+
+@asgi.route('/health', methods=['GET'])
+async def health_check():
+    """Health check endpoint for monitoring."""
+    return jsonify({
+        'status': 'healthy',
+        'mode': 'async',
+        'mqtt_connected': mqtt_client is not None,
+        'database': 'ok',
+        'log_sink': backend.log_sink.stats(),
+        'pipeline': backend.ingest_pipeline.stats(),
+        'alerts': backend.alert_hub.stats(),
+        'authz': backend.authz.stats(),
+        'retention': backend.log_retention.stats(),
+        'device_shadows': backend.device_shadows.stats(),
+        'rate_detection': {
+            'device': backend.device_rates.stats(),
+            'client': backend.client_rates.stats(),
+            'reaper': backend.rate_reaper.stats()
+        },
+        'anomaly_detection': backend.anomaly_detector.stats()
+    }), 200
+
+@asgi.route('/metrics', methods=['GET'])
+async def metrics():
+    """Prometheus scrape endpoint (shares app.metrics_registry)."""
+    return Response(backend.metrics_registry.render(), mimetype='text/plain; version=0.0.4')
+
+# ==================== STARTUP ====================
+
+def main(host='0.0.0.0', port=5000):
+    """Serve the async backend with Hypercorn."""
+    from hypercorn.asyncio import serve
+    from hypercorn.config import Config
+
+    config = Config()
+    config.bind = [f'{host}:{port}']
+    # Idle keep-alive connections are cheap here; keep them around
+    config.keep_alive_timeout = 75
+    config.backlog = 2048
+
+    if backend.MQTT_TRANSPORT == 'embedded':
+        # aiomqtt needs a network broker; the embedded one is sync-mode only
+        logger.warning("MQTT_TRANSPORT=embedded is not supported in async mode; using aiomqtt")
+    logger.info(f"Starting async backend on {host}:{port}")
+    asyncio.run(serve(asgi, config))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""
+Smart Home Cybersecurity Training Platform - Async SQLite Access
+Small pool of aiosqlite connections used by the asyncio backend, so API
+handlers await queries instead of blocking the event loop.
+"""
+
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+
+import aiosqlite
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncDatabase:
+    """
+    Pool of aiosqlite connections.
+    Each aiosqlite connection runs its queries on its own thread; a pool of
+    a few lets concurrent requests read in parallel under WAL.
+    """
+
+    def __init__(self, database, size=4, pragmas=()):
+        """
+        Args:
+            database: Path to the SQLite database file
+            size: Number of pooled connections
+            pragmas: Extra PRAGMA statements run on each connection
+                     (e.g. db.tuning_pragmas())
+        """
+        self.database = database
+        self.size = size
+        self.pragmas = list(pragmas)
+        self._pool = None
+        self._connections = []
+
+    async def open(self):
+        self._pool = asyncio.Queue()
+        for _ in range(self.size):
+            conn = await aiosqlite.connect(self.database)
+            conn.row_factory = aiosqlite.Row
+            # Same per-connection pragmas as migrations.apply_pragmas
+            await conn.execute('PRAGMA synchronous=NORMAL')
+            await conn.execute('PRAGMA busy_timeout=5000')
+            for pragma in self.pragmas:
+                await conn.execute(pragma)
+            self._connections.append(conn)
+            self._pool.put_nowait(conn)
+        logger.info(f"Async database pool opened ({self.size} connections)")
+
+    async def close(self):
+        for conn in self._connections:
+            await conn.close()
+        self._connections = []
+
+    @asynccontextmanager
+    async def connection(self):
+        """Borrow a pooled connection for the duration of the block."""
+        conn = await self._pool.get()
+        try:
+            yield conn
+        finally:
+            self._pool.put_nowait(conn)
+
+    async def fetch_all(self, query, params=()):
+        async with self.connection() as conn:
+            async with conn.execute(query, params) as cursor:
+                return await cursor.fetchall()
+
+    async def execute(self, query, params=()):
+        """Run a write statement in its own transaction; returns rowcount."""
+        async with self.connection() as conn:
+            cursor = await conn.execute(query, params)
+            await conn.commit()
+            return cursor.rowcount
@@ -0,0 +1,297 @@
+"""
+Smart Home Cybersecurity Training Platform - Authorization Index
+Device control policy declared as data (users, device groups and wildcard
+device patterns) and compiled into lookup structures, so checking whether
+a user may control a device is a set or bitmap lookup. The same index
+backs /api/control-device and the ingest-time check on messages published
+straight to the broker.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Built-in policy used when no policy file exists
+DEFAULT_POLICY = {
+    'groups': {},
+    'users': {
+        'user1': ['light1', 'light2', 'thermostat', 'lock'],
+        'user2': ['light1']
+    }
+}
+
+# Devices outside the known set whose bitmap is cached after first lookup
+MAX_RESOLVED_DEVICES = 10000
+
+_WILDCARD_CHARS = frozenset('*?[')
+
+# Characters that would make a device name span topic levels or act as an
+# MQTT wildcard once it is put into /devices/<name>
+_TOPIC_CHARS = frozenset('/+#')
+_LEVEL_CHAR = '[^/+#]'
+
+
+def _is_pattern(entry):
+    return not _WILDCARD_CHARS.isdisjoint(entry)
+
+
+def valid_device_name(device):
+    """True if device is a non-empty name of exactly one topic level."""
+    return isinstance(device, str) and bool(device) and _TOPIC_CHARS.isdisjoint(device)
+
+
+def _translate(pattern):
+    """
+    Regex for a shell-style device pattern. Same syntax as fnmatch, except
+    that * and ? only match within one topic level (never /, + or #).
+    """
+    parts = []
+    i, n = 0, len(pattern)
+    while i < n:
+        c = pattern[i]
+        i += 1
+        if c == '*':
+            parts.append(_LEVEL_CHAR + '*')
+        elif c == '?':
+            parts.append(_LEVEL_CHAR)
+        elif c == '[':
+            j = i + 1 if i < n and pattern[i] in '!]' else i
+            j = pattern.find(']', j)
+            if j < 0:
+                parts.append(re.escape(c))
+                continue
+            body = pattern[i:j].replace('\\', '\\\\')
+            if body.startswith('!'):
+                body = '^' + body[1:]
+            elif body.startswith('^'):
+                body = '\\' + body
+            parts.append(f'[{body}]')
+            i = j + 1
+        else:
+            parts.append(re.escape(c))
+    return r'(?s:%s)\Z' % ''.join(parts)
+
+
+class Policy:
+    """
+    One compiled, immutable-once-built policy.
+    Each user gets a bit; each device gets a bitmap of the users allowed
+    to control it, with group references and wildcards expanded up front
+    for every known device. Devices first seen later (e.g. a new topic on
+    the broker) are matched against the wildcard patterns once and cached.
+    """
+
+    def __init__(self, spec, known_devices=()):
+        """
+        Args:
+            spec: {'groups': {name: [device or pattern]},
+                   'users': {user: [device, pattern or '@group']}}
+            known_devices: Device names to pre-expand wildcards over
+        Raises:
+            ValueError: If a user references an undefined group
+        """
+        groups = spec.get('groups') or {}
+        users = spec.get('users') or {}
+
+        self.users = tuple(sorted(users))
+        self.user_bits = {user: 1 << index for index, user in enumerate(self.users)}
+
+        exact = {}
+        patterns = {}
+        for user in self.users:
+            bit = self.user_bits[user]
+            for entry in self._expand(user, users[user], groups):
+                if _is_pattern(entry):
+                    patterns[entry] = patterns.get(entry, 0) | bit
+                else:
+                    exact[entry] = exact.get(entry, 0) | bit
+
+        self._patterns = tuple(
+            (re.compile(_translate(pattern)).match, mask)
+            for pattern, mask in sorted(patterns.items())
+        )
+        self._exact = exact
+
+        # Pre-expanded bitmap per device
+        self.device_masks = {}
+        for device in set(exact).union(known_devices):
+            self.device_masks[device] = self._compute_mask(device)
+        self._resolved = {}
+
+        # Per-user device sets over the pre-expanded devices
+        grants = {user: set() for user in self.users}
+        for device, mask in self.device_masks.items():
+            for user in self._users_in(mask):
+                grants[user].add(device)
+        self.grants = {user: frozenset(devices) for user, devices in grants.items()}
+
+        canonical = json.dumps({'groups': groups, 'users': users}, sort_keys=True)
+        self.digest = hashlib.sha1(canonical.encode()).hexdigest()[:12]
+
+    @staticmethod
+    def _expand(user, entries, groups):
+        for entry in entries:
+            if entry.startswith('@'):
+                name = entry[1:]
+                if name not in groups:
+                    raise ValueError(f"User {user} references undefined group {name}")
+                yield from groups[name]
+            else:
+                yield entry
+
+    def _users_in(self, mask):
+        # Walk the set bits only, lowest first
+        while mask:
+            low = mask & -mask
+            yield self.users[low.bit_length() - 1]
+            mask ^= low
+
+    def _compute_mask(self, device):
+        mask = self._exact.get(device, 0)
+        for match, pattern_mask in self._patterns:
+            if match(device):
+                mask |= pattern_mask
+        return mask
+
+    def mask_for(self, device):
+        """Bitmap of the users allowed to control device."""
+        if not valid_device_name(device):
+            return 0
+        mask = self.device_masks.get(device)
+        if mask is not None:
+            return mask
+        mask = self._resolved.get(device)
+        if mask is None:
+            mask = self._compute_mask(device) if self._patterns else 0
+            # Bounded: device names on the broker are attacker-controlled
+            if len(self._resolved) < MAX_RESOLVED_DEVICES:
+                self._resolved[device] = mask
+        return mask
+
+    def allowed(self, user, device):
+        # light+ or light1/x would address a wildcard or another device's
+        # subtopic, whatever the grants say
+        if not valid_device_name(device):
+            return False
+        devices = self.grants.get(user)
+        if devices is None:
+            return False
+        if device in devices:
+            return True
+        if device in self.device_masks:
+            return False
+        return bool(self.mask_for(device) & self.user_bits[user])
+
+    def users_for(self, device):
+        """Users allowed to control device, in policy order."""
+        return list(self._users_in(self.mask_for(device)))
+
+
+class AuthzIndex:
+    """
+    Loads the authorization policy and answers allowed(user, device).
+    The active Policy is swapped atomically on reload, so request handlers
+    and detection workers never see a half-built index.
+    """
+
+    def __init__(self, policy_file=None, known_devices=()):
+        """
+        Args:
+            policy_file: Path to a JSON policy file; DEFAULT_POLICY is used
+                         if it is None or does not exist
+            known_devices: Device names to pre-expand wildcards over
+        """
+        self.policy_file = policy_file
+        self.known_devices = tuple(known_devices)
+        self._mtime = None
+        self._policy = Policy(DEFAULT_POLICY, self.known_devices)
+        self._watcher = None
+        self._stop = threading.Event()
+        self.reloads = 0
+        self.last_error = None
+
+    @property
+    def policy(self):
+        return self._policy
+
+    def load(self):
+        """
+        (Re)load the policy from policy_file.
+        On error the previous policy stays active.
+        Returns:
+            True if a new policy was installed
+        """
+        if not self.policy_file or not os.path.exists(self.policy_file):
+            return False
+
+        try:
+            mtime = os.path.getmtime(self.policy_file)
+            with open(self.policy_file) as f:
+                policy = Policy(json.load(f), self.known_devices)
+        except Exception as e:
+            self.last_error = str(e)
+            logger.error(f"Failed to load authorization policy from {self.policy_file}: {e}")
+            return False
+
+        self._policy = policy
+        self._mtime = mtime
+        self.reloads += 1
+        self.last_error = None
+        logger.info(f"Loaded authorization policy for {len(policy.users)} users from {self.policy_file}")
+        return True
+
+    def install(self, spec):
+        """Compile a policy spec and make it the active policy."""
+        policy = Policy(spec, self.known_devices)
+        self._policy = policy
+        return policy
+
+    def reload_if_changed(self):
+        """Reload the policy file if its modification time changed."""
+        if not self.policy_file:
+            return False
+        try:
+            mtime = os.path.getmtime(self.policy_file)
+        except OSError:
+            return False
+        if mtime == self._mtime:
+            return False
+        return self.load()
+
+    def start_watcher(self, interval=2.0):
+        """Poll the policy file in a background thread and hot-reload on change."""
+        if self._watcher is not None:
+            return
+
+        def watch():
+            while not self._stop.wait(interval):
+                self.reload_if_changed()
+
+        self._watcher = threading.Thread(target=watch, name='policy-watcher', daemon=True)
+        self._watcher.start()
+
+    def stop_watcher(self):
+        self._stop.set()
+        self._watcher = None
+
+    def allowed(self, user, device):
+        """True if user may control device under the current policy."""
+        return self._policy.allowed(user, device)
+
+    def stats(self):
+        policy = self._policy
+        return {
+            'policy_file': self.policy_file,
+            'reloads': self.reloads,
+            'last_error': self.last_error,
+            'digest': policy.digest,
+            'users': len(policy.users),
+            'devices': len(policy.device_masks),
+            'patterns': len(policy._patterns),
+            'resolved_devices': len(policy._resolved)
+        }
@@ -0,0 +1,146 @@
+"""
+Smart Home Backend - Anomaly Scoring Benchmark
+Feeds simulated telemetry for many devices into AnomalyDetector and times
+each scoring pass over the 1-minute window against the scheduling
+interval. A few devices misbehave after the baselines are learned
+(a flood and an unusual action); the benchmark checks they are reported
+and counts false positives. For comparison, the same window
+features are also computed with a per-device Python loop.
+
+Usage:
+    python benchmarks/bench_anomaly_scoring.py --devices 10000 --rate 1.0
+"""
+
+import argparse
+import json
+import math
+import os
+import statistics
+import sys
+import time
+from collections import Counter, defaultdict
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from anomaly_detector import AnomalyDetector  # noqa: E402
+
+ACTIONS = ('on', 'off', 'set', 'status')
+
+
+def features_python(window_events, window_start):
+    """Per-device loop computing the detector's window features (no baselines)."""
+    by_device = defaultdict(list)
+    for device, ts, action in window_events:
+        if ts >= window_start:
+            by_device[device].append((ts, action))
+    features = {}
+    for device, events in by_device.items():
+        events.sort()
+        counts = defaultdict(int)
+        for _, action in events:
+            counts[action] += 1
+        entropy = -sum(c / len(events) * math.log2(c / len(events)) for c in counts.values())
+        gaps = [b[0] - a[0] for a, b in zip(events, events[1:])]
+        burstiness = statistics.pstdev(gaps) / statistics.mean(gaps) if len(gaps) > 1 and sum(gaps) else 0.0
+        features[device] = (len(events), entropy, burstiness)
+    return features
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--devices', type=int, default=10000)
+    parser.add_argument('--rate', type=float, default=1.0, help='Messages per second per device')
+    parser.add_argument('--interval', type=float, default=10.0, help='Seconds between scoring passes')
+    parser.add_argument('--window', type=float, default=60.0)
+    parser.add_argument('--passes', type=int, default=24, help='Scoring passes after the first window')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='Write results as JSON to this file')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    # Daytime, so every pass is scored against the daytime baselines
+    now = time.mktime(time.strptime('2026-01-05 12:00:00', '%Y-%m-%d %H:%M:%S'))
+    detector = AnomalyDetector(window=args.window, max_devices=args.devices, max_events=5000000)
+    names = [f'device{i}' for i in range(args.devices)]
+    # Each device mostly alternates between its own two actions
+    usual = rng.integers(0, len(ACTIONS), size=(args.devices, 2))
+
+    warmup_passes = int(args.window / args.interval) + detector.warmup
+    attack_pass = warmup_passes + args.passes // 2
+    injected = {'device7': 'flood', 'device42': 'unusual_action'}
+    pass_ms = []
+    record_s = 0.0
+    recorded = 0
+    found = {}
+    false_positives = Counter()
+    last_window = []
+
+    for index in range(warmup_passes + args.passes):
+        per_device = rng.poisson(args.rate * args.interval, args.devices)
+        total = int(per_device.sum())
+        devices = np.repeat(np.arange(args.devices), per_device)
+        ts = now + rng.random(total) * args.interval
+        choice = usual[devices, rng.integers(0, 2, total)]
+        events = [(names[d], t, ACTIONS[a]) for d, t, a in zip(devices.tolist(), ts.tolist(), choice.tolist())]
+        if index == attack_pass:
+            events += [('device7', now + k * args.interval / 400, 'on') for k in range(400)]
+            events += [('device42', now + k / 3, 'unlock') for k in range(30)]
+
+        start = time.perf_counter()
+        for device, t, action in events:
+            detector.record(device, t, action)
+        record_s += time.perf_counter() - start
+        recorded += len(events)
+        last_window = (last_window + events)[-int(args.devices * args.rate * args.window * 1.5):]
+
+        now += args.interval
+        anomalies = detector.score(now)
+        if index >= warmup_passes:
+            pass_ms.append(detector.last_pass_ms)
+        for anomaly in anomalies:
+            if anomaly.device in injected:
+                found.setdefault(anomaly.device, anomaly.describe())
+            else:
+                false_positives.update(reason[0] for reason in anomaly.reasons)
+
+    start = time.perf_counter()
+    features_python(last_window, now - args.window)
+    python_ms = (time.perf_counter() - start) * 1000
+
+    pass_ms.sort()
+    results = {
+        'window_events': len(detector._window_ts),
+        'record_per_s': round(recorded / record_s),
+        'score_p50_ms': round(statistics.median(pass_ms), 1),
+        'score_max_ms': round(pass_ms[-1], 1),
+        'python_loop_ms': round(python_ms, 1),
+        'interval_ms': args.interval * 1000,
+        'detected': sorted(found),
+        'missed': sorted(set(injected) - set(found)),
+        'false_positives': sum(false_positives.values()),
+        'false_positive_features': dict(false_positives),
+        'device_passes': args.devices * args.passes
+    }
+
+    print(f"{args.devices:,} devices at {args.rate:g} msg/s, {args.window:g}s window "
+          f"({results['window_events']:,} messages), scored every {args.interval:g}s")
+    print(f"record(): {results['record_per_s']:,} messages/s")
+    print(f"{'':24} {'ms':>10}")
+    print(f"{'vectorized pass (p50)':24} {results['score_p50_ms']:10,}")
+    print(f"{'vectorized pass (max)':24} {results['score_max_ms']:10,}")
+    print(f"{'per-device Python loop':24} {results['python_loop_ms']:10,}   (features only)")
+    for device, kind in injected.items():
+        print(f"  {kind:15} {device:10} {'reported: ' + found[device] if device in found else 'MISSED'}")
+    print(f"  false positives: {results['false_positives']} in {results['device_passes']:,} device-passes "
+          f"{dict(false_positives) or ''}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'benchmark': 'anomaly_scoring', 'devices': args.devices, 'rate': args.rate,
+                       'window': args.window, **results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,419 @@
+"""
+Smart Home Backend - Load Generation and End-to-End Benchmark
+Replays a configurable mix of normal device telemetry and the Attack page's
+four attack patterns at a target rate, then reports:
+  - ingestion throughput (msgs/sec through detection)
+  - end-to-end detection latency: publish -> alert delivered, and
+    publish -> ATTACK row committed
+  - detection rate per traffic pattern
+  - API latency p50/p99 while under load
+
+By default the backend runs in-process on the embedded broker
+(MQTT_TRANSPORT=embedded), so no Mosquitto is needed and messages are
+delivered in a reproducible order. With
+--broker/--api it drives a running backend through a real broker instead.
+
+Usage:
+    python benchmarks/bench_backend.py --rate 5000 --duration 10 --output results.json
+    python benchmarks/bench_backend.py --broker localhost:1883 --api http://localhost:5000
+"""
+
+import argparse
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+# Traffic patterns, mirroring the payloads built in frontend/src/components/Attack.js
+PATTERNS = ('normal', 'unauthorized_control', 'bypass_auth', 'rapid_fire', 'malformed')
+ATTACK_PATTERNS = PATTERNS[1:]
+
+DEFAULT_MIX = 'normal=0.96,unauthorized_control=0.01,bypass_auth=0.01,rapid_fire=0.01,malformed=0.01'
+
+API_ENDPOINTS = (
+    '/api/logs?limit=100',
+    '/api/logs/attack?limit=10',
+    '/api/devices',
+    '/health'
+)
+
+
+def percentiles(samples):
+    """Return count/p50/p99/max (ms) for a list of latencies in seconds."""
+    if not samples:
+        return {'count': 0, 'p50_ms': None, 'p99_ms': None, 'max_ms': None}
+    ordered = sorted(samples)
+
+    def pick(p):
+        return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))] * 1000, 3)
+
+    return {
+        'count': len(ordered),
+        'p50_ms': pick(0.50),
+        'p99_ms': pick(0.99),
+        'max_ms': round(ordered[-1] * 1000, 3)
+    }
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        if name not in PATTERNS:
+            raise SystemExit(f"Unknown traffic pattern {name!r}; choose from {', '.join(PATTERNS)}")
+        mix[name] = float(weight)
+    return mix
+
+# ==================== TRAFFIC ====================
+
+class TrafficGenerator:
+    """
+    Builds (topic, payload, pattern, device) tuples for the configured mix.
+    Each attack message targets a fresh device name so its alert and
+    ATTACK row can be matched back to the publish time.
+    """
+
+    def __init__(self, mix, devices, seed=42):
+        self.rng = random.Random(seed)
+        self.names = list(mix)
+        self.weights = [mix[name] for name in self.names]
+        self.devices = [f'sensor{i}' for i in range(devices)]
+        self.sequence = 0
+
+    def next(self):
+        self.sequence += 1
+        pattern = self.rng.choices(self.names, self.weights)[0]
+
+        if pattern == 'normal':
+            device = self.rng.choice(self.devices)
+            payload = json.dumps({
+                'action': self.rng.choice(('on', 'off')),
+                'client_id': device
+            })
+        else:
+            device = f'bench-{pattern}-{self.sequence}'
+            if pattern == 'unauthorized_control':
+                payload = json.dumps({'action': 'on', 'attack': True, 'user': 'unauthorized_attacker'})
+            elif pattern == 'bypass_auth':
+                payload = json.dumps({'action': 'on', 'bypass_auth': True, 'user': 'attacker'})
+            elif pattern == 'rapid_fire':
+                payload = json.dumps({'action': 'on', 'rapid_fire': True, 'sequence': self.sequence})
+            else:
+                payload = '{invalid json content @#$%}'
+
+        return f'/devices/{device}', payload.encode(), pattern, device
+
+
+def publish_at_rate(publish, generator, rate, duration, sent):
+    """
+    Publish generator traffic at `rate` msgs/sec for `duration` seconds.
+    Records publish time per attack device in sent.
+    Returns:
+        (messages published, elapsed seconds)
+    """
+    start = time.perf_counter()
+    count = 0
+    while True:
+        elapsed = time.perf_counter() - start
+        if elapsed >= duration:
+            break
+        # Catch up to where the schedule says we should be
+        target = int(elapsed * rate) + 1
+        while count < target:
+            topic, payload, pattern, device = generator.next()
+            if pattern != 'normal':
+                sent[device] = (pattern, time.time())
+            publish(topic, payload)
+            count += 1
+        next_due = start + count / rate
+        delay = next_due - time.perf_counter()
+        if delay > 0.0005:
+            time.sleep(delay)
+    return count, time.perf_counter() - start
+
+# ==================== MEASUREMENT ====================
+
+class Collector:
+    """Records when each attack device was first seen as an alert / DB row."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.alerts = {}
+        self.rows = {}
+
+    def saw_alert(self, device, when):
+        if device:
+            with self.lock:
+                self.alerts.setdefault(device, when)
+
+    def saw_row(self, device, when):
+        if device:
+            with self.lock:
+                self.rows.setdefault(device, when)
+
+
+def detection_report(sent, collector):
+    """Latency and detection rate per attack pattern."""
+    report = {'alert_latency': [], 'row_latency': [], 'patterns': {}}
+    for pattern in ATTACK_PATTERNS:
+        report['patterns'][pattern] = {'sent': 0, 'alerted': 0, 'logged': 0}
+
+    for device, (pattern, published) in sent.items():
+        stats = report['patterns'][pattern]
+        stats['sent'] += 1
+        if device in collector.alerts:
+            stats['alerted'] += 1
+            report['alert_latency'].append(collector.alerts[device] - published)
+        if device in collector.rows:
+            stats['logged'] += 1
+            report['row_latency'].append(collector.rows[device] - published)
+
+    for stats in report['patterns'].values():
+        stats['detection_rate'] = round(stats['alerted'] / stats['sent'], 4) if stats['sent'] else None
+
+    return {
+        'alert_delivered': percentiles(report['alert_latency']),
+        'attack_row_committed': percentiles(report['row_latency']),
+        'patterns': report['patterns']
+    }
+
+
+def poll_attack_rows(database, collector, stop, interval=0.01):
+    """Watch the logs table for new ATTACK rows (publish -> row committed)."""
+    conn = sqlite3.connect(database)
+    last_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM logs').fetchone()[0]
+    while not stop.is_set():
+        rows = conn.execute(
+            'SELECT id, device, log_type FROM logs WHERE id > ? ORDER BY id',
+            (last_id,)
+        ).fetchall()
+        now = time.time()
+        for row_id, device, log_type in rows:
+            if log_type == 'ATTACK':
+                collector.saw_row(device, now)
+            last_id = row_id
+        stop.wait(interval)
+    conn.close()
+
+
+def hammer_api(request_fn, stop, samples, interval):
+    """Call each API endpoint in turn until stopped, recording latencies."""
+    while not stop.is_set():
+        for endpoint in API_ENDPOINTS:
+            start = time.perf_counter()
+            request_fn(endpoint)
+            samples.setdefault(endpoint, []).append(time.perf_counter() - start)
+        stop.wait(interval)
+
+# ==================== IN-PROCESS MODE ====================
+
+def run_in_process(args, mix):
+    workdir = tempfile.mkdtemp(prefix='bench_backend_')
+    os.chdir(workdir)
+
+    import logging
+    logging.basicConfig(level=getattr(logging, args.log_level))
+
+    import app as backend
+    from embedded_broker import EmbeddedClient
+    logging.getLogger('app').setLevel(getattr(logging, args.log_level))
+    backend.MQTT_TRANSPORT = 'embedded'
+    if args.workers:
+        backend.ingest_pipeline = backend.IngestPipeline(
+            backend.process_message,
+            workers=args.workers,
+            queue_size=backend.INGEST_QUEUE_SIZE
+        )
+    backend.start_services()
+
+    # The backend subscribes to /devices/# on the embedded broker exactly as
+    # it would on Mosquitto; the generator publishes as a separate client
+    backend.connect_mqtt()
+    broker = EmbeddedClient('bench_publisher')
+    broker.connect()
+
+    collector = Collector()
+    stop = threading.Event()
+
+    # Alerts: subscribe to the hub like an SSE client would
+    subscription = backend.alert_hub.subscribe()
+
+    def read_alerts():
+        while not stop.is_set():
+            try:
+                _, data = subscription.queue.get(timeout=0.1)
+            except Exception:
+                continue
+            collector.saw_alert(json.loads(data).get('device'), time.time())
+
+    client = backend.app.test_client()
+    client.post('/api/login', json={'username': 'user1', 'password': 'demo'})
+    api_samples = {}
+
+    threads = [
+        threading.Thread(target=read_alerts, daemon=True),
+        threading.Thread(target=poll_attack_rows, args=(backend.DATABASE, collector, stop), daemon=True),
+        threading.Thread(target=hammer_api, args=(client.get, stop, api_samples, args.api_interval), daemon=True)
+    ]
+    for thread in threads:
+        thread.start()
+
+    generator = TrafficGenerator(mix, args.devices, args.seed)
+    sent = {}
+    start = time.perf_counter()
+    published, publish_s = publish_at_rate(broker.publish, generator, args.rate, args.duration, sent)
+
+    # Wait for the detection queues to drain
+    while backend.ingest_pipeline.stats()['queue_depth'] > 0:
+        time.sleep(0.005)
+    drained_s = time.perf_counter() - start
+    backend.log_sink.flush()
+    time.sleep(args.settle)
+
+    stop.set()
+    for thread in threads:
+        thread.join(2)
+    backend.alert_hub.unsubscribe(subscription)
+
+    pipeline = backend.ingest_pipeline.stats()
+    return {
+        'ingest': {
+            'published': published,
+            'publish_rate': round(published / publish_s, 1),
+            'processed': pipeline['stages']['detect']['count'],
+            'dropped': pipeline['dropped'],
+            'processed_per_sec': round(pipeline['stages']['detect']['count'] / drained_s, 1)
+        },
+        'detection': detection_report(sent, collector),
+        'api_latency': {endpoint: percentiles(samples) for endpoint, samples in api_samples.items()},
+        'pipeline': pipeline,
+        'log_sink': backend.log_sink.stats()
+    }
+
+# ==================== EXTERNAL MODE ====================
+
+def run_external(args, mix):
+    import paho.mqtt.client as mqtt
+
+    host, _, port = args.broker.partition(':')
+    try:
+        publisher = mqtt.Client(mqtt.CallbackAPIVersion.VERSION1, client_id='bench_publisher')
+    except AttributeError:
+        publisher = mqtt.Client(client_id='bench_publisher')
+    publisher.max_inflight_messages_set(1000)
+    publisher.connect(host, int(port or 1883))
+    publisher.loop_start()
+
+    collector = Collector()
+    stop = threading.Event()
+
+    def read_alerts():
+        # Minimal SSE reader for /api/alerts/stream
+        with urllib.request.urlopen(f'{args.api}/api/alerts/stream') as stream:
+            for raw in stream:
+                if stop.is_set():
+                    return
+                line = raw.decode().strip()
+                if line.startswith('data: '):
+                    collector.saw_alert(json.loads(line[6:]).get('device'), time.time())
+
+    def request_fn(endpoint):
+        try:
+            with urllib.request.urlopen(f'{args.api}{endpoint}') as response:
+                response.read()
+        except Exception:
+            pass
+
+    api_samples = {}
+    threads = [
+        threading.Thread(target=read_alerts, daemon=True),
+        threading.Thread(target=hammer_api, args=(request_fn, stop, api_samples, args.api_interval), daemon=True)
+    ]
+    if args.database:
+        threads.append(threading.Thread(
+            target=poll_attack_rows, args=(args.database, collector, stop), daemon=True
+        ))
+    for thread in threads:
+        thread.start()
+    time.sleep(0.5)
+
+    generator = TrafficGenerator(mix, args.devices, args.seed)
+    sent = {}
+    published, publish_s = publish_at_rate(
+        lambda topic, payload: publisher.publish(topic, payload),
+        generator, args.rate, args.duration, sent
+    )
+    time.sleep(args.settle)
+
+    stop.set()
+    publisher.loop_stop()
+    publisher.disconnect()
+
+    return {
+        'ingest': {
+            'published': published,
+            'publish_rate': round(published / publish_s, 1)
+        },
+        'detection': detection_report(sent, collector),
+        'api_latency': {endpoint: percentiles(samples) for endpoint, samples in api_samples.items()}
+    }
+
+# ==================== MAIN ====================
+
+def main():
+    parser = argparse.ArgumentParser(description='Load-generate and benchmark the backend')
+    parser.add_argument('--rate', type=float, default=2000, help='Target publish rate (msgs/sec)')
+    parser.add_argument('--duration', type=float, default=10, help='Seconds of traffic')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help='pattern=weight,... traffic mix')
+    parser.add_argument('--devices', type=int, default=1000, help='Devices sending normal telemetry')
+    parser.add_argument('--workers', type=int, help='Detection workers (in-process mode)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--settle', type=float, default=1.0, help='Seconds to wait for stragglers')
+    parser.add_argument('--api-interval', type=float, default=0.05, help='Pause between API sweeps')
+    parser.add_argument('--log-level', default='WARNING')
+    parser.add_argument('--broker', help='host:port of a real broker (external mode)')
+    parser.add_argument('--api', default='http://localhost:5000', help='Backend URL (external mode)')
+    parser.add_argument('--database', help='Backend database path, for row latency in external mode')
+    parser.add_argument('--output', help='Write results as JSON to this file')
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.output) if args.output else None
+    mix = parse_mix(args.mix)
+
+    if args.broker:
+        results = run_external(args, mix)
+    else:
+        results = run_in_process(args, mix)
+
+    report = {
+        'benchmark': 'backend',
+        'mode': 'external' if args.broker else 'in-process',
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'config': {
+            'rate': args.rate,
+            'duration': args.duration,
+            'mix': mix,
+            'devices': args.devices,
+            'workers': args.workers,
+            'seed': args.seed
+        },
+        'results': results
+    }
+
+    text = json.dumps(report, indent=2)
+    if output:
+        with open(output, 'w') as f:
+            f.write(text)
+    print(text)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,153 @@
+"""
+Smart Home Backend - Database Access Benchmark
+Measures /api/logs page latency when every request opens its own
+connection (the original pattern) versus borrowing a pooled, tuned
+connection from db.Database, with reader threads running while the log
+writer commits batches in the background.
+
+Usage:
+    python benchmarks/bench_db_access.py --rows 200000 --threads 4
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db import Database  # noqa: E402
+from log_sink import INSERT_LOG_SQL  # noqa: E402
+from migrations import migrate, connect  # noqa: E402
+from payload_store import StoredPayload, load_payloads, resolve_payload_ids  # noqa: E402
+
+PAGE_QUERY = 'SELECT * FROM logs WHERE 1=1 AND device = ? ORDER BY ts DESC, id DESC LIMIT ?'
+
+
+def populate(database, rows, devices=100):
+    migrate(database)
+    conn = connect(database)
+    start_ms = int(time.time() * 1000) - rows
+    batch = []
+    for i in range(rows):
+        device = f'sensor{i % devices}'
+        raw = json.dumps({'action': ('on', 'off')[i % 2], 'value': i % 40 / 2}).encode()
+        batch.append(('', start_ms + i, f'Device update: {device}', 'DEVICE_UPDATE',
+                      f'/devices/{device}', device, None, 'INFO', StoredPayload(raw)))
+        if len(batch) == 5000 or i == rows - 1:
+            with conn:
+                conn.execute('BEGIN IMMEDIATE')
+                conn.executemany(INSERT_LOG_SQL, resolve_payload_ids(conn, batch))
+            batch = []
+    conn.close()
+
+
+def page_per_connection(database, device):
+    # What the routes did before: connect, query, close
+    conn = connect(database)
+    conn.row_factory = sqlite3.Row
+    try:
+        return load_payloads(conn, conn.execute(PAGE_QUERY, (device, 100)).fetchall())
+    finally:
+        conn.close()
+
+
+def page_pooled(db, device):
+    with db.read() as conn:
+        return load_payloads(conn, conn.execute(PAGE_QUERY, (device, 100)).fetchall())
+
+
+def writer(database, stop, rows_written):
+    """Commit a 500-row batch every 50 ms, like a busy log sink."""
+    conn = connect(database)
+    ts = int(time.time() * 1000)
+    while not stop.is_set():
+        batch = [('', ts + i, 'Device update: sensor1', 'DEVICE_UPDATE', '/devices/sensor1',
+                  'sensor1', None, 'INFO', StoredPayload(b'{"action": "on"}')) for i in range(500)]
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.executemany(INSERT_LOG_SQL, resolve_payload_ids(conn, batch))
+        rows_written[0] += len(batch)
+        ts += 500
+        stop.wait(0.05)
+    conn.close()
+
+
+def measure(fetch, threads, requests_per_thread, database):
+    samples = []
+    lock = threading.Lock()
+    stop = threading.Event()
+    rows_written = [0]
+    background = threading.Thread(target=writer, args=(database, stop, rows_written))
+    background.start()
+
+    def reader(index):
+        local = []
+        for i in range(requests_per_thread):
+            start = time.perf_counter()
+            fetch(f'sensor{(index * 7 + i) % 100}')
+            local.append((time.perf_counter() - start) * 1000)
+        with lock:
+            samples.extend(local)
+
+    start = time.perf_counter()
+    workers = [threading.Thread(target=reader, args=(index,)) for index in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+    stop.set()
+    background.join()
+
+    samples.sort()
+    return {
+        'p50_ms': round(statistics.median(samples), 3),
+        'p99_ms': round(samples[int(len(samples) * 0.99) - 1], 3),
+        'requests_per_s': round(len(samples) / elapsed),
+        'rows_written': rows_written[0]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--requests', type=int, default=500, help='Requests per reader thread')
+    parser.add_argument('--workdir', default=tempfile.gettempdir())
+    parser.add_argument('--output', help='Write results as JSON to this file')
+    args = parser.parse_args()
+
+    database = os.path.join(args.workdir, 'bench_db_access.db')
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(database + suffix):
+            os.remove(database + suffix)
+    populate(database, args.rows)
+
+    db = Database(database, pool_size=args.threads)
+    before = measure(lambda device: page_per_connection(database, device), args.threads, args.requests, database)
+    after = measure(lambda device: page_pooled(db, device), args.threads, args.requests, database)
+    db.close()
+
+    print(f"{args.rows:,} rows, {args.threads} reader threads x {args.requests} pages, writer committing")
+    print(f"{'':18} {'p50 ms':>9} {'p99 ms':>9} {'pages/s':>9}")
+    for name, result in (('connect per call', before), ('pooled', after)):
+        print(f"{name:18} {result['p50_ms']:9.3f} {result['p99_ms']:9.3f} {result['requests_per_s']:9,}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'benchmark': 'db_access', 'rows': args.rows, 'threads': args.threads,
+                       'before': before, 'after': after}, f, indent=2)
+
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(database + suffix):
+            os.remove(database + suffix)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+"""
+Smart Home Backend - Columnar Log Export Benchmark
+Exports a populated logs table with log_export.py and compares an offline
+analysis (attacks per device per hour) done the way it is done today -
+every row fetched from SQLite as a dict, as /api/logs returns them -
+against the same analysis on the memory-mapped columnar export.
+
+Usage:
+    python benchmarks/bench_log_export.py --rows 1000000
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from collections import Counter
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from log_export import LogExport, export_logs  # noqa: E402
+from log_sink import INSERT_LOG_SQL  # noqa: E402
+from migrations import migrate, connect  # noqa: E402
+from payload_store import StoredPayload, resolve_payload_ids  # noqa: E402
+
+HOUR_MS = 3600 * 1000
+
+
+def populate(database, rows, devices=200):
+    """One ATTACK row in ten; timestamps spread over about a week."""
+    migrate(database)
+    conn = connect(database)
+    start_ms = int(time.time() * 1000) - rows * 600
+    batch = []
+    for i in range(rows):
+        device = f'sensor{i % devices}'
+        if i % 10 == 0:
+            raw = json.dumps({'action': 'unlock', 'user': f'attacker{i % 50}', 'bypass_auth': True}).encode()
+            row = ('', start_ms + i * 600, f'ATTACK DETECTED: Authorization bypass. Device: {device}', 'ATTACK',
+                   f'/devices/{device}', device, f'attacker{i % 50}', 'CRITICAL', StoredPayload(raw))
+        else:
+            raw = json.dumps({'action': ('on', 'off')[i % 2], 'value': i % 40 / 2}).encode()
+            row = ('', start_ms + i * 600, f'Device update: {device}', 'DEVICE_UPDATE',
+                   f'/devices/{device}', device, None, 'INFO', StoredPayload(raw))
+        batch.append(row)
+        if len(batch) == 5000 or i == rows - 1:
+            with conn:
+                conn.execute('BEGIN IMMEDIATE')
+                conn.executemany(INSERT_LOG_SQL, resolve_payload_ids(conn, batch))
+            batch = []
+    conn.close()
+
+
+def analyze_rows(database):
+    """Attacks per (device, hour) from rows fetched as dicts."""
+    conn = sqlite3.connect(database)
+    conn.row_factory = sqlite3.Row
+    logs = [dict(row) for row in conn.execute('SELECT * FROM logs ORDER BY id')]
+    conn.close()
+    counts = Counter((log['device'], log['ts'] // HOUR_MS) for log in logs if log['log_type'] == 'ATTACK')
+    return len(counts), sum(counts.values())
+
+
+def analyze_columnar(path):
+    """Attacks per (device, hour) on the memory-mapped export."""
+    logs = LogExport(path)
+    attacks = logs.equals('log_type', 'ATTACK')
+    devices = logs.codes('device')[attacks].astype(np.int64)
+    hours = logs.column('ts')[attacks] // HOUR_MS
+    hours -= hours.min() if len(hours) else 0
+    keys = devices * (int(hours.max()) + 1 if len(hours) else 1) + hours
+    values, counts = np.unique(keys, return_counts=True)
+    return len(values), int(counts.sum())
+
+
+def directory_size(path):
+    return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--workdir', default=tempfile.gettempdir())
+    parser.add_argument('--output', help='Write results as JSON to this file')
+    args = parser.parse_args()
+
+    database = os.path.join(args.workdir, 'bench_log_export.db')
+    path = os.path.join(args.workdir, 'bench_log_export.logs')
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(database + suffix):
+            os.remove(database + suffix)
+    if os.path.exists(path):
+        shutil.rmtree(path)
+    populate(database, args.rows)
+    conn = connect(database)
+    conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    conn.close()
+
+    _, export_ms = timed(export_logs, database, path)
+    row_result, row_ms = timed(analyze_rows, database)
+    columnar_result, columnar_ms = timed(analyze_columnar, path)
+    assert row_result == columnar_result, (row_result, columnar_result)
+
+    results = {
+        'export_ms': round(export_ms),
+        'export_rows_per_s': round(args.rows / export_ms * 1000),
+        'database_mb': round(os.path.getsize(database) / 1e6, 1),
+        'export_mb': round(directory_size(path) / 1e6, 1),
+        'rows_as_dicts_ms': round(row_ms),
+        'columnar_ms': round(columnar_ms, 1),
+        'groups': columnar_result[0]
+    }
+
+    print(f"{args.rows:,} rows: exported in {results['export_ms']:,} ms "
+          f"({results['export_rows_per_s']:,} rows/s), "
+          f"{results['database_mb']} MB database -> {results['export_mb']} MB export")
+    print(f"attacks per device per hour ({results['groups']:,} groups)")
+    print(f"{'':18} {'ms':>10}")
+    print(f"{'rows as dicts':18} {results['rows_as_dicts_ms']:10,}")
+    print(f"{'columnar (mmap)':18} {results['columnar_ms']:10,}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'benchmark': 'log_export', 'rows': args.rows, **results}, f, indent=2)
+
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(database + suffix):
+            os.remove(database + suffix)
+    shutil.rmtree(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,197 @@
+"""
+Smart Home Backend - Log Query Benchmark
+Measures /api/logs, /api/logs/attack and log search latency on a large
+logs table before and after the schema migrations (integer ts column,
+indexes and the logs_fts full-text index). Searches run as LIKE scans
+before and as FTS5 MATCH queries after.
+
+Usage:
+    python benchmarks/bench_log_queries.py --rows 1000000 10000000
+"""
+
+import argparse
+import json
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from migrations import migrate, connect  # noqa: E402
+
+DEVICES = ['light1', 'light2', 'thermostat', 'lock'] + [f'sensor{i}' for i in range(96)]
+# Roughly the mix seen during a training session: mostly telemetry
+LOG_TYPES = ['DEVICE_UPDATE'] * 90 + ['ATTACK'] * 4 + ['DEFENSE'] * 4 + ['AUTH'] * 2
+
+# (name, query before migration, query after migration, params)
+QUERIES = [
+    (
+        'recent',
+        'SELECT * FROM logs WHERE 1=1 ORDER BY timestamp DESC LIMIT ?',
+        'SELECT * FROM logs WHERE 1=1 ORDER BY ts DESC, id DESC LIMIT ?',
+        (100,)
+    ),
+    (
+        'by_type',
+        "SELECT * FROM logs WHERE log_type = 'ATTACK' ORDER BY timestamp DESC LIMIT ?",
+        "SELECT * FROM logs WHERE log_type = 'ATTACK' ORDER BY ts DESC, id DESC LIMIT ?",
+        (50,)
+    ),
+    (
+        'by_device',
+        'SELECT * FROM logs WHERE 1=1 AND device = ? ORDER BY timestamp DESC LIMIT ?',
+        'SELECT * FROM logs WHERE 1=1 AND device = ? ORDER BY ts DESC, id DESC LIMIT ?',
+        ('thermostat', 100)
+    ),
+    (
+        'by_type_and_device',
+        'SELECT * FROM logs WHERE 1=1 AND log_type = ? AND device = ? ORDER BY timestamp DESC LIMIT ?',
+        'SELECT * FROM logs WHERE 1=1 AND log_type = ? AND device = ? ORDER BY ts DESC, id DESC LIMIT ?',
+        ('ATTACK', 'lock', 100)
+    ),
+    (
+        'search_user',
+        "SELECT * FROM logs WHERE message LIKE '%' || ? || '%' ORDER BY timestamp DESC LIMIT ?",
+        'SELECT logs.* FROM logs_fts CROSS JOIN logs ON logs.id = logs_fts.rowid '
+        'WHERE logs_fts MATCH \'"\' || ? || \'"\' ORDER BY logs_fts.rowid DESC LIMIT ?',
+        ('attacker17', 50)
+    ),
+    (
+        'search_prefix',
+        "SELECT * FROM logs WHERE message LIKE '%' || ? || '%' ORDER BY timestamp DESC LIMIT ?",
+        'SELECT logs.* FROM logs_fts CROSS JOIN logs ON logs.id = logs_fts.rowid '
+        'WHERE logs_fts MATCH \'"\' || ? || \'" *\' ORDER BY logs_fts.rowid DESC LIMIT ?',
+        ('bypass', 50)
+    ),
+]
+
+
+def populate(database, rows, chunk=100000):
+    """Create the original (version 0) logs table and fill it with rows."""
+    conn = sqlite3.connect(database)
+    conn.execute('''
+        CREATE TABLE logs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TEXT NOT NULL,
+            message TEXT NOT NULL,
+            log_type TEXT NOT NULL,
+            source TEXT,
+            device TEXT,
+            user TEXT,
+            severity TEXT
+        )
+    ''')
+
+    rng = random.Random(42)
+    start = datetime(2026, 1, 1)
+    written = 0
+    while written < rows:
+        batch = []
+        for i in range(written, min(rows, written + chunk)):
+            device = rng.choice(DEVICES)
+            log_type = rng.choice(LOG_TYPES)
+            if log_type == 'ATTACK':
+                message = (f'Potential attack detected on {device}, Payload: '
+                           f'{{"action": "on", "bypass_auth": true, "user": "attacker{rng.randrange(100)}"}}')
+            else:
+                message = f'Device update: {device} - {{"action": "on"}}'
+            batch.append((
+                (start + timedelta(milliseconds=i * 50)).isoformat(),
+                message,
+                log_type,
+                f'/devices/{device}',
+                device,
+                None,
+                'CRITICAL' if log_type == 'ATTACK' else 'INFO'
+            ))
+        conn.executemany('''
+            INSERT INTO logs (timestamp, message, log_type, source, device, user, severity)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', batch)
+        conn.commit()
+        written += len(batch)
+    conn.close()
+
+
+def time_queries(database, column, repeats):
+    """Return {query name: {'p50_ms', 'max_ms'}} for each query shape."""
+    conn = connect(database)
+    results = {}
+    for name, before, after, params in QUERIES:
+        sql = before if column == 'before' else after
+        samples = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            conn.execute(sql, params).fetchall()
+            samples.append((time.perf_counter() - start) * 1000)
+        results[name] = {
+            'p50_ms': round(statistics.median(samples), 3),
+            'max_ms': round(max(samples), 3)
+        }
+    conn.close()
+    return results
+
+
+def run(rows, repeats, workdir):
+    database = os.path.join(workdir, f'bench_{rows}.db')
+    if os.path.exists(database):
+        os.remove(database)
+
+    start = time.perf_counter()
+    populate(database, rows)
+    populate_s = time.perf_counter() - start
+
+    before = time_queries(database, 'before', repeats)
+
+    start = time.perf_counter()
+    migrate(database)
+    migrate_s = time.perf_counter() - start
+
+    after = time_queries(database, 'after', repeats)
+
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(database + suffix):
+            os.remove(database + suffix)
+
+    return {
+        'rows': rows,
+        'populate_s': round(populate_s, 2),
+        'migrate_s': round(migrate_s, 2),
+        'before': before,
+        'after': after
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark log queries before/after migrations')
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000000])
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--workdir', default=tempfile.gettempdir())
+    parser.add_argument('--output', help='Write results as JSON to this file')
+    args = parser.parse_args()
+
+    results = []
+    for rows in args.rows:
+        result = run(rows, args.repeats, args.workdir)
+        results.append(result)
+
+        print(f"\n{rows:,} rows (populate {result['populate_s']}s, migrate {result['migrate_s']}s)")
+        print(f"{'query':22} {'before p50 ms':>14} {'after p50 ms':>14} {'speedup':>9}")
+        for name, _, _, _ in QUERIES:
+            b = result['before'][name]['p50_ms']
+            a = result['after'][name]['p50_ms']
+            speedup = f"{b / a:.0f}x" if a else '-'
+            print(f"{name:22} {b:14.3f} {a:14.3f} {speedup:>9}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'benchmark': 'log_queries', 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
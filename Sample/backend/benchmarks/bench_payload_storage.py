@@ -0,0 +1,141 @@
+"""
+Smart Home Backend - Payload Storage Benchmark
+Compares storing MQTT payloads inside logs.message (the original format)
+with the deduplicated payloads table: database size, write throughput
+through the log sink's insert path, and a per-field query (all logs whose
+payload came from one user) as a LIKE scan versus the payload indexes.
+
+Usage:
+    python benchmarks/bench_payload_storage.py --rows 1000000
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from log_sink import INSERT_LOG_SQL  # noqa: E402
+from migrations import migrate, connect  # noqa: E402
+from payload_store import StoredPayload, payload_filter, resolve_payload_ids  # noqa: E402
+from payload_codec import parse_payload  # noqa: E402
+
+BATCH_SIZE = 500
+QUERY_USER = 'client7'
+
+
+def build_corpus(count, devices=100, seed=1):
+    """
+    Generate (device, payload bytes) pairs shaped like training-session
+    telemetry: a few actions, readings in 0.5 degree steps and a small set
+    of publishing clients, with about 3% attack payloads.
+    """
+    rng = random.Random(seed)
+    corpus = []
+    for i in range(count):
+        device = f'sensor{i % devices}'
+        payload = {'action': rng.choice(['on', 'off', 'report']), 'user': f'client{rng.randrange(20)}'}
+        if device.endswith(('0', '5')):
+            payload['value'] = rng.randrange(36, 52) / 2
+        if rng.random() < 0.03:
+            payload[rng.choice(['attack', 'bypass_auth', 'rapid_fire'])] = True
+        corpus.append((device, json.dumps(payload).encode()))
+    return corpus
+
+
+def log_rows(corpus, embedded):
+    """Log sink rows for the corpus, in the original or the payloads format."""
+    start = time.time()
+    rows = []
+    for i, (device, raw) in enumerate(corpus):
+        ts = int((start + i * 0.001) * 1000)
+        if embedded:
+            message, payload = f"Device update: {device} - {raw.decode()}", None
+        else:
+            message, payload = f"Device update: {device}", StoredPayload(raw, *parse_payload(raw))
+        rows.append(('', ts, message, 'DEVICE_UPDATE', f'/devices/{device}', device, None, 'INFO', payload))
+    return rows
+
+
+def database_size(conn):
+    conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    page_size = conn.execute('PRAGMA page_size').fetchone()[0]
+    used = conn.execute('PRAGMA page_count').fetchone()[0] - conn.execute('PRAGMA freelist_count').fetchone()[0]
+    return used * page_size
+
+
+def run(corpus, embedded, repeats, workdir):
+    database = os.path.join(workdir, f"bench_payloads_{'embedded' if embedded else 'table'}.db")
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(database + suffix):
+            os.remove(database + suffix)
+    migrate(database)
+    rows = log_rows(corpus, embedded)
+
+    conn = connect(database)
+    start = time.perf_counter()
+    for offset in range(0, len(rows), BATCH_SIZE):
+        # Same statements and transaction shape as LogSink._write_batch
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.executemany(INSERT_LOG_SQL, resolve_payload_ids(conn, rows[offset:offset + BATCH_SIZE]))
+    write_s = time.perf_counter() - start
+
+    if embedded:
+        query = "SELECT COUNT(*) FROM logs WHERE message LIKE ?"
+        params = [f'%"user": "{QUERY_USER}"%']
+    else:
+        clause, params = payload_filter(user=QUERY_USER)
+        query = 'SELECT COUNT(*) FROM logs WHERE 1=1' + clause
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        matched = conn.execute(query, params).fetchone()[0]
+        samples.append((time.perf_counter() - start) * 1000)
+
+    result = {
+        'db_bytes': database_size(conn),
+        'rows_per_s': round(len(rows) / write_s),
+        'payloads': conn.execute('SELECT COUNT(*) FROM payloads').fetchone()[0],
+        'field_query_p50_ms': round(statistics.median(samples), 3),
+        'field_query_matched': matched
+    }
+    conn.close()
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(database + suffix):
+            os.remove(database + suffix)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--workdir', default=tempfile.gettempdir())
+    parser.add_argument('--output', help='Write results as JSON to this file')
+    args = parser.parse_args()
+
+    corpus = build_corpus(args.rows)
+    before = run(corpus, True, args.repeats, args.workdir)
+    after = run(corpus, False, args.repeats, args.workdir)
+
+    print(f"{args.rows:,} telemetry rows ({after['payloads']:,} distinct payloads)")
+    print(f"{'':24} {'in message':>12} {'payloads':>12}")
+    print(f"{'database MB':24} {before['db_bytes'] / 1e6:12.1f} {after['db_bytes'] / 1e6:12.1f}")
+    print(f"{'write rows/s':24} {before['rows_per_s']:12,} {after['rows_per_s']:12,}")
+    print(f"{'user query p50 ms':24} {before['field_query_p50_ms']:12.3f} {after['field_query_p50_ms']:12.3f}")
+    if before['field_query_matched'] != after['field_query_matched']:
+        print(f"warning: user query matched {before['field_query_matched']} vs {after['field_query_matched']} rows")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'benchmark': 'payload_storage', 'rows': args.rows, 'before': before, 'after': after}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
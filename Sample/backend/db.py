@@ -0,0 +1,149 @@
+"""
+Smart Home Cybersecurity Training Platform - Database Access
+Long-lived, tuned SQLite connections shared by the Flask backend.
+
+Readers borrow a read-only connection from a pool for the duration of a
+request, so the page cache, memory map and prepared-statement cache stay
+warm across requests instead of being rebuilt by a fresh connect() every
+time. (Flask's threaded server starts a thread per request, so binding
+connections to request threads would not keep them alive.) Each
+long-running writer thread - the log sink, retention, shadow snapshots -
+owns a separate write connection; under WAL the readers never wait for
+them.
+"""
+
+import logging
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from migrations import apply_pragmas
+
+logger = logging.getLogger(__name__)
+
+
+def tuning_pragmas(cache_size_kb=16384, mmap_size=256 * 1024 * 1024):
+    """
+    Performance pragmas applied to every long-lived connection (on top of
+    migrations.apply_pragmas).
+    Args:
+        cache_size_kb: Page cache per connection, in KiB
+        mmap_size: Bytes of the database file read through a memory map
+    Returns:
+        List of PRAGMA statements
+    """
+    return [
+        f'PRAGMA cache_size=-{int(cache_size_kb)}',
+        f'PRAGMA mmap_size={int(mmap_size)}',
+        # Sorter and temp b-trees (ORDER BY without an index, IN lists)
+        'PRAGMA temp_store=MEMORY'
+    ]
+
+
+class Database:
+    """
+    Read connection pool plus a factory for dedicated write connections.
+    Connections are opened with check_same_thread=False: a pooled reader
+    is used by one thread at a time, but not always the same thread.
+    """
+
+    def __init__(self, database, pool_size=8, cache_size_kb=16384,
+                 mmap_size=256 * 1024 * 1024, statement_cache=256):
+        """
+        Args:
+            database: Path to the SQLite database file
+            pool_size: Idle read connections kept open
+            cache_size_kb: Page cache per connection, in KiB
+            mmap_size: Bytes memory-mapped per connection (0 disables)
+            statement_cache: Prepared statements cached per connection
+        """
+        self.database = database
+        self.pool_size = pool_size
+        self.statement_cache = statement_cache
+        self.pragmas = tuning_pragmas(cache_size_kb, mmap_size)
+
+        self._idle = []
+        self._lock = threading.Lock()
+
+        self.opened = 0
+        self.closed = 0
+        self.borrowed = 0
+        self.in_use = 0
+
+    def _open(self, read_only):
+        conn = sqlite3.connect(
+            self.database,
+            check_same_thread=False,
+            cached_statements=self.statement_cache
+        )
+        apply_pragmas(conn)
+        for pragma in self.pragmas:
+            conn.execute(pragma)
+        if read_only:
+            conn.execute('PRAGMA query_only=ON')
+            conn.row_factory = sqlite3.Row
+        with self._lock:
+            self.opened += 1
+        return conn
+
+    # ==================== WRITERS ====================
+
+    def connect(self, database=None):
+        """
+        Open a tuned write connection for a thread that keeps it.
+        Matches the connect(database) callables taken by LogSink,
+        RetentionManager and DeviceShadowStore.
+        """
+        if database is not None and database != self.database:
+            raise ValueError(f"Database {database} is not {self.database}")
+        return self._open(read_only=False)
+
+    # ==================== READERS ====================
+
+    @contextmanager
+    def read(self):
+        """Borrow a read-only connection (rows are sqlite3.Row) for the block."""
+        conn = self._acquire()
+        try:
+            yield conn
+        finally:
+            self._release(conn)
+
+    def _acquire(self):
+        with self._lock:
+            conn = self._idle.pop() if self._idle else None
+            self.borrowed += 1
+            self.in_use += 1
+        # Opened outside the lock: connect() touches the file system
+        return conn if conn is not None else self._open(read_only=True)
+
+    def _release(self, conn):
+        if conn.in_transaction:
+            # Never hand a connection holding a read snapshot to the next user
+            conn.rollback()
+        with self._lock:
+            self.in_use -= 1
+            if len(self._idle) < self.pool_size:
+                self._idle.append(conn)
+                return
+            self.closed += 1
+        conn.close()
+
+    def close(self):
+        """Close the idle read connections (at shutdown)."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+            self.closed += len(idle)
+        for conn in idle:
+            conn.close()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'pool_size': self.pool_size,
+                'idle': len(self._idle),
+                'in_use': self.in_use,
+                'opened': self.opened,
+                'closed': self.closed,
+                'borrowed': self.borrowed
+            }
@@ -0,0 +1,272 @@
+"""
+Smart Home Cybersecurity Training Platform - Bulk Device Commands
+Authorizes a list of device commands in one pass over the policy index,
+publishes the allowed ones back to back and then waits for the broker to
+acknowledge them (per the requested QoS), so N commands cost one round of
+network waits instead of N.
+"""
+
+import asyncio
+import hashlib
+import hmac
+import json
+import logging
+import math
+import os
+import secrets
+import threading
+import time
+
+import paho.mqtt.client as mqtt
+
+from authz import valid_device_name
+
+logger = logging.getLogger(__name__)
+
+# Per-command outcomes
+PUBLISHED = 'published'        # Acknowledged as required by the QoS level
+QUEUED = 'queued'              # Queued, but not acknowledged in time
+FAILED = 'failed'              # The client refused the publish
+UNAUTHORIZED = 'unauthorized'  # Denied by the authorization policy
+INVALID = 'invalid'            # Missing action, or device not a single topic level
+_PENDING = 'pending'
+
+# client_id carried by commands the backend publishes on a user's behalf.
+# Any publisher can claim it, so it only labels the command; the echo is
+# exempt from the client rate only if its command_id verifies (see
+# CommandSigner). Per-device rates always apply.
+BACKEND_CLIENT_ID = 'smart_home_backend'
+
+# Seconds after issue during which a command_id is accepted
+COMMAND_ID_TTL = 30.0
+
+
+class CommandSigner:
+    """
+    Issues and checks the command_id of commands the backend publishes, so
+    their echo on /devices/# can be told apart from a client that merely
+    claims client_id=smart_home_backend (a bulk request would otherwise
+    look like a flood).
+    A command_id is "<issued ms>.<nonce>.<mac>", the mac an HMAC over the
+    issue time, nonce, action and user under a secret that only backend
+    processes hold. Each id is accepted once per process and only within
+    ttl seconds of issue, so replaying an observed echo gains nothing.
+    """
+
+    def __init__(self, secret=None, ttl=COMMAND_ID_TTL):
+        """
+        Args:
+            secret: HMAC key shared by the processes that publish and
+                    verify commands; random if None
+            ttl: Seconds after issue during which an id is accepted
+        """
+        self.secret = secret or os.urandom(32)
+        self.ttl = ttl
+        self._accepted = {}  # command_id -> expiry, in arrival order
+        self._lock = threading.Lock()
+        self.rejected = 0
+
+    def _mac(self, issued, nonce, action, user):
+        message = json.dumps([issued, nonce, action, user]).encode()
+        return hmac.new(self.secret, message, hashlib.sha256).hexdigest()[:32]
+
+    def payload(self, action, user, now=None):
+        """JSON payload of a control command published by the backend."""
+        issued = int((time.time() if now is None else now) * 1000)
+        nonce = secrets.token_hex(8)
+        command_id = f'{issued}.{nonce}.{self._mac(issued, nonce, action, user)}'
+        return json.dumps({'action': action, 'user': user, 'client_id': BACKEND_CLIENT_ID,
+                           'command_id': command_id})
+
+    def verify(self, data, now=None):
+        """
+        True if data (a parsed payload) carries a genuine, unexpired
+        command_id not seen before in this process.
+        """
+        command_id = data.get('command_id') if isinstance(data, dict) else None
+        if not isinstance(command_id, str):
+            return False
+        now = time.time() if now is None else now
+        try:
+            issued, nonce, mac = command_id.split('.')
+            issued = int(issued)
+        except ValueError:
+            self.rejected += 1
+            return False
+        expires = issued / 1000 + self.ttl
+        if not (issued / 1000 <= now < expires and hmac.compare_digest(
+                mac, self._mac(issued, nonce, data.get('action'), data.get('user')))):
+            self.rejected += 1
+            return False
+
+        with self._lock:
+            # Ids arrive roughly in issue order: drop expired ones from the front
+            while self._accepted:
+                oldest = next(iter(self._accepted))
+                if self._accepted[oldest] > now:
+                    break
+                del self._accepted[oldest]
+            if command_id in self._accepted:
+                self.rejected += 1
+                return False
+            self._accepted[command_id] = expires
+        return True
+
+
+def plan_commands(commands, user, policy, signer):
+    """
+    Validate and authorize a list of commands against one policy snapshot.
+    Args:
+        commands: [{'device': name, 'action': action}, ...] from the request
+        user: Session user issuing the commands
+        policy: authz.Policy to check every command against
+        signer: CommandSigner that issues each command's command_id
+    Returns:
+        One result dict per command, in request order; allowed commands
+        carry the topic and payload to publish
+    """
+    results = []
+    for command in commands:
+        device = command.get('device') if isinstance(command, dict) else None
+        action = command.get('action') if isinstance(command, dict) else None
+        result = {'device': device, 'action': action}
+        if not valid_device_name(device) or action is None:
+            result['status'] = INVALID
+        elif not policy.allowed(user, device):
+            result['status'] = UNAUTHORIZED
+        else:
+            result['status'] = _PENDING
+            result['topic'] = f'/devices/{device}'
+            result['payload'] = signer.payload(action, user)
+        results.append(result)
+    return results
+
+
+def publish_planned(client, results, qos=1, timeout=5.0):
+    """
+    Publish every pending command with a paho client, then wait for all of
+    them to complete. Completion means written to the socket for QoS 0,
+    PUBACK for QoS 1 and PUBCOMP for QoS 2.
+    Args:
+        client: Connected paho MQTT client (network loop running)
+        results: Output of plan_commands; updated in place
+        qos: MQTT QoS level for every command
+        timeout: Seconds to wait for the whole batch
+    """
+    in_flight = []
+    for result in results:
+        if result['status'] != _PENDING:
+            continue
+        try:
+            info = client.publish(result['topic'], result['payload'], qos=qos)
+        except (ValueError, TypeError) as e:
+            # One bad command must not cost the rest of the batch its audit
+            result['status'] = FAILED
+            result['error'] = str(e)
+            continue
+        if info.rc == mqtt.MQTT_ERR_SUCCESS:
+            in_flight.append((result, info))
+        elif qos > 0 and info.rc == mqtt.MQTT_ERR_NO_CONN:
+            # paho keeps QoS 1/2 messages and sends them after reconnecting
+            result['status'] = QUEUED
+        else:
+            result['status'] = FAILED
+            result['error'] = mqtt.error_string(info.rc)
+
+    deadline = time.monotonic() + timeout
+    for result, info in in_flight:
+        remaining = max(deadline - time.monotonic(), 0)
+        try:
+            info.wait_for_publish(remaining)
+        except (RuntimeError, ValueError) as e:
+            result['status'] = FAILED
+            result['error'] = str(e)
+            continue
+        result['status'] = PUBLISHED if info.is_published() else QUEUED
+
+
+async def publish_planned_async(client, results, qos=1, timeout=5.0):
+    """
+    asyncio equivalent of publish_planned for an aiomqtt client: all
+    publishes are started together and awaited as one batch.
+    """
+    tasks = {}
+    for result in results:
+        if result['status'] != _PENDING:
+            continue
+        try:
+            publish = client.publish(result['topic'], result['payload'], qos=qos, timeout=math.inf)
+            tasks[asyncio.ensure_future(publish)] = result
+        except (ValueError, TypeError) as e:
+            result['status'] = FAILED
+            result['error'] = str(e)
+    if not tasks:
+        return
+
+    done, not_done = await asyncio.wait(tasks, timeout=timeout)
+    for task in not_done:
+        # Stops waiting only; the message stays in the client's queue
+        task.cancel()
+        tasks[task]['status'] = QUEUED
+    for task in done:
+        result = tasks[task]
+        if task.exception() is not None:
+            result['status'] = FAILED
+            result['error'] = str(task.exception())
+        else:
+            result['status'] = PUBLISHED
+
+
+def audit_events(user, results):
+    """
+    Audit log entries (log_event keyword arguments) for a processed batch,
+    matching what /api/control-device logs for a single command.
+    """
+    events = []
+    for result in results:
+        device, action, status = result['device'], result['action'], result['status']
+        if status == UNAUTHORIZED:
+            events.append({
+                'message': f"User {user} attempted unauthorized control of {device}",
+                'log_type': 'ATTACK',
+                'device': device,
+                'user': user,
+                'severity': 'WARNING',
+                'category': 'unauthorized_control'
+            })
+        elif status in (PUBLISHED, QUEUED):
+            suffix = '' if status == PUBLISHED else ' (not acknowledged)'
+            events.append({
+                'message': f"Device control command sent: {device} -> {action}{suffix}",
+                'log_type': 'DEVICE_UPDATE',
+                'device': device,
+                'user': user,
+                'source': result['topic']
+            })
+        elif status == FAILED:
+            events.append({
+                'message': f"Device control command failed: {device} -> {action} ({result.get('error')})",
+                'log_type': 'DEVICE_UPDATE',
+                'device': device,
+                'user': user,
+                'source': result['topic'],
+                'severity': 'WARNING'
+            })
+    return events
+
+
+def response_body(results):
+    """Per-command results plus a count per status, without internal fields."""
+    summary = {}
+    public = []
+    for result in results:
+        summary[result['status']] = summary.get(result['status'], 0) + 1
+        entry = {'device': result['device'], 'action': result['action'], 'status': result['status']}
+        if 'error' in result:
+            entry['error'] = result['error']
+        public.append(entry)
+    return {
+        'success': summary.get(PUBLISHED, 0) == len(results),
+        'results': public,
+        'summary': summary
+    }
@@ -0,0 +1,260 @@
+"""
+Smart Home Cybersecurity Training Platform - Device Shadow Store
+In-memory last-known state for every device seen on /devices/#, with
+last-seen time and message rate. Updates take a lock stripe chosen by
+device name, so detection workers rarely contend with each other.
+"""
+
+import hashlib
+import logging
+import math
+import threading
+import zlib
+
+logger = logging.getLogger(__name__)
+
+# Payload keys holding a device's new state, in order of preference
+STATE_KEYS = ('action', 'state', 'value')
+
+# Device type inferred from the name when the payload doesn't say
+TYPE_PREFIXES = (('light', 'light'), ('thermostat', 'thermostat'), ('lock', 'lock'))
+
+
+def infer_type(name):
+    for prefix, device_type in TYPE_PREFIXES:
+        if name.startswith(prefix):
+            return device_type
+    return 'unknown'
+
+
+class DeviceShadow:
+    """Last known state of one device."""
+
+    __slots__ = ('name', 'type', 'state', 'last_seen', 'message_count', '_rate', '_rate_ts')
+
+    def __init__(self, name, device_type=None, state='unknown', last_seen=None, message_count=0):
+        self.name = name
+        self.type = device_type or infer_type(name)
+        self.state = state
+        self.last_seen = last_seen
+        self.message_count = message_count
+        self._rate = 0.0
+        self._rate_ts = last_seen or 0.0
+
+    def rate(self, now, tau):
+        """Messages/sec, exponentially decayed to now with time constant tau."""
+        if not self._rate_ts:
+            return 0.0
+        return self._rate * math.exp(-max(0.0, now - self._rate_ts) / tau)
+
+    def to_dict(self, now, tau):
+        return {
+            'name': self.name,
+            'type': self.type,
+            'state': self.state,
+            'last_seen': self.last_seen,
+            'message_count': self.message_count,
+            'rate': round(self.rate(now, tau), 3)
+        }
+
+
+class DeviceShadowStore:
+    """
+    Thread-safe map of device name -> DeviceShadow.
+    A global version number changes on every update; it backs the ETag
+    of /api/devices, so revalidation never builds the device list.
+    Device names come from broker topics, so the map is capped at
+    max_devices; messages for further devices are counted, not stored.
+    """
+
+    def __init__(self, stripes=16, rate_tau=10.0, max_devices=10000):
+        """
+        Args:
+            stripes: Number of lock stripes shared by the devices
+            rate_tau: Time constant (seconds) of the message rate estimate
+            max_devices: Devices tracked; messages from further devices
+                         are ignored (counted as untracked)
+        """
+        self.rate_tau = rate_tau
+        self.max_devices = max_devices
+        self.untracked = 0
+        self._shadows = {}
+        self._stripes = [threading.Lock() for _ in range(stripes)]
+        self._create_lock = threading.Lock()
+        self._version_lock = threading.Lock()
+        self.version = 0
+
+        self._snapshot_version = 0
+        self._snapshot_thread = None
+        self._stop = threading.Event()
+
+    def _stripe(self, name):
+        return self._stripes[zlib.crc32(name.encode()) % len(self._stripes)]
+
+    def _bump(self):
+        with self._version_lock:
+            self.version += 1
+
+    def _get_or_create(self, name, device_type=None):
+        """The device's shadow, or None if it is new and the store is full."""
+        shadow = self._shadows.get(name)
+        if shadow is None:
+            with self._create_lock:
+                shadow = self._shadows.get(name)
+                if shadow is None:
+                    if len(self._shadows) >= self.max_devices:
+                        self.untracked += 1
+                        return None
+                    shadow = DeviceShadow(name, device_type)
+                    self._shadows[name] = shadow
+        return shadow
+
+    # ==================== UPDATES ====================
+
+    def seed(self, name, device_type, state):
+        """Register a device with a default state unless it is already known."""
+        if name in self._shadows:
+            return
+        shadow = self._get_or_create(name, device_type)
+        if shadow is None:
+            return
+        with self._stripe(name):
+            if shadow.last_seen is None and shadow.state == 'unknown':
+                shadow.state = state
+        self._bump()
+
+    def update(self, name, now, data=None):
+        """
+        Record a message for a device.
+        Args:
+            name: Device name
+            now: Message receive time (epoch seconds)
+            data: Parsed payload dict, or None if the payload was not JSON
+                  (last-seen and rate are still updated)
+        """
+        shadow = self._get_or_create(name)
+        if shadow is None:
+            return
+        with self._stripe(name):
+            if data:
+                for key in STATE_KEYS:
+                    value = data.get(key)
+                    if value is not None and not isinstance(value, (dict, list)):
+                        shadow.state = value
+                        break
+                if isinstance(data.get('type'), str) and shadow.type == 'unknown':
+                    shadow.type = data['type']
+
+            shadow._rate = shadow.rate(now, self.rate_tau) + 1.0 / self.rate_tau
+            shadow._rate_ts = now
+            shadow.last_seen = max(now, shadow.last_seen or 0.0)
+            shadow.message_count += 1
+        self._bump()
+
+    # ==================== READS ====================
+
+    def get(self, name, now):
+        shadow = self._shadows.get(name)
+        if shadow is None:
+            return None
+        with self._stripe(name):
+            return shadow.to_dict(now, self.rate_tau)
+
+    def list_devices(self, now):
+        """All shadows as dicts, sorted by device name."""
+        result = []
+        for name in sorted(self._shadows):
+            with self._stripe(name):
+                result.append(self._shadows[name].to_dict(now, self.rate_tau))
+        return result
+
+    def etag(self, *extra):
+        """
+        ETag value (unquoted) for the current store version plus any
+        caller-specific values (e.g. the user's authorized devices).
+        """
+        return hashlib.sha1(repr((self.version,) + extra).encode()).hexdigest()[:16]
+
+    # ==================== SNAPSHOTS ====================
+
+    def save(self, conn):
+        """Write all shadows to the device_shadows table if anything changed."""
+        version = self.version
+        if version == self._snapshot_version:
+            return False
+
+        rows = []
+        for name in list(self._shadows):
+            with self._stripe(name):
+                shadow = self._shadows[name]
+                rows.append((
+                    shadow.name, shadow.type, str(shadow.state),
+                    shadow.last_seen, shadow.message_count
+                ))
+        with conn:
+            conn.executemany('''
+                INSERT OR REPLACE INTO device_shadows
+                    (name, type, state, last_seen, message_count)
+                VALUES (?, ?, ?, ?, ?)
+            ''', rows)
+        self._snapshot_version = version
+        return True
+
+    def load(self, conn):
+        """Restore shadows saved by save() (warm restart)."""
+        rows = conn.execute(
+            'SELECT name, type, state, last_seen, message_count FROM device_shadows'
+        ).fetchall()
+        loaded = 0
+        with self._create_lock:
+            for name, device_type, state, last_seen, message_count in rows:
+                if name not in self._shadows and len(self._shadows) >= self.max_devices:
+                    continue
+                self._shadows[name] = DeviceShadow(name, device_type, state, last_seen, message_count or 0)
+                loaded += 1
+        self._bump()
+        self._snapshot_version = self.version
+        return loaded
+
+    def start_snapshots(self, connect, database, interval=30.0):
+        """
+        Periodically save shadows to SQLite from a background thread.
+        Args:
+            connect: Callable(database) returning a connection
+            database: Path to the SQLite database file
+            interval: Seconds between snapshots
+        """
+        if self._snapshot_thread is not None:
+            return
+
+        def run():
+            conn = connect(database)
+            try:
+                while not self._stop.wait(interval):
+                    try:
+                        self.save(conn)
+                    except Exception as e:
+                        logger.error(f"Error saving device shadow snapshot: {e}")
+                self.save(conn)
+            finally:
+                conn.close()
+
+        self._snapshot_thread = threading.Thread(target=run, name='device-shadow-snapshots', daemon=True)
+        self._snapshot_thread.start()
+
+    def stop_snapshots(self, timeout=5.0):
+        """Stop the snapshot thread after one final save."""
+        if self._snapshot_thread is None:
+            return
+        self._stop.set()
+        self._snapshot_thread.join(timeout)
+        self._snapshot_thread = None
+
+    def stats(self):
+        return {
+            'devices': len(self._shadows),
+            'max_devices': self.max_devices,
+            'untracked': self.untracked,
+            'version': self.version,
+            'snapshots': self._snapshot_thread is not None and self._snapshot_thread.is_alive()
+        }
@@ -0,0 +1,360 @@
+"""
+Smart Home Cybersecurity Training Platform - Embedded Broker
+In-process publish/subscribe broker that stands in for Mosquitto, so
+training sessions and detection benchmarks can run on one machine with no
+network. Subscriptions are compiled into a topic trie (with + and #
+wildcards), and delivery is in one global publish order, so runs are
+reproducible.
+
+EmbeddedClient offers the subset of paho's client API the backend uses,
+so the backend can swap it in with MQTT_TRANSPORT=embedded.
+
+Differences from a real broker: no retained messages, no persistence and
+no WebSocket listener (the React Attack page cannot reach it). Every QoS
+level is delivered exactly once, in memory.
+"""
+
+import itertools
+import logging
+import threading
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# Topics whose subscriber list is cached after the first match
+MATCH_CACHE_SIZE = 10000
+
+MQTT_ERR_SUCCESS = 0
+MQTT_ERR_NO_CONN = 4
+
+
+def _levels(topic_filter):
+    """Split and validate a subscription filter."""
+    levels = topic_filter.split('/')
+    for index, level in enumerate(levels):
+        if '#' in level and (level != '#' or index != len(levels) - 1):
+            raise ValueError(f"Invalid topic filter {topic_filter!r}: '#' must be the whole last level")
+        if '+' in level and level != '+':
+            raise ValueError(f"Invalid topic filter {topic_filter!r}: '+' must be a whole level")
+    return levels
+
+
+class _Node:
+    __slots__ = ('children', 'exact', 'multi')
+
+    def __init__(self):
+        self.children = {}   # level (or '+') -> _Node
+        self.exact = []      # Subscriptions whose filter ends here
+        self.multi = []      # Subscriptions whose filter ends here with '#'
+
+
+class TopicTrie:
+    """
+    Subscription filters compiled into a trie of topic levels.
+    match() walks one trie level per topic level, following the literal
+    child and the '+' child; '#' subscriptions are collected on the way.
+    Results are cached per topic until the subscriptions change.
+    """
+
+    def __init__(self, cache_size=MATCH_CACHE_SIZE):
+        self._root = _Node()
+        self._cache = {}
+        self.cache_size = cache_size
+        self.count = 0
+
+    def add(self, topic_filter, subscription):
+        levels = _levels(topic_filter)
+        node = self._root
+        multi = levels[-1] == '#'
+        for level in levels[:-1] if multi else levels:
+            node = node.children.setdefault(level, _Node())
+        (node.multi if multi else node.exact).append(subscription)
+        self.count += 1
+        self._cache.clear()
+
+    def remove(self, topic_filter, predicate):
+        """Remove the subscriptions on topic_filter for which predicate is true."""
+        levels = _levels(topic_filter)
+        multi = levels[-1] == '#'
+        path = [self._root]
+        for level in levels[:-1] if multi else levels:
+            child = path[-1].children.get(level)
+            if child is None:
+                return 0
+            path.append(child)
+
+        node = path[-1]
+        entries = node.multi if multi else node.exact
+        kept = [entry for entry in entries if not predicate(entry)]
+        removed = len(entries) - len(kept)
+        entries[:] = kept
+        self.count -= removed
+
+        # Prune branches left empty
+        for depth in range(len(path) - 1, 0, -1):
+            child = path[depth]
+            if child.children or child.exact or child.multi:
+                break
+            del path[depth - 1].children[(levels[:-1] if multi else levels)[depth - 1]]
+        if removed:
+            self._cache.clear()
+        return removed
+
+    def match(self, topic):
+        """
+        Subscriptions matching a topic name, in subscription order.
+        Returns:
+            Tuple of subscriptions (shared; do not modify)
+        """
+        cached = self._cache.get(topic)
+        if cached is not None:
+            return cached
+
+        levels = topic.split('/')
+        matched = []
+        nodes = [self._root]
+        # Wildcards at the first level do not match $-prefixed topics
+        system = topic.startswith('$')
+        for depth, level in enumerate(levels):
+            next_nodes = []
+            for node in nodes:
+                wildcards = not (system and depth == 0)
+                if wildcards:
+                    matched.extend(node.multi)
+                child = node.children.get(level)
+                if child is not None:
+                    next_nodes.append(child)
+                if wildcards:
+                    child = node.children.get('+')
+                    if child is not None:
+                        next_nodes.append(child)
+            nodes = next_nodes
+            if not nodes:
+                break
+        for node in nodes:
+            matched.extend(node.exact)
+            # 'a/#' also matches 'a'
+            matched.extend(node.multi)
+
+        matched.sort(key=lambda subscription: subscription[0])
+        result = tuple(matched)
+        if len(self._cache) >= self.cache_size:
+            self._cache.clear()
+        self._cache[topic] = result
+        return result
+
+
+class EmbeddedMessage:
+    """A delivered message, shaped like paho's MQTTMessage."""
+
+    __slots__ = ('topic', 'payload', 'qos', 'retain', 'mid')
+
+    def __init__(self, topic, payload, qos=0, retain=False, mid=0):
+        self.topic = topic
+        self.payload = payload
+        self.qos = qos
+        self.retain = retain
+        self.mid = mid
+
+
+class EmbeddedMessageInfo:
+    """Publish result, shaped like paho's MQTTMessageInfo."""
+
+    __slots__ = ('mid', 'rc')
+
+    def __init__(self, mid, rc=MQTT_ERR_SUCCESS):
+        self.mid = mid
+        self.rc = rc
+
+    def is_published(self):
+        # Delivery to subscribers has been queued in broker order
+        return self.rc == MQTT_ERR_SUCCESS
+
+    def wait_for_publish(self, timeout=None):
+        if self.rc != MQTT_ERR_SUCCESS:
+            raise RuntimeError('Message publish failed: The client is not currently connected.')
+
+
+class EmbeddedBroker:
+    """
+    In-process broker.
+    Publishes go onto one FIFO queue. Whichever thread finds the queue
+    idle drains it, so messages are delivered in global publish order
+    (including ones published from inside a subscriber callback), and
+    each message reaches its subscribers in subscription order.
+    """
+
+    def __init__(self):
+        self._trie = TopicTrie()
+        self._lock = threading.Lock()
+        self._pending = deque()
+        self._draining = False
+        self._mids = itertools.count(1)
+        self._sequence = itertools.count()
+
+        self.published = 0
+        self.delivered = 0
+        self.errors = 0
+
+    def subscribe(self, client, topic_filter, qos=0):
+        with self._lock:
+            # Re-subscribing replaces the earlier subscription, like MQTT
+            self._trie.remove(topic_filter, lambda entry: entry[1] is client)
+            self._trie.add(topic_filter, (next(self._sequence), client, qos))
+
+    def unsubscribe(self, client, topic_filter):
+        with self._lock:
+            return self._trie.remove(topic_filter, lambda entry: entry[1] is client)
+
+    def disconnect(self, client):
+        """Drop every subscription held by client."""
+        with self._lock:
+            filters = list(client._subscriptions)
+            for topic_filter in filters:
+                self._trie.remove(topic_filter, lambda entry: entry[1] is client)
+
+    def publish(self, topic, payload=b'', qos=0, retain=False):
+        """
+        Queue a message for delivery; delivers it (and anything queued
+        behind it) on this thread unless another thread is already doing so.
+        Returns:
+            The message id
+        """
+        if '+' in topic or '#' in topic:
+            raise ValueError(f"Publish topic {topic!r} must not contain wildcards")
+        if payload is None:
+            payload = b''
+        elif isinstance(payload, str):
+            payload = payload.encode()
+        elif isinstance(payload, (int, float)):
+            payload = str(payload).encode()
+        else:
+            payload = bytes(payload)
+
+        with self._lock:
+            mid = next(self._mids)
+            self._pending.append(EmbeddedMessage(topic, payload, qos, retain, mid))
+            self.published += 1
+            if self._draining:
+                return mid
+            self._draining = True
+        self._drain()
+        return mid
+
+    def _drain(self):
+        while True:
+            with self._lock:
+                if not self._pending:
+                    self._draining = False
+                    return
+                message = self._pending.popleft()
+                subscriptions = self._trie.match(message.topic)
+            for _, client, _ in subscriptions:
+                try:
+                    client._deliver(message)
+                    self.delivered += 1
+                except Exception as e:
+                    self.errors += 1
+                    logger.error(f"Embedded broker subscriber {client.client_id} failed: {e}")
+
+    def stats(self):
+        with self._lock:
+            return {
+                'published': self.published,
+                'delivered': self.delivered,
+                'errors': self.errors,
+                'subscriptions': self._trie.count,
+                'queued': len(self._pending)
+            }
+
+
+_default_broker = None
+_default_lock = threading.Lock()
+
+
+def default_broker():
+    """The process-wide broker shared by every EmbeddedClient by default."""
+    global _default_broker
+    with _default_lock:
+        if _default_broker is None:
+            _default_broker = EmbeddedBroker()
+        return _default_broker
+
+
+class EmbeddedClient:
+    """
+    paho-style client for the embedded broker (callback API version 1).
+    Callbacks run on the thread that is draining the broker queue.
+    """
+
+    def __init__(self, client_id='', broker=None, userdata=None):
+        self.client_id = client_id
+        self.broker = broker or default_broker()
+        self.userdata = userdata
+        self.on_connect = None
+        self.on_message = None
+        self.on_disconnect = None
+        self._subscriptions = set()
+        self._connected = False
+        self._disconnected = threading.Event()
+
+    def connect(self, host=None, port=None, keepalive=60, *args, **kwargs):
+        """host/port are accepted for paho compatibility and ignored."""
+        self._connected = True
+        self._disconnected.clear()
+        if self.on_connect is not None:
+            self.on_connect(self, self.userdata, {'session present': 0}, 0)
+        return MQTT_ERR_SUCCESS
+
+    connect_async = connect
+
+    def disconnect(self, *args, **kwargs):
+        if not self._connected:
+            return MQTT_ERR_NO_CONN
+        self.broker.disconnect(self)
+        self._subscriptions.clear()
+        self._connected = False
+        self._disconnected.set()
+        if self.on_disconnect is not None:
+            self.on_disconnect(self, self.userdata, 0)
+        return MQTT_ERR_SUCCESS
+
+    def is_connected(self):
+        return self._connected
+
+    def subscribe(self, topic, qos=0, *args, **kwargs):
+        if not self._connected:
+            return MQTT_ERR_NO_CONN, None
+        self.broker.subscribe(self, topic, qos)
+        self._subscriptions.add(topic)
+        return MQTT_ERR_SUCCESS, None
+
+    def unsubscribe(self, topic, *args, **kwargs):
+        self.broker.unsubscribe(self, topic)
+        self._subscriptions.discard(topic)
+        return MQTT_ERR_SUCCESS, None
+
+    def publish(self, topic, payload=None, qos=0, retain=False, *args, **kwargs):
+        if not self._connected:
+            return EmbeddedMessageInfo(0, MQTT_ERR_NO_CONN)
+        return EmbeddedMessageInfo(self.broker.publish(topic, payload, qos, retain))
+
+    def _deliver(self, message):
+        if self.on_message is not None:
+            self.on_message(self, self.userdata, message)
+
+    # Network loop stand-ins: delivery happens on publishing threads
+
+    def loop_forever(self, *args, **kwargs):
+        """Block until disconnect(), as paho's loop_forever does."""
+        self._disconnected.wait()
+        return MQTT_ERR_SUCCESS
+
+    def loop_start(self):
+        return MQTT_ERR_SUCCESS
+
+    def loop_stop(self, *args, **kwargs):
+        return MQTT_ERR_SUCCESS
+
+    def max_inflight_messages_set(self, inflight):
+        pass
@@ -0,0 +1,150 @@
+"""
+Smart Home Cybersecurity Training Platform - Event Statistics
+Sliding-window event counters behind /api/stats. Each window is a ring
+buffer of time buckets with a running total that is updated as events are
+recorded and as old buckets expire, so reading the stats never touches
+the logs table and costs O(distinct keys), not O(events).
+"""
+
+import threading
+import time
+
+# (name, bucket seconds, bucket count)
+DEFAULT_WINDOWS = (
+    ('1m', 1, 60),
+    ('1h', 60, 60),
+    ('24h', 300, 288),
+)
+
+
+class _Window:
+    """Ring buffer of per-bucket counts plus their running total."""
+
+    def __init__(self, bucket_seconds, size):
+        self.bucket_seconds = bucket_seconds
+        self.size = size
+        self.buckets = [{} for _ in range(size)]
+        self.totals = {}
+        self.head = None
+
+    def advance(self, now):
+        """Expire buckets that have slid out of the window."""
+        current = int(now // self.bucket_seconds)
+        if self.head is None:
+            self.head = current
+            return
+        if current <= self.head:
+            return
+        if current - self.head >= self.size:
+            # Idle for longer than the window: everything has expired
+            self.buckets = [{} for _ in range(self.size)]
+            self.totals = {}
+        else:
+            for bucket_id in range(self.head + 1, current + 1):
+                bucket = self.buckets[bucket_id % self.size]
+                for key, count in bucket.items():
+                    remaining = self.totals[key] - count
+                    if remaining:
+                        self.totals[key] = remaining
+                    else:
+                        del self.totals[key]
+                bucket.clear()
+        self.head = current
+
+    def add(self, ts, keys):
+        bucket_id = int(ts // self.bucket_seconds)
+        if bucket_id > self.head or self.head - bucket_id >= self.size:
+            # In the future or already outside the window
+            return
+        bucket = self.buckets[bucket_id % self.size]
+        totals = self.totals
+        for key in keys:
+            bucket[key] = bucket.get(key, 0) + 1
+            totals[key] = totals.get(key, 0) + 1
+
+
+class EventStats:
+    """
+    Incrementally maintained event counts over several sliding windows.
+    Every event is counted by log type; ATTACK events are also counted by
+    attack type, device and severity.
+    """
+
+    def __init__(self, windows=DEFAULT_WINDOWS):
+        """
+        Args:
+            windows: (name, bucket_seconds, bucket_count) per window
+        """
+        self._lock = threading.Lock()
+        self._windows = {name: _Window(seconds, size) for name, seconds, size in windows}
+        self.recorded = 0
+
+    @staticmethod
+    def _keys(log_type, device, severity, category):
+        keys = [('log_type', log_type)]
+        if log_type == 'ATTACK':
+            keys.append(('attack_type', category or 'unknown'))
+            keys.append(('severity', severity or 'INFO'))
+            if device:
+                keys.append(('device', device))
+        return keys
+
+    def record(self, log_type, device=None, severity=None, category=None, ts=None):
+        """
+        Count one event.
+        Args:
+            log_type: 'ATTACK', 'DEFENSE', 'DEVICE_UPDATE', 'AUTH'
+            device: Device affected
+            severity: 'INFO', 'WARNING', 'CRITICAL'
+            category: Attack type (e.g. the detection rule name)
+            ts: Event time in epoch seconds (defaults to now)
+        """
+        now = time.time()
+        ts = now if ts is None else ts
+        keys = self._keys(log_type, device, severity, category)
+        with self._lock:
+            for window in self._windows.values():
+                window.advance(now)
+                window.add(ts, keys)
+            self.recorded += 1
+
+    def reset(self):
+        with self._lock:
+            for window in self._windows.values():
+                window.buckets = [{} for _ in range(window.size)]
+                window.totals = {}
+            self.recorded = 0
+
+    def snapshot(self, top_n=5):
+        """
+        Current counts for every window.
+        Args:
+            top_n: Number of most targeted devices to include per window
+        Returns:
+            {window: {'events', 'by_log_type', 'attacks': {...}, 'top_devices'}}
+        """
+        now = time.time()
+        with self._lock:
+            totals = {}
+            for name, window in self._windows.items():
+                window.advance(now)
+                totals[name] = dict(window.totals)
+
+        result = {}
+        for name, counts in totals.items():
+            grouped = {'log_type': {}, 'attack_type': {}, 'device': {}, 'severity': {}}
+            for (dimension, value), count in counts.items():
+                grouped[dimension][value] = count
+            top_devices = sorted(grouped['device'].items(), key=lambda item: (-item[1], item[0]))[:top_n]
+            result[name] = {
+                'events': sum(grouped['log_type'].values()),
+                'by_log_type': grouped['log_type'],
+                'attacks': {
+                    'total': grouped['log_type'].get('ATTACK', 0),
+                    'by_type': grouped['attack_type'],
+                    'by_device': grouped['device'],
+                    'by_severity': grouped['severity']
+                },
+                'top_devices': [{'device': device, 'attacks': count} for device, count in top_devices]
+            }
+        return result
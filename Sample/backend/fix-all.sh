@@ -44,7 +44,7 @@ python -m pip install --upgrade pip setuptools wheel --quiet
 # Step 5: Install requirements
 echo "[5/5] 📥 Installing dependencies..."
 echo ""
-echo "Installing: Flask, Flask-CORS, Flask-Session, paho-mqtt 2.1.0, python-dotenv"
+echo "Installing: Flask, Flask-CORS, paho-mqtt 2.1.0, python-dotenv"
 echo ""
 pip install --no-cache-dir -r requirements.txt
 
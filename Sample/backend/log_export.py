@@ -0,0 +1,399 @@
+"""
+Smart Home Cybersecurity Training Platform - Columnar Log Export
+Streams the logs table in keyset chunks into a directory of flat,
+memory-mappable column files for offline analytics, and opens such
+exports again without SQLite and without building Python objects per row.
+
+Layout of an export directory:
+    manifest.json           row count, column types, export metadata
+    id.bin, ts.bin          int64 columns
+    <name>.codes.bin        int32 dictionary codes (-1 = NULL) for
+                            log_type, device, severity, source and user
+    <name>.dict.offsets.bin + <name>.dict.data.bin
+                            the dictionary values as UTF-8 strings
+    <name>.offsets.bin + <name>.data.bin
+                            UTF-8 strings for message and payload (NULL is
+                            ''): value i is data[offsets[i]:offsets[i+1]]
+All files are little-endian and raw (no header), so
+numpy.memmap(path, dtype, mode='r') maps them directly.
+
+Usage:
+    python log_export.py export smart_home_logs.db session1.logs --label "Session 1"
+    python log_export.py info session1.logs
+"""
+
+import argparse
+import json
+import logging
+import os
+import shutil
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+
+from db import Database
+from payload_store import decode_body
+
+logger = logging.getLogger(__name__)
+
+FORMAT_NAME = 'smart-home-logs-columnar'
+FORMAT_VERSION = 2
+
+# Rows read from SQLite and appended to the column files per step
+EXPORT_CHUNK_SIZE = 50000
+
+INT_COLUMNS = ('id', 'ts')
+DICTIONARY_COLUMNS = ('log_type', 'device', 'severity', 'source', 'user')
+# Payloads are written per row: distinct payloads grow with the table
+STRING_COLUMNS = ('message', 'payload')
+
+INT_DTYPE = np.dtype('<i8')
+CODE_DTYPE = np.dtype('<i4')
+OFFSET_DTYPE = np.dtype('<i8')
+
+
+# ==================== EXPORT ====================
+
+class _Dictionary:
+    """Value -> code mapping built while streaming."""
+
+    def __init__(self):
+        self.codes = {}
+        self.values = []
+
+    def code(self, value):
+        if value is None:
+            return -1
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+
+class _StringWriter:
+    """Appends UTF-8 strings to a data file and their end offsets to an offsets file."""
+
+    def __init__(self, prefix):
+        self._offsets = open(prefix + '.offsets.bin', 'wb')
+        self._data = open(prefix + '.data.bin', 'wb')
+        self._end = 0
+        np.zeros(1, OFFSET_DTYPE).tofile(self._offsets)
+
+    def append(self, values):
+        encoded = [(value or '').encode() for value in values]
+        lengths = np.fromiter((len(value) for value in encoded), OFFSET_DTYPE, len(encoded))
+        offsets = np.cumsum(lengths) + self._end
+        if len(offsets):
+            self._end = int(offsets[-1])
+        offsets.astype(OFFSET_DTYPE).tofile(self._offsets)
+        self._data.write(b''.join(encoded))
+
+    def close(self):
+        self._offsets.close()
+        self._data.close()
+
+
+def _build_query(log_types=None, since=None, until=None):
+    query = (
+        'SELECT id, ts, log_type, device, severity, source, user, message, payload_id '
+        'FROM logs WHERE id > ? AND id <= ?'
+    )
+    params = []
+    if log_types:
+        query += f" AND log_type IN ({', '.join('?' * len(log_types))})"
+        params.extend(log_types)
+    if since is not None:
+        query += ' AND ts >= ?'
+        params.append(since)
+    if until is not None:
+        query += ' AND ts < ?'
+        params.append(until)
+    return query + ' ORDER BY id LIMIT ?', params
+
+
+def export_logs(database, path, log_types=None, since=None, until=None, label=None,
+                chunk_size=EXPORT_CHUNK_SIZE, db=None):
+    """
+    Export logs to a columnar directory at path.
+    Rows are read in id order, chunk_size at a time, up to the newest id
+    at the start of the export, so rows logged meanwhile are not included.
+    Messages and payloads are streamed to their column files chunk by
+    chunk; only the dictionaries of the label columns (one entry per
+    distinct log type, device, source, ...) are kept until the end. The
+    export is written next to path and renamed into place when complete.
+    Args:
+        database: Path to the SQLite database file
+        path: Export directory to create (must not exist)
+        log_types: Only export these log types
+        since, until: Only export rows with since <= ts < until (epoch ms)
+        label: Free-form name stored in the manifest (e.g. the session)
+        db: Existing db.Database to read through (one is opened otherwise)
+    Returns:
+        The manifest dict
+    Raises:
+        FileExistsError: If path already exists
+    """
+    if os.path.exists(path):
+        raise FileExistsError(f"Export {path} already exists")
+    staging = path + '.partial'
+    if os.path.exists(staging):
+        shutil.rmtree(staging)
+    os.makedirs(staging)
+
+    start = time.perf_counter()
+    reader = db or Database(database, pool_size=1)
+    query, filter_params = _build_query(log_types, since, until)
+    dictionaries = {name: _Dictionary() for name in DICTIONARY_COLUMNS}
+
+    int_files = {name: open(os.path.join(staging, f'{name}.bin'), 'wb') for name in INT_COLUMNS}
+    code_files = {name: open(os.path.join(staging, f'{name}.codes.bin'), 'wb') for name in DICTIONARY_COLUMNS}
+    strings = {name: _StringWriter(os.path.join(staging, name)) for name in STRING_COLUMNS}
+    rows = 0
+    try:
+        with reader.read() as conn:
+            max_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM logs').fetchone()[0]
+            last_id = 0
+            while True:
+                chunk = conn.execute(query, [last_id, max_id] + filter_params + [chunk_size]).fetchall()
+                if not chunk:
+                    break
+                payloads = _load_payloads(conn, chunk)
+
+                for index, name in enumerate(INT_COLUMNS):
+                    np.fromiter((row[index] or 0 for row in chunk), INT_DTYPE, len(chunk)).tofile(int_files[name])
+                for name in DICTIONARY_COLUMNS:
+                    code = dictionaries[name].code
+                    np.fromiter((code(row[name]) for row in chunk), CODE_DTYPE, len(chunk)).tofile(code_files[name])
+                strings['message'].append(row['message'] for row in chunk)
+                strings['payload'].append(payloads.get(row['payload_id']) for row in chunk)
+
+                rows += len(chunk)
+                last_id = chunk[-1]['id']
+                if len(chunk) < chunk_size:
+                    break
+    finally:
+        for f in list(int_files.values()) + list(code_files.values()):
+            f.close()
+        for writer in strings.values():
+            writer.close()
+        if db is None:
+            reader.close()
+
+    for name, dictionary in dictionaries.items():
+        writer = _StringWriter(os.path.join(staging, f'{name}.dict'))
+        writer.append(dictionary.values)
+        writer.close()
+
+    manifest = {
+        'format': FORMAT_NAME,
+        'version': FORMAT_VERSION,
+        'rows': rows,
+        'label': label,
+        'exported_at': datetime.now().isoformat(),
+        'source': os.path.abspath(database),
+        'max_id': max_id,
+        'filters': {'log_types': list(log_types) if log_types else None, 'since': since, 'until': until},
+        'columns': {
+            **{name: {'type': 'int64'} for name in INT_COLUMNS},
+            **{name: {'type': 'dictionary', 'size': len(dictionaries[name].values)} for name in DICTIONARY_COLUMNS},
+            **{name: {'type': 'string'} for name in STRING_COLUMNS}
+        }
+    }
+    with open(os.path.join(staging, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(staging, path)
+
+    logger.info(f"Exported {rows} log rows to {path} in {time.perf_counter() - start:.1f}s")
+    return manifest
+
+
+def _load_payloads(conn, chunk):
+    """payload_id -> payload text for the payloads referenced in chunk."""
+    ids = sorted({row['payload_id'] for row in chunk if row['payload_id'] is not None})
+    payloads = {}
+    # Bounded IN lists (SQLite's variable limit)
+    for start in range(0, len(ids), 500):
+        batch = ids[start:start + 500]
+        found = conn.execute(
+            f"SELECT id, encoding, body FROM payloads WHERE id IN ({', '.join('?' * len(batch))})", batch
+        ).fetchall()
+        for payload_id, encoding, body in found:
+            payloads[payload_id] = decode_body(encoding, body).decode(errors='replace')
+    return payloads
+
+
+# ==================== LOADER ====================
+
+class StringColumn:
+    """
+    Read-only view of an offsets + data string column.
+    Indexing decodes one value; offsets and data are numpy memmaps.
+    """
+
+    def __init__(self, prefix, count=None):
+        self.offsets = np.memmap(prefix + '.offsets.bin', OFFSET_DTYPE, mode='r')
+        data_path = prefix + '.data.bin'
+        # numpy cannot map an empty file
+        self.data = (np.memmap(data_path, np.uint8, mode='r')
+                     if os.path.getsize(data_path) else np.zeros(0, np.uint8))
+        if count is not None and len(self.offsets) != count + 1:
+            raise ValueError(f"{prefix}: expected {count} strings, found {len(self.offsets) - 1}")
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return self.data[self.offsets[index]:self.offsets[index + 1]].tobytes().decode()
+
+    def tolist(self):
+        data = self.data.tobytes()
+        offsets = self.offsets.tolist()
+        return [data[offsets[i]:offsets[i + 1]].decode() for i in range(len(self))]
+
+
+class LogExport:
+    """
+    An opened export. Numeric columns and dictionary codes are numpy
+    memmaps (nothing is read until used); dictionaries are small lists.
+
+    Example:
+        logs = LogExport('session1.logs')
+        attacks = logs.equals('log_type', 'ATTACK')
+        per_device = np.bincount(logs.codes('device')[attacks], minlength=len(logs.dictionary('device')))
+    """
+
+    def __init__(self, path):
+        """
+        Raises:
+            ValueError: If path is not an export in a supported format
+        """
+        self.path = path
+        with open(os.path.join(path, 'manifest.json')) as f:
+            self.manifest = json.load(f)
+        if self.manifest.get('format') != FORMAT_NAME or self.manifest.get('version') != FORMAT_VERSION:
+            raise ValueError(f"{path} is not a {FORMAT_NAME} v{FORMAT_VERSION} export")
+        self.rows = self.manifest['rows']
+        self.label = self.manifest.get('label')
+        self._dictionaries = {}
+        self._strings = {}
+
+    def __len__(self):
+        return self.rows
+
+    def _map(self, filename, dtype):
+        path = os.path.join(self.path, filename)
+        if self.rows == 0:
+            return np.zeros(0, dtype)
+        array = np.memmap(path, dtype, mode='r')
+        if len(array) != self.rows:
+            raise ValueError(f"{path}: expected {self.rows} values, found {len(array)}")
+        return array
+
+    def column(self, name):
+        """int64 memmap of an integer column ('id' or 'ts')."""
+        if name not in INT_COLUMNS:
+            raise KeyError(f"{name} is not an integer column")
+        return self._map(f'{name}.bin', INT_DTYPE)
+
+    def codes(self, name):
+        """int32 memmap of a dictionary column's codes (-1 = NULL)."""
+        if name not in DICTIONARY_COLUMNS:
+            raise KeyError(f"{name} is not a dictionary column")
+        return self._map(f'{name}.codes.bin', CODE_DTYPE)
+
+    def dictionary(self, name):
+        """Values of a dictionary column; code i stands for dictionary(name)[i]."""
+        if name not in self._dictionaries:
+            if name not in DICTIONARY_COLUMNS:
+                raise KeyError(f"{name} is not a dictionary column")
+            self._dictionaries[name] = StringColumn(os.path.join(self.path, f'{name}.dict')).tolist()
+        return self._dictionaries[name]
+
+    def strings(self, name):
+        """StringColumn of a string column ('message' or 'payload')."""
+        if name not in STRING_COLUMNS:
+            raise KeyError(f"{name} is not a string column")
+        if name not in self._strings:
+            self._strings[name] = StringColumn(os.path.join(self.path, name), self.rows)
+        return self._strings[name]
+
+    def code_of(self, name, value):
+        """Code of value in a dictionary column, or None if it never occurs."""
+        try:
+            return self.dictionary(name).index(value)
+        except ValueError:
+            return None
+
+    def equals(self, name, value):
+        """Boolean mask of the rows whose dictionary column equals value."""
+        code = self.code_of(name, value)
+        if code is None:
+            return np.zeros(self.rows, bool)
+        return self.codes(name) == code
+
+    def decode(self, name, indices=None):
+        """Values of a dictionary column (optionally only at indices) as a list."""
+        values = self.dictionary(name)
+        codes = self.codes(name) if indices is None else self.codes(name)[indices]
+        return [values[code] if code >= 0 else None for code in codes.tolist()]
+
+
+def open_exports(paths):
+    """Open several exports (e.g. one per training session)."""
+    return [LogExport(path) for path in paths]
+
+
+# ==================== CLI ====================
+
+def _print_info(path):
+    logs = LogExport(path)
+    ts = logs.column('ts')
+    print(f"{path}: {logs.rows:,} rows" + (f" ({logs.label})" if logs.label else ''))
+    if logs.rows:
+        first = datetime.fromtimestamp(int(ts.min()) / 1000).isoformat(timespec='seconds')
+        last = datetime.fromtimestamp(int(ts.max()) / 1000).isoformat(timespec='seconds')
+        print(f"  time range: {first} .. {last}")
+    counts = np.bincount(logs.codes('log_type') + 1, minlength=len(logs.dictionary('log_type')) + 1)
+    for code, value in enumerate(logs.dictionary('log_type')):
+        print(f"  {value:14} {int(counts[code + 1]):>12,}")
+    for name in DICTIONARY_COLUMNS:
+        print(f"  distinct {name}: {len(logs.dictionary(name)):,}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Columnar export of the logs table')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    export = commands.add_parser('export', help='Export logs to a columnar directory')
+    export.add_argument('database')
+    export.add_argument('path')
+    export.add_argument('--type', action='append', dest='log_types', help='Log type to include (repeatable)')
+    export.add_argument('--since', type=int, help='Epoch ms')
+    export.add_argument('--until', type=int, help='Epoch ms')
+    export.add_argument('--label', help='Name stored in the manifest, e.g. the session')
+    export.add_argument('--chunk-size', type=int, default=EXPORT_CHUNK_SIZE)
+
+    info = commands.add_parser('info', help='Summarize an export')
+    info.add_argument('path')
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    if args.command == 'export':
+        manifest = export_logs(args.database, args.path, log_types=args.log_types, since=args.since,
+                               until=args.until, label=args.label, chunk_size=args.chunk_size)
+        print(f"Exported {manifest['rows']:,} rows to {args.path}")
+    else:
+        _print_info(args.path)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,113 @@
+"""
+Smart Home Cybersecurity Training Platform - Log Search
+Turns /api/logs/search queries into FTS5 MATCH expressions over the
+logs_fts index (see migrations._create_search_index) plus structured
+filters on the logs table.
+
+Query syntax (terms are ANDed):
+    attacker            a token anywhere in message, source or user
+    attack*             token prefix
+    "bypass auth"       phrase
+    user:attacker       restrict a term to one column (message, source, user)
+Everything is quoted before it reaches FTS5, so user input cannot inject
+FTS5 operators.
+"""
+
+import re
+
+from payload_store import payload_filter
+
+SEARCH_COLUMNS = ('message', 'source', 'user')
+
+# bm25 weights per column (message, source, user): a hit on the user who
+# triggered an event counts more than a mention in free text
+BM25_WEIGHTS = (1.0, 0.5, 2.0)
+
+SORT_ORDERS = ('rank', 'recent')
+
+_TERM = re.compile(r'(?:(\w+):)?(?:"([^"]*)"|(\S+))')
+
+
+def _quote(text):
+    return '"' + text.replace('"', '""') + '"'
+
+
+def parse_search_query(text):
+    """
+    Convert a search query to an FTS5 MATCH expression.
+    Raises:
+        ValueError: If the query has no searchable terms
+    """
+    clauses = []
+    for match in _TERM.finditer(text or ''):
+        column, phrase, word = match.groups()
+        if column is not None and column not in SEARCH_COLUMNS:
+            # Not a column filter (e.g. "Device:light1"): search it as text
+            column, phrase, word = None, match.group(0).replace('"', ' '), None
+
+        if phrase is not None:
+            term = _quote(phrase) if phrase.strip() else None
+        else:
+            prefix = word.endswith('*')
+            word = word.rstrip('*')
+            if not word:
+                continue
+            term = _quote(word) + (' *' if prefix else '')
+        if term is None:
+            continue
+        clauses.append(f'{column} : {term}' if column else term)
+
+    if not clauses:
+        raise ValueError('Search query has no terms')
+    return ' AND '.join(clauses)
+
+
+def build_search_query(match, log_type=None, device=None, user=None, severity=None,
+                       since=None, until=None, order='rank', action=None,
+                       payload_user=None, flag=None, client_id=None):
+    """
+    Build the ranked search query.
+    logs_fts drives the join (CROSS JOIN fixes the order), so only rows
+    matching the index are read from logs; structured filters apply to
+    those rows.
+    Args:
+        match: FTS5 expression from parse_search_query
+        order: 'rank' (bm25, best first) or 'recent' (newest first)
+        action, payload_user, flag, client_id: Parsed payload field filters
+    Returns:
+        (query, params) ready for LIMIT/OFFSET
+    Raises:
+        ValueError: If flag is not a known payload flag
+    """
+    weights = ', '.join(str(weight) for weight in BM25_WEIGHTS)
+    query = (
+        f"SELECT logs.*, bm25(logs_fts, {weights}) AS score, "
+        "snippet(logs_fts, 0, '[', ']', '...', 16) AS snippet "
+        "FROM logs_fts CROSS JOIN logs ON logs.id = logs_fts.rowid "
+        "WHERE logs_fts MATCH ?"
+    )
+    params = [match]
+
+    for column, value in (('log_type', log_type), ('device', device),
+                          ('user', user), ('severity', severity)):
+        if value:
+            query += f' AND logs.{column} = ?'
+            params.append(value)
+
+    if since is not None:
+        query += ' AND logs.ts >= ?'
+        params.append(since)
+
+    if until is not None:
+        query += ' AND logs.ts < ?'
+        params.append(until)
+
+    clause, clause_params = payload_filter(action, payload_user, flag, client_id, column='logs.payload_id')
+    query += clause
+    params.extend(clause_params)
+
+    if order == 'recent':
+        query += ' ORDER BY logs_fts.rowid DESC'
+    else:
+        query += ' ORDER BY score'
+    return query, params
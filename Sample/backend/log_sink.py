@@ -0,0 +1,284 @@
+"""
+Smart Home Cybersecurity Training Platform - Write-behind Log Sink
+Buffers log rows in a bounded in-memory queue and writes them to SQLite
+in batches from a dedicated writer thread.
+"""
+
+import logging
+import queue
+import sqlite3
+import threading
+import time
+
+from payload_store import resolve_payload_ids
+
+logger = logging.getLogger(__name__)
+
+INSERT_LOG_SQL = '''
+    INSERT INTO logs (timestamp, ts, message, log_type, source, device, user, severity, payload_id)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+# Sentinel placed on the queue to stop the writer thread
+_STOP = object()
+
+
+class _FlushRequest:
+    """Queue marker asking the writer to commit everything queued before it."""
+
+    def __init__(self):
+        self.done = threading.Event()
+
+
+class LogSink:
+    """
+    Write-behind sink for the logs table.
+    Callers enqueue rows with submit(); a single writer thread drains the
+    queue and commits each batch with executemany inside one transaction.
+    A batch is flushed when it reaches batch_size rows or when max_delay
+    seconds have passed since its first row was queued.
+    """
+
+    def __init__(self, database, batch_size=500, max_delay=0.05,
+                 max_queue=10000, put_timeout=0.01, connect=sqlite3.connect,
+                 on_batch=None):
+        """
+        Args:
+            database: Path to the SQLite database file
+            connect: Callable(database) returning the writer connection
+            on_batch: Optional callable(rows, seconds) called after each commit
+            batch_size: Maximum number of rows written per transaction
+            max_delay: Maximum seconds a row waits before being flushed
+            max_queue: Capacity of the in-memory queue
+            put_timeout: Seconds submit() blocks on a full queue before dropping
+        """
+        self.database = database
+        self.connect = connect
+        self.on_batch = on_batch
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self.put_timeout = put_timeout
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._lock = threading.Lock()
+
+        # Counters exposed through stats()
+        self.submitted = 0
+        self.written = 0
+        self.dropped = 0
+        self.blocked = 0
+        self.batches = 0
+        self.errors = 0
+        self.last_batch_size = 0
+
+    # ==================== PRODUCER SIDE ====================
+
+    def submit(self, row):
+        """
+        Queue a log row for writing.
+        Blocks for up to put_timeout when the queue is full (backpressure),
+        then drops the row.
+        Args:
+            row: Tuple matching INSERT_LOG_SQL placeholders, with a
+                 payload_store.StoredPayload (or None) for payload_id
+        Returns:
+            True if the row was queued, False if it was dropped
+        """
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            with self._lock:
+                self.blocked += 1
+            try:
+                self._queue.put(row, timeout=self.put_timeout)
+            except queue.Full:
+                with self._lock:
+                    self.dropped += 1
+                return False
+
+        with self._lock:
+            self.submitted += 1
+        return True
+
+    def submit_many(self, rows):
+        """
+        Queue several rows as one unit that the writer commits in a single
+        transaction (the batch may exceed batch_size to keep them together).
+        Args:
+            rows: List of row tuples as for submit()
+        Returns:
+            True if the rows were queued, False if they were all dropped
+        """
+        group = list(rows)
+        if not group:
+            return True
+        try:
+            self._queue.put_nowait(group)
+        except queue.Full:
+            with self._lock:
+                self.blocked += 1
+            try:
+                self._queue.put(group, timeout=self.put_timeout)
+            except queue.Full:
+                with self._lock:
+                    self.dropped += len(group)
+                return False
+
+        with self._lock:
+            self.submitted += len(group)
+        return True
+
+    def flush(self, timeout=5.0):
+        """
+        Wait until every row queued before this call has been committed.
+        Returns:
+            True if the flush completed within timeout
+        """
+        if not self.is_running():
+            return False
+
+        deadline = time.monotonic() + timeout
+        request = _FlushRequest()
+        try:
+            self._queue.put(request, timeout=timeout)
+        except queue.Full:
+            logger.warning(f"Log sink queue still full after {timeout}s; flush not queued")
+            return False
+        return request.done.wait(max(deadline - time.monotonic(), 0))
+
+    # ==================== LIFECYCLE ====================
+
+    def start(self):
+        """Start the writer thread (no-op if already running)."""
+        if self.is_running():
+            return
+
+        self._thread = threading.Thread(target=self._run, name='log-sink-writer', daemon=True)
+        self._thread.start()
+        logger.info("Log sink writer started")
+
+    def stop(self, timeout=5.0):
+        """
+        Flush pending rows and stop the writer thread.
+        If the queue stays full for timeout seconds the writer is left
+        running (it is a daemon thread) and stop() can be retried.
+        """
+        if not self.is_running():
+            return
+
+        deadline = time.monotonic() + timeout
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            logger.warning(f"Log sink queue still full after {timeout}s; "
+                           f"{self._queue.qsize()} queued entries not written")
+            return
+        self._thread.join(max(deadline - time.monotonic(), 0))
+        self._thread = None
+        logger.info(f"Log sink stopped ({self.written} rows written, {self.dropped} dropped)")
+
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def stats(self):
+        """Return a snapshot of queue depth and write counters."""
+        with self._lock:
+            return {
+                'running': self.is_running(),
+                'queue_depth': self._queue.qsize(),
+                'queue_capacity': self._queue.maxsize,
+                'submitted': self.submitted,
+                'written': self.written,
+                'dropped': self.dropped,
+                'blocked': self.blocked,
+                'batches': self.batches,
+                'errors': self.errors,
+                'last_batch_size': self.last_batch_size
+            }
+
+    # ==================== WRITER THREAD ====================
+
+    def _run(self):
+        conn = self.connect(self.database)
+        try:
+            stopping = False
+            while not stopping:
+                batch, flush_requests, stopping = self._collect_batch()
+                if batch:
+                    self._write_batch(conn, batch)
+                for request in flush_requests:
+                    request.done.set()
+        finally:
+            conn.close()
+
+    def _collect_batch(self):
+        """
+        Block for the first item, then gather more until the batch is full
+        or max_delay has elapsed.
+        Returns:
+            (rows, flush_requests, stopping)
+        """
+        batch = []
+        flush_requests = []
+
+        item = self._queue.get()
+        deadline = time.monotonic() + self.max_delay
+
+        while True:
+            if item is _STOP:
+                # Drain whatever is still queued so shutdown loses nothing
+                self._drain_into(batch, flush_requests)
+                return batch, flush_requests, True
+            if isinstance(item, _FlushRequest):
+                flush_requests.append(item)
+                return batch, flush_requests, False
+
+            if isinstance(item, list):
+                # Row group from submit_many: never split across batches
+                batch.extend(item)
+            else:
+                batch.append(item)
+            if len(batch) >= self.batch_size:
+                return batch, flush_requests, False
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return batch, flush_requests, False
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                return batch, flush_requests, False
+
+    def _drain_into(self, batch, flush_requests):
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            if isinstance(item, _FlushRequest):
+                flush_requests.append(item)
+            elif isinstance(item, list):
+                batch.extend(item)
+            elif item is not _STOP:
+                batch.append(item)
+
+    def _write_batch(self, conn, batch):
+        try:
+            start = time.perf_counter()
+            with conn:
+                # Payload lookups and the rows referencing them share one
+                # write transaction
+                conn.execute('BEGIN IMMEDIATE')
+                conn.executemany(INSERT_LOG_SQL, resolve_payload_ids(conn, batch))
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.written += len(batch)
+                self.batches += 1
+                self.last_batch_size = len(batch)
+            if self.on_batch is not None:
+                self.on_batch(len(batch), elapsed)
+        except Exception as e:
+            with self._lock:
+                self.errors += 1
+            logger.error(f"Error writing log batch of {len(batch)} rows: {e}")
@@ -0,0 +1,221 @@
+"""
+Smart Home Cybersecurity Training Platform - Metrics
+Prometheus-style counters, histograms and callback gauges rendered by the
+/metrics endpoint. Counters and histograms keep one shard per thread, so
+the hot path updates a thread-owned dict without taking a lock; shards
+are only summed when /metrics is scraped. Shards of finished threads
+(e.g. Flask's per-request threads) are folded into one retired shard, so
+memory and scrape cost follow the live threads, not the request count.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Default latency buckets (seconds): 10us .. 5s
+LATENCY_BUCKETS = (
+    0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005,
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0
+)
+
+# Batch size buckets for the log writer
+BATCH_SIZE_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labelnames, labels, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, labels)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class _Sharded:
+    """Base class for metrics with one shard (dict) per writing thread."""
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        # (thread, shard) per live writer; finished ones are merged into _retired
+        self._shards = []
+        self._retired = {}
+        self._shards_lock = threading.Lock()
+
+    def _shard(self):
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = {}
+            self._local.shard = shard
+            with self._shards_lock:
+                self._prune()
+                self._shards.append((threading.current_thread(), shard))
+            return shard
+
+    def _prune(self):
+        # Lock held. A finished thread no longer writes to its shard
+        live = []
+        for thread, shard in self._shards:
+            if thread.is_alive():
+                live.append((thread, shard))
+            else:
+                self._merge(self._retired, shard)
+        self._shards = live
+
+    def _snapshots(self):
+        with self._shards_lock:
+            self._prune()
+            shards = [shard for _, shard in self._shards]
+            retired = self._merge({}, self._retired)
+        # dict() copies in one C call, so it is safe against concurrent updates
+        return [retired] + [dict(shard) for shard in shards]
+
+    def _merge(self, into, shard):
+        """Add the values of shard into the dict into and return it."""
+        raise NotImplementedError
+
+
+class Counter(_Sharded):
+    """Monotonic counter, optionally labelled."""
+
+    type = 'counter'
+
+    def inc(self, labels=(), amount=1):
+        shard = self._shard()
+        shard[labels] = shard.get(labels, 0) + amount
+
+    def _merge(self, into, shard):
+        for labels, value in shard.items():
+            into[labels] = into.get(labels, 0) + value
+        return into
+
+    def collect(self):
+        totals = {}
+        for shard in self._snapshots():
+            self._merge(totals, shard)
+        return totals
+
+    def render(self):
+        lines = []
+        for labels, value in sorted(self.collect().items()):
+            lines.append(f'{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}')
+        return lines
+
+
+class Histogram(_Sharded):
+    """Cumulative-bucket histogram, optionally labelled."""
+
+    type = 'histogram'
+
+    def __init__(self, name, help_text, buckets=LATENCY_BUCKETS, labelnames=()):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, labels=()):
+        shard = self._shard()
+        state = shard.get(labels)
+        if state is None:
+            # [per-bucket counts (+Inf last), sum, count]
+            state = shard[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        state[0][bisect_left(self.buckets, value)] += 1
+        state[1] += value
+        state[2] += 1
+
+    @contextmanager
+    def time(self, labels=()):
+        """Observe the wall time of the with-block."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, labels)
+
+    def _merge(self, into, shard):
+        for labels, (counts, total, count) in list(shard.items()):
+            entry = into.setdefault(labels, [[0] * (len(self.buckets) + 1), 0.0, 0])
+            for i, c in enumerate(list(counts)):
+                entry[0][i] += c
+            entry[1] += total
+            entry[2] += count
+        return into
+
+    def collect(self):
+        merged = {}
+        for shard in self._snapshots():
+            self._merge(merged, shard)
+        return merged
+
+    def render(self):
+        lines = []
+        for labels, (counts, total, count) in sorted(self.collect().items()):
+            cumulative = 0
+            for bound, c in zip(self.buckets + (float('inf'),), counts):
+                cumulative += c
+                le = f'le="{_format_value(float(bound))}"'
+                lines.append(f'{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}')
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f'{self.name}_sum{label_text} {_format_value(total)}')
+            lines.append(f'{self.name}_count{label_text} {count}')
+        return lines
+
+
+class CallbackMetric:
+    """Gauge or counter whose value is read from a callable at scrape time."""
+
+    def __init__(self, name, help_text, callback, metric_type='gauge'):
+        self.name = name
+        self.help = help_text
+        self.callback = callback
+        self.type = metric_type
+
+    def render(self):
+        return [f'{self.name} {_format_value(self.callback())}']
+
+
+class Registry:
+    """Collection of metrics rendered together in text exposition format."""
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, labelnames=()):
+        return self.register(Counter(name, help_text, labelnames))
+
+    def histogram(self, name, help_text, buckets=LATENCY_BUCKETS, labelnames=()):
+        return self.register(Histogram(name, help_text, buckets, labelnames))
+
+    def gauge(self, name, help_text, callback):
+        return self.register(CallbackMetric(name, help_text, callback, 'gauge'))
+
+    def callback_counter(self, name, help_text, callback):
+        return self.register(CallbackMetric(name, help_text, callback, 'counter'))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.type}')
+            try:
+                lines.extend(metric.render())
+            except Exception:
+                # A broken callback must not take down the whole scrape
+                continue
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,313 @@
+"""
+Smart Home Cybersecurity Training Platform - Database Migrations
+Versioned schema migrations for the logs database, tracked with SQLite's
+PRAGMA user_version so they also apply to databases created by older
+versions of the backend.
+"""
+
+import logging
+import sqlite3
+from datetime import datetime
+
+from payload_store import StoredPayload, resolve_payload_ids, split_legacy_message
+
+logger = logging.getLogger(__name__)
+
+# Rows converted per UPDATE batch when backfilling existing data
+BACKFILL_BATCH_SIZE = 10000
+
+
+def apply_pragmas(conn):
+    """
+    Per-connection tuning.
+    WAL lets API readers run while the log writer commits; NORMAL
+    synchronous mode is crash-safe under WAL and avoids an fsync per commit.
+    """
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute('PRAGMA busy_timeout=5000')
+    return conn
+
+
+def connect(database):
+    """Open a connection with the standard pragmas applied."""
+    return apply_pragmas(sqlite3.connect(database))
+
+
+def to_epoch_ms(timestamp):
+    """Convert an ISO timestamp string (as written by log_event) to epoch ms."""
+    return int(datetime.fromisoformat(timestamp).timestamp() * 1000)
+
+# ==================== MIGRATIONS ====================
+
+def _create_logs_table(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS logs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TEXT NOT NULL,
+            message TEXT NOT NULL,
+            log_type TEXT NOT NULL,
+            source TEXT,
+            device TEXT,
+            user TEXT,
+            severity TEXT
+        )
+    ''')
+
+
+def _add_integer_timestamps(conn):
+    """Add ts (epoch milliseconds) and backfill it from the ISO timestamp."""
+    columns = [row[1] for row in conn.execute('PRAGMA table_info(logs)')]
+    if 'ts' not in columns:
+        conn.execute('ALTER TABLE logs ADD COLUMN ts INTEGER')
+
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            'SELECT id, timestamp FROM logs WHERE id > ? AND ts IS NULL ORDER BY id LIMIT ?',
+            (last_id, BACKFILL_BATCH_SIZE)
+        ).fetchall()
+        if not rows:
+            break
+
+        updates = []
+        for row_id, timestamp in rows:
+            try:
+                updates.append((to_epoch_ms(timestamp), row_id))
+            except (TypeError, ValueError):
+                updates.append((0, row_id))
+        conn.executemany('UPDATE logs SET ts = ? WHERE id = ?', updates)
+        last_id = rows[-1][0]
+
+
+def _add_query_indexes(conn):
+    """Composite indexes matching the /api/logs filter + ORDER BY shapes."""
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_logs_ts ON logs (ts)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_logs_type_ts ON logs (log_type, ts)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_logs_device_ts ON logs (device, ts)')
+
+
+def _create_device_shadows_table(conn):
+    """Snapshot table for the in-memory device shadow store."""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS device_shadows (
+            name TEXT PRIMARY KEY,
+            type TEXT,
+            state TEXT,
+            last_seen REAL,
+            message_count INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+
+
+def _create_rollup_table(conn):
+    """Per-device, per-minute aggregates of expired DEVICE_UPDATE rows."""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS device_update_rollups (
+            device TEXT NOT NULL,
+            minute INTEGER NOT NULL,
+            message_count INTEGER NOT NULL,
+            first_ts INTEGER NOT NULL,
+            last_ts INTEGER NOT NULL,
+            last_message TEXT,
+            PRIMARY KEY (device, minute)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_rollups_minute ON device_update_rollups (minute)')
+
+
+def _create_sessions_table(conn):
+    """Server-side login sessions (see session_store.SessionStore)."""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS sessions (
+            sid TEXT PRIMARY KEY,
+            data TEXT NOT NULL,
+            expires REAL NOT NULL
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_sessions_expires ON sessions (expires)')
+
+
+def _create_search_triggers(conn):
+    """Keep logs_fts in step with every insert, update and delete on logs."""
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS logs_fts_insert AFTER INSERT ON logs BEGIN
+            INSERT INTO logs_fts (rowid, message, source, user)
+            VALUES (new.id, new.message, new.source, new.user);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS logs_fts_delete AFTER DELETE ON logs BEGIN
+            INSERT INTO logs_fts (logs_fts, rowid, message, source, user)
+            VALUES ('delete', old.id, old.message, old.source, old.user);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS logs_fts_update AFTER UPDATE OF message, source, user ON logs BEGIN
+            INSERT INTO logs_fts (logs_fts, rowid, message, source, user)
+            VALUES ('delete', old.id, old.message, old.source, old.user);
+            INSERT INTO logs_fts (rowid, message, source, user)
+            VALUES (new.id, new.message, new.source, new.user);
+        END
+    ''')
+
+
+def _create_search_index(conn):
+    """
+    FTS5 index over logs.message, source and user for /api/logs/search.
+    External content: the text lives only in logs, the index only holds
+    tokens. '_' is a token character so identifiers such as
+    unauthorized_attacker stay one token; prefix indexes make short
+    prefix queries index lookups.
+    """
+    conn.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS logs_fts USING fts5 (
+            message, source, user,
+            content='logs',
+            content_rowid='id',
+            tokenize="unicode61 tokenchars '_'",
+            prefix='2 3'
+        )
+    ''')
+    conn.execute("INSERT INTO logs_fts (logs_fts) VALUES ('rebuild')")
+    _create_search_triggers(conn)
+
+
+def _add_payload_reference(conn):
+    """logs.payload_id and its index (also used when recreating logs)."""
+    columns = [row[1] for row in conn.execute('PRAGMA table_info(logs)')]
+    if 'payload_id' not in columns:
+        conn.execute('ALTER TABLE logs ADD COLUMN payload_id INTEGER REFERENCES payloads (id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_logs_payload ON logs (payload_id)')
+
+
+def _create_payloads_table(conn):
+    """
+    Deduplicated payload storage (see payload_store). Existing rows that
+    embed their payload in the message are split: the message keeps the
+    text before it and the payload moves to payloads.
+    """
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS payloads (
+            id INTEGER PRIMARY KEY,
+            hash BLOB NOT NULL UNIQUE,
+            size INTEGER NOT NULL,
+            encoding INTEGER NOT NULL,
+            body BLOB NOT NULL,
+            is_object INTEGER NOT NULL,
+            action TEXT,
+            user TEXT,
+            client_id TEXT,
+            value REAL,
+            flags INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_payloads_action ON payloads (action)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_payloads_user ON payloads (user)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_payloads_client ON payloads (client_id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_payloads_flags ON payloads (flags) WHERE flags != 0')
+    _add_payload_reference(conn)
+
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            "SELECT id, message FROM logs WHERE id > ? AND payload_id IS NULL "
+            "AND (message LIKE 'Device update: % - %' OR message LIKE 'ATTACK DETECTED: %, Payload: %') "
+            "ORDER BY id LIMIT ?",
+            (last_id, BACKFILL_BATCH_SIZE)
+        ).fetchall()
+        if not rows:
+            break
+
+        updates = []
+        for row_id, message in rows:
+            split = split_legacy_message(message)
+            if split is not None:
+                updates.append((split[0], row_id, StoredPayload.from_raw(split[1])))
+        conn.executemany(
+            'UPDATE logs SET message = ?, payload_id = ? WHERE id = ?',
+            [(message, payload_id, row_id) for message, row_id, payload_id
+             in resolve_payload_ids(conn, updates)]
+        )
+        last_id = rows[-1][0]
+
+
+# (version, description, function) - append only, never reorder
+MIGRATIONS = [
+    (1, 'create logs table', _create_logs_table),
+    (2, 'add integer ts column', _add_integer_timestamps),
+    (3, 'add query indexes', _add_query_indexes),
+    (4, 'create device_shadows table', _create_device_shadows_table),
+    (5, 'create device_update_rollups table', _create_rollup_table),
+    (6, 'create sessions table', _create_sessions_table),
+    (7, 'create logs full-text search index', _create_search_index),
+    (8, 'create deduplicated payloads table', _create_payloads_table),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def recreate_logs_table(conn):
+    """
+    Drop and recreate the logs table with its current schema and indexes.
+    Avoids the per-row index and trigger work of DELETE FROM logs (about
+    6-10x faster on 50k-800k rows), though freeing the pages is still
+    linear in the table size. The AUTOINCREMENT
+    sequence is carried over so ids (and keyset cursors) keep increasing.
+    The search index and payloads table are emptied and the search
+    triggers (dropped with the table) recreated. Must run inside a write
+    transaction.
+    """
+    version = get_version(conn)
+    row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'logs'").fetchone()
+    conn.execute('DROP TABLE logs')
+    _create_logs_table(conn)
+    _add_integer_timestamps(conn)
+    _add_query_indexes(conn)
+    if version >= 7:
+        conn.execute("INSERT INTO logs_fts (logs_fts) VALUES ('delete-all')")
+        _create_search_triggers(conn)
+    if version >= 8:
+        _add_payload_reference(conn)
+        conn.execute('DELETE FROM payloads')
+    if row is not None:
+        conn.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('logs', ?)", (row[0],))
+
+
+def get_version(conn):
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def migrate(database):
+    """
+    Bring the database schema up to SCHEMA_VERSION.
+    Each migration runs in its own transaction together with the
+    user_version bump, so a failed migration leaves the previous version.
+    Returns:
+        The schema version after migrating
+    """
+    conn = sqlite3.connect(database, isolation_level=None)
+    try:
+        # journal_mode is persistent, so setting it once here is enough
+        conn.execute('PRAGMA journal_mode=WAL')
+        apply_pragmas(conn)
+
+        version = get_version(conn)
+        for target, description, migration in MIGRATIONS:
+            if target <= version:
+                continue
+            logger.info(f"Applying database migration {target}: {description}")
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                migration(conn)
+                conn.execute(f'PRAGMA user_version = {int(target)}')
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+            version = target
+
+        # Refresh planner statistics only where SQLite thinks they are stale
+        conn.execute('PRAGMA optimize')
+        return version
+    finally:
+        conn.close()
@@ -0,0 +1,51 @@
+"""
+Smart Home Cybersecurity Training Platform - Payload Decoding
+Parses raw MQTT payload bytes without decoding them to str first. Uses
+orjson when it is installed and falls back to the standard json module.
+"""
+
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+JSON_BACKEND = 'orjson' if orjson is not None else 'json'
+
+
+def loads(raw):
+    """
+    Parse a JSON document from bytes, bytearray or memoryview.
+    orjson is stricter than json (e.g. NaN, integers over 64 bits), so
+    documents it rejects are retried with json to keep the same semantics.
+    Payloads must be UTF-8, as orjson requires: json.loads on bytes would
+    also accept UTF-16/32, which the detection pre-scan does not look for.
+    Raises:
+        ValueError: If the payload is not valid UTF-8 JSON
+    """
+    if orjson is not None:
+        try:
+            return orjson.loads(raw)
+        except orjson.JSONDecodeError:
+            pass
+    return json.loads(bytes(raw).decode('utf-8'))
+
+
+def parse_payload(raw):
+    """
+    Turn a raw MQTT payload into the dict used by detection.
+    JSON objects are parsed; anything else becomes {'value': text}.
+    Args:
+        raw: Payload bytes (or memoryview) as received from the broker
+    Returns:
+        (data, is_object) where is_object is True for JSON object payloads
+    Raises:
+        ValueError: If the payload looks like a JSON object but is not valid
+    """
+    if raw[:1] == b'{':
+        return loads(raw), True
+    return {'value': bytes(raw).decode()}, False
@@ -0,0 +1,286 @@
+"""
+Smart Home Cybersecurity Training Platform - Payload Store
+MQTT payloads are stored once per distinct content in the payloads table,
+keyed by a hash of the raw bytes, and log rows reference them by id
+instead of repeating the payload inside their message. The fields
+detection cares about (action, user, client_id, numeric value and the
+attack flags) are parsed into typed, indexed columns; the raw bytes are
+kept as a BLOB, zlib-compressed against a preset dictionary when that is
+smaller.
+"""
+
+import hashlib
+import re
+import zlib
+
+from payload_codec import parse_payload
+
+# Body encodings (stored in payloads.encoding)
+ENCODING_RAW = 0
+ENCODING_ZLIB = 1
+
+# Payloads shorter than this are stored raw; compression cannot win much
+COMPRESS_MIN_SIZE = 32
+
+# Preset dictionary for ENCODING_ZLIB: substrings common in device
+# payloads, most frequent last. Never change it - stored bodies depend on it.
+ZLIB_DICTIONARY = (
+    b'"temperature": "type": "sensor", "thermostat", "lock", "light", '
+    b'"value": "timestamp": "client_id": "rapid_fire": "bypass_auth": true, '
+    b'"attack": true, "unlocked"}"locked"}"off"}"on"}, "user": "user1"}'
+    b'{"action": "'
+)
+
+# Payload keys recorded as bits in payloads.flags when truthy.
+# Append only: the bit of a flag is its position.
+FLAGS = ('attack', 'bypass_auth', 'rapid_fire')
+FLAG_BITS = {name: 1 << index for index, name in enumerate(FLAGS)}
+
+INSERT_PAYLOAD_SQL = '''
+    INSERT OR IGNORE INTO payloads
+        (hash, size, encoding, body, is_object, action, user, client_id, value, flags)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+SELECT_PAYLOAD_ID_SQL = 'SELECT id FROM payloads WHERE hash = ?'
+
+# Messages written before payloads were split out (schema version < 8)
+_LEGACY_MESSAGE = re.compile(r'(Device update: .*?) - (.*)|(ATTACK DETECTED: .*?), Payload: (.*)', re.DOTALL)
+
+
+def _in_list(ids):
+    """
+    Placeholders and params for 'IN (...)' over ids, padded (by repeating
+    the last id) to a power-of-two length so the SQL text repeats and hits
+    the connection's prepared-statement cache.
+    """
+    size = 1 << (len(ids) - 1).bit_length()
+    params = list(ids) + [ids[-1]] * (size - len(ids))
+    return ', '.join('?' * size), params
+
+
+def payload_hash(raw):
+    """128-bit BLAKE2b digest of the raw payload bytes."""
+    return hashlib.blake2b(raw, digest_size=16).digest()
+
+
+def encode_body(raw):
+    """
+    Compact stored form of a payload.
+    Returns:
+        (encoding, body)
+    """
+    if len(raw) >= COMPRESS_MIN_SIZE:
+        compressor = zlib.compressobj(9, zlib.DEFLATED, -15, zdict=ZLIB_DICTIONARY)
+        body = compressor.compress(raw) + compressor.flush()
+        if len(body) < len(raw):
+            return ENCODING_ZLIB, body
+    return ENCODING_RAW, raw
+
+
+def decode_body(encoding, body):
+    """Raw payload bytes from a stored (encoding, body) pair."""
+    if encoding == ENCODING_ZLIB:
+        decompressor = zlib.decompressobj(-15, zdict=ZLIB_DICTIONARY)
+        return decompressor.decompress(body) + decompressor.flush()
+    return bytes(body)
+
+
+def _text(value):
+    return value if isinstance(value, str) else None
+
+
+def _number(value):
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            return float(value)
+        except ValueError:
+            return None
+    return None
+
+
+class StoredPayload:
+    """
+    A payload on its way to the payloads table: the raw bytes, their hash
+    and the parsed fields. Built on the detection worker; the log sink
+    writer encodes and inserts it only if the hash is new.
+    """
+
+    __slots__ = ('raw', 'hash', 'is_object', 'action', 'user', 'client_id', 'value', 'flags')
+
+    def __init__(self, raw, data=None, is_object=False):
+        """
+        Args:
+            raw: Payload bytes (or memoryview) as received from the broker
+            data, is_object: As returned by payload_codec.parse_payload
+        """
+        self.raw = bytes(raw)
+        self.hash = payload_hash(self.raw)
+        self.is_object = is_object
+        data = data if isinstance(data, dict) else {}
+        self.action = _text(data.get('action'))
+        self.user = _text(data.get('user'))
+        self.client_id = _text(data.get('client_id'))
+        self.value = _number(data.get('value'))
+        self.flags = 0
+        for name, bit in FLAG_BITS.items():
+            if data.get(name):
+                self.flags |= bit
+
+    @classmethod
+    def from_raw(cls, raw):
+        """Build from raw bytes alone, parsing them the way ingest does."""
+        try:
+            data, is_object = parse_payload(raw)
+        except ValueError:
+            data, is_object = None, False
+        return cls(raw, data, is_object)
+
+    def row(self):
+        """Parameters for INSERT_PAYLOAD_SQL."""
+        encoding, body = encode_body(self.raw)
+        return (self.hash, len(self.raw), encoding, body, int(self.is_object),
+                self.action, self.user, self.client_id, self.value, self.flags)
+
+
+def resolve_payload_ids(conn, rows):
+    """
+    Replace the StoredPayload at the end of each log row with its payloads
+    id, inserting payloads not stored yet. Each distinct payload costs one
+    indexed lookup per call, however often it repeats in rows. Run inside
+    the write transaction that inserts the rows, so a concurrent prune
+    cannot remove a payload between lookup and use.
+    Args:
+        conn: Connection with an open write transaction
+        rows: Log row tuples whose last element is a StoredPayload or None
+    Returns:
+        List of row tuples with the payload id (or None) as last element
+    """
+    ids = {}
+    resolved = []
+    for row in rows:
+        payload = row[-1]
+        if payload is None:
+            resolved.append(row)
+            continue
+        payload_id = ids.get(payload.hash)
+        if payload_id is None:
+            found = conn.execute(SELECT_PAYLOAD_ID_SQL, (payload.hash,)).fetchone()
+            if found is None:
+                conn.execute(INSERT_PAYLOAD_SQL, payload.row())
+                found = conn.execute(SELECT_PAYLOAD_ID_SQL, (payload.hash,)).fetchone()
+            payload_id = ids[payload.hash] = found[0]
+        resolved.append(row[:-1] + (payload_id,))
+    return resolved
+
+
+def prune_payloads(conn, payload_ids):
+    """
+    Delete the given payloads if no log row references them any more.
+    Returns:
+        Number of payloads deleted
+    """
+    ids = sorted({payload_id for payload_id in payload_ids if payload_id is not None})
+    if not ids:
+        return 0
+    placeholders, params = _in_list(ids)
+    cursor = conn.execute(
+        f"DELETE FROM payloads WHERE id IN ({placeholders}) "
+        "AND NOT EXISTS (SELECT 1 FROM logs WHERE logs.payload_id = payloads.id)",
+        params
+    )
+    return cursor.rowcount
+
+
+def payload_query(rows):
+    """
+    Query fetching the payloads referenced by a page of log rows.
+    Returns:
+        (query, params), or None if no row references a payload
+    """
+    ids = sorted({row['payload_id'] for row in rows if row['payload_id'] is not None})
+    if not ids:
+        return None
+    placeholders, params = _in_list(ids)
+    return f"SELECT id, encoding, body FROM payloads WHERE id IN ({placeholders})", params
+
+
+def attach_payloads(rows, payload_rows):
+    """
+    Log rows as dicts with a 'payload' key holding the payload text.
+    Args:
+        rows: Log rows (sqlite3.Row or dicts) with a payload_id column
+        payload_rows: Result of payload_query
+    """
+    texts = {
+        payload_id: decode_body(encoding, body).decode(errors='replace')
+        for payload_id, encoding, body in payload_rows
+    }
+    logs = []
+    for row in rows:
+        log = dict(row)
+        log['payload'] = texts.get(log.get('payload_id'))
+        logs.append(log)
+    return logs
+
+
+def load_payloads(conn, rows):
+    """attach_payloads for a synchronous connection."""
+    query = payload_query(rows)
+    payload_rows = conn.execute(*query).fetchall() if query else []
+    return attach_payloads(rows, payload_rows)
+
+
+def payload_filter(action=None, user=None, flag=None, client_id=None, column='payload_id'):
+    """
+    SQL condition restricting log rows by parsed payload fields.
+    Uses the payloads indexes, then logs.payload_id.
+    Args:
+        action, user, client_id: Exact payload 'action' / 'user' /
+                                 'client_id' values
+        flag: Name from FLAGS that must be set
+        column: Log column holding the payload id
+    Returns:
+        (' AND ...' clause or '', params)
+    Raises:
+        ValueError: If flag is not in FLAGS
+    """
+    conditions = []
+    params = []
+    if action:
+        conditions.append('action = ?')
+        params.append(action)
+    if user:
+        conditions.append('user = ?')
+        params.append(user)
+    if client_id:
+        conditions.append('client_id = ?')
+        params.append(client_id)
+    if flag:
+        if flag not in FLAG_BITS:
+            raise ValueError(f"flag must be one of {', '.join(FLAGS)}")
+        # flags != 0 lets SQLite use the partial index on flagged payloads
+        conditions.append('flags != 0 AND flags & ? != 0')
+        params.append(FLAG_BITS[flag])
+    if not conditions:
+        return '', []
+    return f" AND {column} IN (SELECT id FROM payloads WHERE {' AND '.join(conditions)})", params
+
+
+def split_legacy_message(message):
+    """
+    Split a message that embeds its payload (as written before schema
+    version 8) into the message without it and the payload bytes.
+    Returns:
+        (message, raw) or None if message does not embed a payload
+    """
+    match = _LEGACY_MESSAGE.fullmatch(message or '')
+    if match is None:
+        return None
+    if match.group(1) is not None:
+        return match.group(1), match.group(2).encode()
+    return match.group(3), match.group(4).encode()
@@ -0,0 +1,179 @@
+"""
+Smart Home Cybersecurity Training Platform - MQTT Ingestion Pipeline
+Decouples the paho network thread from attack detection. The MQTT callback
+only enqueues raw (topic, payload, receive_ts) tuples; a pool of detection
+workers consumes them, with each device pinned to one worker so messages
+from the same device are processed in order.
+"""
+
+import logging
+import queue
+import threading
+import time
+import zlib
+
+logger = logging.getLogger(__name__)
+
+# Sentinel placed on a worker queue to stop it
+_STOP = object()
+
+
+class StageStats:
+    """Thread-safe latency counters for one pipeline stage."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.last = 0.0
+
+    def record(self, seconds):
+        with self._lock:
+            self.count += 1
+            self.total += seconds
+            self.last = seconds
+            if seconds > self.max:
+                self.max = seconds
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'count': self.count,
+                'avg_ms': round(self.total / self.count * 1000, 3) if self.count else 0.0,
+                'max_ms': round(self.max * 1000, 3),
+                'last_ms': round(self.last * 1000, 3)
+            }
+
+
+def device_from_topic(topic):
+    """Extract device name from topic (e.g., /devices/light1 -> light1)."""
+    return topic.rsplit('/', 1)[-1]
+
+
+class IngestPipeline:
+    """
+    Staged ingestion pipeline: enqueue -> queue wait -> detection.
+    Each worker owns its own bounded queue; messages are routed by a stable
+    hash of the device name so per-device ordering is preserved.
+    """
+
+    def __init__(self, handler, workers=4, queue_size=10000, put_timeout=0.005):
+        """
+        Args:
+            handler: Callable(topic, payload, receive_ts) run on a worker thread
+            workers: Number of detection worker threads
+            queue_size: Capacity of each worker queue
+            put_timeout: Seconds submit() blocks on a full queue before dropping
+        """
+        self.handler = handler
+        self.num_workers = max(1, workers)
+        self.put_timeout = put_timeout
+
+        self._queues = [queue.Queue(maxsize=queue_size) for _ in range(self.num_workers)]
+        self._threads = []
+        self._lock = threading.Lock()
+
+        self.received = 0
+        self.dropped = 0
+        self.errors = 0
+
+        # Per-stage latency
+        self.stages = {
+            'enqueue': StageStats(),
+            'queue_wait': StageStats(),
+            'detect': StageStats()
+        }
+
+    def _queue_for(self, topic):
+        index = zlib.crc32(device_from_topic(topic).encode()) % self.num_workers
+        return self._queues[index]
+
+    # ==================== PRODUCER SIDE ====================
+
+    def submit(self, topic, payload, receive_ts=None):
+        """
+        Enqueue a raw MQTT message for detection.
+        Called from the paho network thread, so it does no parsing.
+        Returns:
+            True if queued, False if dropped because the worker queue was full
+        """
+        start = time.perf_counter()
+        if receive_ts is None:
+            receive_ts = time.time()
+
+        try:
+            self._queue_for(topic).put((topic, payload, receive_ts), timeout=self.put_timeout)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            return False
+
+        with self._lock:
+            self.received += 1
+        self.stages['enqueue'].record(time.perf_counter() - start)
+        return True
+
+    # ==================== LIFECYCLE ====================
+
+    def start(self):
+        """Start the detection worker threads (no-op if already running)."""
+        if self._threads:
+            return
+
+        for index, work_queue in enumerate(self._queues):
+            thread = threading.Thread(
+                target=self._run,
+                args=(work_queue,),
+                name=f'detect-worker-{index}',
+                daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+        logger.info(f"Ingest pipeline started with {self.num_workers} detection workers")
+
+    def stop(self, timeout=5.0):
+        """Process everything already queued, then stop the workers."""
+        if not self._threads:
+            return
+
+        for work_queue in self._queues:
+            work_queue.put(_STOP)
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+        logger.info("Ingest pipeline stopped")
+
+    def stats(self):
+        """Return per-stage queue depth and latency."""
+        with self._lock:
+            counters = {
+                'received': self.received,
+                'dropped': self.dropped,
+                'errors': self.errors
+            }
+        counters['workers'] = self.num_workers
+        counters['queue_depths'] = [q.qsize() for q in self._queues]
+        counters['queue_depth'] = sum(counters['queue_depths'])
+        counters['stages'] = {name: stage.snapshot() for name, stage in self.stages.items()}
+        return counters
+
+    # ==================== WORKER THREADS ====================
+
+    def _run(self, work_queue):
+        while True:
+            item = work_queue.get()
+            if item is _STOP:
+                return
+
+            topic, payload, receive_ts = item
+            self.stages['queue_wait'].record(max(0.0, time.time() - receive_ts))
+
+            start = time.perf_counter()
+            try:
+                self.handler(topic, payload, receive_ts)
+            except Exception as e:
+                with self._lock:
+                    self.errors += 1
+                logger.error(f"Error in detection worker for {topic}: {e}")
+            self.stages['detect'].record(time.perf_counter() - start)
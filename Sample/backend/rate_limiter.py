@@ -0,0 +1,536 @@
+"""
+Smart Home Cybersecurity Training Platform - Rate-based DoS Detection
+Per-key token buckets (one fixed-size state object per device or client)
+kept in an LRU map, so memory stays bounded with thousands of keys.
+A flood raises one event when the burst starts and one when it ends,
+instead of one per message. SharedRateDetector keeps the same state in
+shared memory for the multi-process scale-out mode.
+"""
+
+import hashlib
+import logging
+import multiprocessing
+import threading
+import time
+from collections import Counter, OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class _Bucket:
+    """Token bucket and burst state for one key."""
+
+    __slots__ = ('tokens', 'last', 'burst_start', 'last_limited', 'burst_count', 'reasons')
+
+    def __init__(self, capacity, now):
+        self.tokens = capacity
+        self.last = now
+        self.burst_start = None
+        self.last_limited = 0.0
+        self.burst_count = 0
+        self.reasons = None
+
+
+class BurstEvent:
+    """Start or end of a rate-limit burst for one key."""
+
+    __slots__ = ('kind', 'key', 'started', 'ended', 'count', 'reasons')
+
+    def __init__(self, kind, key, started, ended=None, count=0, reasons=None):
+        self.kind = kind            # 'start', 'end' or 'matches' (see SharedRateDetector)
+        self.key = key
+        self.started = started
+        self.ended = ended
+        self.count = count          # Messages over the limit during the burst
+        self.reasons = reasons or {}  # Reason -> over-limit messages that had it
+
+    @property
+    def duration(self):
+        return (self.ended or self.started) - self.started
+
+
+class RateDetector:
+    """
+    Token-bucket rate detector for one kind of key (device or client).
+    Each key refills at `rate` tokens per second up to `burst` tokens; a
+    message that finds the bucket empty is over the limit. A burst ends once
+    the key has gone `quiet_period` seconds without exceeding the limit.
+    """
+
+    def __init__(self, name, rate=5.0, burst=20, quiet_period=5.0,
+                 max_keys=10000, idle_ttl=300.0):
+        """
+        Args:
+            name: Label for this detector (e.g., 'device', 'client')
+            rate: Sustained messages per second allowed per key
+            burst: Bucket capacity (messages allowed in a short spike)
+            quiet_period: Seconds under the limit before a burst is over
+            max_keys: Maximum keys tracked; least recently seen are evicted
+            idle_ttl: Seconds after which an idle key is evicted
+        """
+        self.name = name
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.quiet_period = quiet_period
+        self.max_keys = max_keys
+        self.idle_ttl = idle_ttl
+
+        self._buckets = OrderedDict()
+        self._bursting = set()
+        self._lock = threading.Lock()
+        self._last_reap = 0.0
+
+        self.hits = 0
+        self.limited = 0
+        self.bursts = 0
+        self.evicted = 0
+
+    def hit(self, key, now, reason=None):
+        """
+        Record one message for key.
+        Args:
+            key: Device name or client id
+            now: Message receive time (epoch seconds)
+            reason: Why the message is notable (e.g. the detection rule it
+                    matched); if the message is limited, counted in the
+                    burst's end event instead of reported on its own
+        Returns:
+            (limited, events) - whether this message is over the limit or
+            arrived while its key's burst is still open (either way it is
+            part of the flood), and any BurstEvents raised (for this key or
+            for bursts that ended)
+        """
+        events = []
+        with self._lock:
+            self.hits += 1
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = _Bucket(self.burst, now)
+                self._buckets[key] = bucket
+                if len(self._buckets) > self.max_keys:
+                    self._evict_oldest(events)
+            else:
+                self._buckets.move_to_end(key)
+                elapsed = now - bucket.last
+                if elapsed > 0:
+                    bucket.tokens = min(self.burst, bucket.tokens + elapsed * self.rate)
+                    bucket.last = now
+
+            # Burst already over? Report it before possibly starting a new one
+            if bucket.burst_start is not None and now - bucket.last_limited >= self.quiet_period:
+                events.append(self._end_burst(key, bucket))
+
+            if bucket.tokens >= 1.0:
+                bucket.tokens -= 1.0
+                limited = False
+            else:
+                limited = True
+                self.limited += 1
+                bucket.last_limited = now
+                bucket.burst_count += 1
+                if bucket.burst_start is None:
+                    bucket.burst_start = now
+                    self._bursting.add(key)
+                    self.bursts += 1
+                    events.append(BurstEvent('start', key, now))
+
+            # Refilled tokens let a few messages through mid-burst; they
+            # still belong to the flood
+            limited = limited or bucket.burst_start is not None
+            if limited and reason is not None:
+                if bucket.reasons is None:
+                    bucket.reasons = Counter()
+                bucket.reasons[reason] += 1
+
+            if now - self._last_reap >= self.quiet_period:
+                self._reap(now, events)
+
+        return limited, events
+
+    def reap(self, now):
+        """End bursts that have gone quiet and evict idle keys."""
+        events = []
+        with self._lock:
+            self._reap(now, events)
+        return events
+
+    def stats(self):
+        with self._lock:
+            return {
+                'rate': self.rate,
+                'burst': self.burst,
+                'keys': len(self._buckets),
+                'max_keys': self.max_keys,
+                'active_bursts': sorted(self._bursting),
+                'hits': self.hits,
+                'limited': self.limited,
+                'bursts': self.bursts,
+                'evicted': self.evicted
+            }
+
+    # ==================== INTERNALS (lock held) ====================
+
+    def _end_burst(self, key, bucket):
+        event = BurstEvent('end', key, bucket.burst_start, bucket.last_limited, bucket.burst_count,
+                           bucket.reasons)
+        bucket.burst_start = None
+        bucket.burst_count = 0
+        bucket.reasons = None
+        self._bursting.discard(key)
+        return event
+
+    def _evict_oldest(self, events):
+        key, bucket = self._buckets.popitem(last=False)
+        self.evicted += 1
+        if bucket.burst_start is not None:
+            events.append(self._end_burst(key, bucket))
+
+    def _reap(self, now, events):
+        self._last_reap = now
+
+        for key in list(self._bursting):
+            bucket = self._buckets[key]
+            if now - bucket.last_limited >= self.quiet_period:
+                events.append(self._end_burst(key, bucket))
+
+        # Oldest keys are at the front of the LRU; stop at the first active one
+        while self._buckets:
+            key, bucket = next(iter(self._buckets.items()))
+            if now - bucket.last < self.idle_ttl:
+                break
+            self._evict_oldest(events)
+
+
+class RateReaper:
+    """
+    Calls reap() on rate detectors on a background thread. hit() only
+    reaps when a message arrives, so without this a flood that stops
+    outright would never get its end event and idle keys would stay.
+    """
+
+    def __init__(self, detectors, on_event=None):
+        """
+        Args:
+            detectors: Callable returning the detectors to reap; called on
+                       every pass, so detectors swapped in later are used
+            on_event: Called as on_event(detector, event) per BurstEvent
+        """
+        self.detectors = detectors
+        self.on_event = on_event
+        self._stop = threading.Event()
+        self._thread = None
+
+        self.passes = 0
+        self.events = 0
+        self.errors = 0
+
+    def reap(self, now=None):
+        """Reap every detector once. Returns the number of events raised."""
+        now = time.time() if now is None else now
+        count = 0
+        for detector in self.detectors():
+            for event in detector.reap(now):
+                count += 1
+                if self.on_event is not None:
+                    self.on_event(detector, event)
+        self.passes += 1
+        self.events += count
+        return count
+
+    def start(self, interval=1.0):
+        """Reap every interval seconds on a background thread."""
+        if self._thread is not None:
+            return
+        self._stop.clear()
+
+        def run():
+            while not self._stop.wait(interval):
+                try:
+                    self.reap()
+                except Exception as e:
+                    self.errors += 1
+                    logger.error(f"Error reaping rate detectors: {e}")
+
+        self._thread = threading.Thread(target=run, name='rate-reaper', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5.0):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join(timeout)
+            self._thread = None
+
+    def stats(self):
+        return {
+            'running': self._thread is not None and self._thread.is_alive(),
+            'passes': self.passes,
+            'events': self.events,
+            'errors': self.errors
+        }
+
+
+# ==================== CROSS-PROCESS DETECTOR ====================
+
+def stable_key_hash(key):
+    """
+    48-bit hash of a key that is the same in every process (unlike hash(),
+    which is salted per interpreter) and exact when stored as a double.
+    Never 0, which marks an empty slot.
+    """
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=6).digest(), 'big') or 1
+
+
+class SharedRateDetector:
+    """
+    RateDetector whose buckets live in shared memory, so worker processes
+    that receive messages for the same key (e.g. via an MQTT shared
+    subscription) see one token bucket per key.
+
+    The table is split into blocks of BLOCK_SLOTS slots; a key always lives
+    in the block chosen by its hash, and each block is guarded by one of a
+    fixed set of striped cross-process locks. When a block is full, the
+    least recently seen key in it with no open burst is evicted; only if
+    every key in the block is bursting is a burst ended early to make room.
+
+    Burst start/end transitions happen under the block lock, so exactly one
+    process reports each event. Key names are not stored in shared memory;
+    each process remembers the names of keys it has seen limited, which is
+    enough to name the end of any burst it took part in. Reason counts are
+    kept per process too: the process that ends a burst reports its own
+    counts with the 'end' event, and any other process that counted
+    reasons for it reports them once in a 'matches' event.
+    """
+
+    BLOCK_SLOTS = 16
+    FIELDS = 6
+    HASH, TOKENS, LAST, BURST_START, LAST_LIMITED, BURST_COUNT = range(FIELDS)
+    MAX_LOCKS = 64
+    # Shared counters: hits, limited, bursts, evicted
+    COUNTERS = 4
+
+    def __init__(self, name, rate=5.0, burst=20, quiet_period=5.0,
+                 max_keys=10000, idle_ttl=300.0, context=None):
+        """
+        Args:
+            name: Label for this detector (e.g., 'device', 'client')
+            rate: Sustained messages per second allowed per key
+            burst: Bucket capacity (messages allowed in a short spike)
+            quiet_period: Seconds under the limit before a burst is over
+            max_keys: Keys the table is sized for (twice as many slots)
+            idle_ttl: Seconds after which an idle key's slot may be reused
+            context: multiprocessing context the shared memory and locks
+                     are created from (must match the one starting workers)
+        """
+        context = context or multiprocessing.get_context()
+        blocks = 1
+        while blocks * self.BLOCK_SLOTS < max_keys * 2:
+            blocks *= 2
+
+        self.name = name
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.quiet_period = quiet_period
+        self.max_keys = max_keys
+        self.idle_ttl = idle_ttl
+        self.blocks = blocks
+
+        self._table = context.RawArray('d', blocks * self.BLOCK_SLOTS * self.FIELDS)
+        self._counters = context.RawArray('d', self.COUNTERS)
+        self._locks = [context.Lock() for _ in range(min(blocks, self.MAX_LOCKS))]
+        self._counters_lock = context.Lock()
+        self._init_local()
+
+    def _init_local(self):
+        # Per-process state, rebuilt after the detector is sent to a worker
+        self._cells = memoryview(self._table).cast('B').cast('d')
+        self._bursting = {}
+        self._hashes = {}
+        # key hash -> (first over-limit time, Counter of reasons) in this process
+        self._reasons = {}
+        self._local_lock = threading.Lock()
+        self._last_reap = 0.0
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for attr in ('_cells', '_bursting', '_hashes', '_reasons', '_local_lock', '_last_reap'):
+            del state[attr]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._init_local()
+
+    def hit(self, key, now, reason=None):
+        """
+        Record one message for key.
+        Args:
+            key: Device name or client id
+            now: Message receive time (epoch seconds)
+            reason: As RateDetector.hit
+        Returns:
+            (limited, events), as RateDetector.hit
+        """
+        key_hash = self._hashes.get(key)
+        if key_hash is None:
+            if len(self._hashes) >= self.max_keys:
+                self._hashes.clear()
+            key_hash = self._hashes[key] = stable_key_hash(key)
+        block = key_hash & (self.blocks - 1)
+        cells = self._cells
+        events = []
+        evicted = bursts = 0
+
+        with self._locks[block % len(self._locks)]:
+            base = self._find_slot(block, key_hash, now)
+            if cells[base + self.HASH] != key_hash:
+                if cells[base + self.HASH] and now - cells[base + self.LAST] < self.idle_ttl:
+                    evicted = 1
+                if cells[base + self.HASH] and cells[base + self.BURST_START]:
+                    # Idle or not, report the burst before its slot is reused
+                    event = self._end_burst(base, self._bursting.get(cells[base + self.HASH]))
+                    if event.key is not None:
+                        events.append(event)
+                cells[base + self.HASH] = key_hash
+                cells[base + self.TOKENS] = self.burst
+                cells[base + self.LAST] = now
+                cells[base + self.BURST_START] = 0.0
+                cells[base + self.LAST_LIMITED] = 0.0
+                cells[base + self.BURST_COUNT] = 0.0
+            else:
+                elapsed = now - cells[base + self.LAST]
+                if elapsed > 0:
+                    cells[base + self.TOKENS] = min(self.burst, cells[base + self.TOKENS] + elapsed * self.rate)
+                    cells[base + self.LAST] = now
+
+            if cells[base + self.BURST_START] and now - cells[base + self.LAST_LIMITED] >= self.quiet_period:
+                events.append(self._end_burst(base, key))
+
+            if cells[base + self.TOKENS] >= 1.0:
+                cells[base + self.TOKENS] -= 1.0
+                limited = False
+            else:
+                limited = True
+                cells[base + self.LAST_LIMITED] = now
+                cells[base + self.BURST_COUNT] += 1
+                if not cells[base + self.BURST_START]:
+                    cells[base + self.BURST_START] = now
+                    bursts = 1
+                    events.append(BurstEvent('start', key, now))
+            over_limit = limited
+            limited = limited or bool(cells[base + self.BURST_START])
+
+        with self._local_lock:
+            if limited:
+                self._bursting[float(key_hash)] = key
+                if reason is not None:
+                    first, reasons = self._reasons.setdefault(float(key_hash), (now, Counter()))
+                    reasons[reason] += 1
+            reap = now - self._last_reap >= self.quiet_period
+            if reap:
+                self._last_reap = now
+        self._count(1, int(over_limit), bursts, evicted)
+
+        if reap:
+            events.extend(self.reap(now))
+        return limited, events
+
+    def reap(self, now):
+        """End bursts this process knows about that have gone quiet."""
+        events = []
+        with self._local_lock:
+            known = list(self._bursting.items())
+        cells = self._cells
+        for key_hash, key in known:
+            block = int(key_hash) & (self.blocks - 1)
+            with self._locks[block % len(self._locks)]:
+                base = self._lookup(block, key_hash)
+                active = base is not None and cells[base + self.BURST_START]
+                if active and now - cells[base + self.LAST_LIMITED] >= self.quiet_period:
+                    events.append(self._end_burst(base, key))
+                    active = False
+            if not active:
+                with self._local_lock:
+                    self._bursting.pop(key_hash, None)
+                    pending = self._reasons.pop(key_hash, None)
+                if pending is not None:
+                    # Ended by another process; report what this one counted
+                    events.append(BurstEvent('matches', key, pending[0], now, 0, pending[1]))
+        return events
+
+    def stats(self):
+        """Counters are shared by all processes; keys and bursts are read from the table."""
+        now = time.time()
+        cells = self._cells
+        keys = active_bursts = 0
+        for base in range(0, len(cells), self.FIELDS):
+            if cells[base + self.HASH] and now - cells[base + self.LAST] < self.idle_ttl:
+                keys += 1
+                if cells[base + self.BURST_START]:
+                    active_bursts += 1
+        hits, limited, bursts, evicted = self._counters
+        return {
+            'rate': self.rate,
+            'burst': self.burst,
+            'shared': True,
+            'keys': keys,
+            'max_keys': self.max_keys,
+            'active_bursts': active_bursts,
+            'hits': int(hits),
+            'limited': int(limited),
+            'bursts': int(bursts),
+            'evicted': int(evicted)
+        }
+
+    # ==================== INTERNALS (block lock held) ====================
+
+    def _lookup(self, block, key_hash):
+        cells = self._cells
+        start = block * self.BLOCK_SLOTS * self.FIELDS
+        for base in range(start, start + self.BLOCK_SLOTS * self.FIELDS, self.FIELDS):
+            slot_hash = cells[base + self.HASH]
+            if slot_hash == key_hash:
+                return base
+            if not slot_hash:
+                return None
+        return None
+
+    def _find_slot(self, block, key_hash, now):
+        """
+        Slot holding key_hash, else the first empty slot, else the LRU one
+        with no open burst (the LRU one overall if every slot is bursting).
+        """
+        cells = self._cells
+        start = block * self.BLOCK_SLOTS * self.FIELDS
+        victim = start
+        closed = None
+        for base in range(start, start + self.BLOCK_SLOTS * self.FIELDS, self.FIELDS):
+            slot_hash = cells[base + self.HASH]
+            if slot_hash == key_hash or not slot_hash:
+                return base
+            if cells[base + self.LAST] < cells[victim + self.LAST]:
+                victim = base
+            if not cells[base + self.BURST_START] and (
+                    closed is None or cells[base + self.LAST] < cells[closed + self.LAST]):
+                closed = base
+        return closed if closed is not None else victim
+
+    def _end_burst(self, base, key):
+        cells = self._cells
+        with self._local_lock:
+            pending = self._reasons.pop(cells[base + self.HASH], None)
+        event = BurstEvent(
+            'end', key, cells[base + self.BURST_START],
+            cells[base + self.LAST_LIMITED], int(cells[base + self.BURST_COUNT]),
+            pending[1] if pending is not None else None
+        )
+        cells[base + self.BURST_START] = 0.0
+        cells[base + self.BURST_COUNT] = 0.0
+        return event
+
+    def _count(self, hits, limited, bursts, evicted):
+        with self._counters_lock:
+            counters = self._counters
+            counters[0] += hits
+            counters[1] += limited
+            counters[2] += bursts
+            counters[3] += evicted
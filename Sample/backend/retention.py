@@ -0,0 +1,292 @@
+"""
+Smart Home Cybersecurity Training Platform - Log Retention
+Background retention manager for the logs table. Storage is tiered:
+raw rows stay in SQLite for a short window, DEVICE_UPDATE traffic is then
+rolled up into per-device, per-minute aggregates, and every expired raw
+row is archived to a gzip-compressed NDJSON file per day before deletion.
+Archived rows carry their payload text; payloads no longer referenced by
+any row are deleted with the rows.
+"""
+
+import gzip
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+from migrations import recreate_logs_table
+from payload_store import load_payloads, prune_payloads
+
+logger = logging.getLogger(__name__)
+
+MINUTE_MS = 60 * 1000
+
+LOG_COLUMNS = ('id', 'timestamp', 'ts', 'message', 'log_type', 'source', 'device', 'user', 'severity',
+               'payload_id')
+
+UPSERT_ROLLUP_SQL = '''
+    INSERT INTO device_update_rollups
+        (device, minute, message_count, first_ts, last_ts, last_message)
+    VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT (device, minute) DO UPDATE SET
+        message_count = message_count + excluded.message_count,
+        first_ts = MIN(first_ts, excluded.first_ts),
+        last_message = CASE WHEN excluded.last_ts >= last_ts
+                            THEN excluded.last_message ELSE last_message END,
+        last_ts = MAX(last_ts, excluded.last_ts)
+'''
+
+
+def rollup_rows(rows):
+    """
+    Aggregate DEVICE_UPDATE rows into per-device, per-minute buckets.
+    last_message is the newest row's message with its payload appended.
+    Args:
+        rows: Dicts with at least ts, device, message and payload
+    Returns:
+        List of (device, minute, message_count, first_ts, last_ts, last_message)
+    """
+    buckets = {}
+    for row in rows:
+        ts = row['ts'] or 0
+        key = (row['device'] or '', ts - ts % MINUTE_MS)
+        bucket = buckets.get(key)
+        message = f"{row['message']} - {row['payload']}" if row.get('payload') is not None else row['message']
+        if bucket is None:
+            buckets[key] = [1, ts, ts, message]
+            continue
+        bucket[0] += 1
+        if ts < bucket[1]:
+            bucket[1] = ts
+        if ts >= bucket[2]:
+            bucket[2] = ts
+            bucket[3] = message
+    return [(device, minute, *bucket) for (device, minute), bucket in buckets.items()]
+
+
+class RetentionManager:
+    """
+    Periodically expires old rows from the logs table.
+    Work is done in small batches, each in its own short transaction with a
+    pause in between, so the log sink's writer never waits long for the lock.
+    """
+
+    def __init__(self, database, connect, raw_retention=3600.0, event_retention=30 * 86400.0,
+                 rollup_retention=90 * 86400.0, archive_dir='archive', batch_size=500,
+                 batch_pause=0.01):
+        """
+        Args:
+            database: Path to the SQLite database file
+            connect: Callable(database) returning a connection; it is
+                     opened once and shared by the retention thread and
+                     clear_logs() (serialized by the batch lock), so it
+                     must allow use from several threads
+            raw_retention: Seconds DEVICE_UPDATE rows are kept raw before rollup
+            event_retention: Seconds ATTACK/DEFENSE (all other) rows are kept
+            rollup_retention: Seconds per-minute rollups are kept
+            archive_dir: Directory for compressed archives (None disables archiving)
+            batch_size: Rows expired per transaction
+            batch_pause: Seconds to sleep between batches
+        """
+        self.database = database
+        self.connect = connect
+        self.raw_retention = raw_retention
+        self.event_retention = event_retention
+        self.rollup_retention = rollup_retention
+        self.archive_dir = archive_dir
+        self.batch_size = batch_size
+        self.batch_pause = batch_pause
+
+        # Held for each batch so clear_logs() never interleaves with one;
+        # also guards every use of the shared connection
+        self._lock = threading.Lock()
+        self._conn = None
+        self._stop = threading.Event()
+        self._thread = None
+
+        self.runs = 0
+        self.rolled_up = 0
+        self.archived = 0
+        self.deleted = 0
+        self.rollups_deleted = 0
+        self.errors = 0
+        self.last_run_ms = 0.0
+
+    # ==================== RETENTION PASS ====================
+
+    def run_once(self, now=None):
+        """
+        Run one retention pass.
+        Args:
+            now: Current time in epoch seconds (defaults to time.time())
+        Returns:
+            Number of raw rows removed from the logs table
+        """
+        now = time.time() if now is None else now
+        now_ms = int(now * 1000)
+        start = time.perf_counter()
+
+        conn = self._connection()
+        removed = self._expire(
+            conn,
+            "log_type = 'DEVICE_UPDATE' AND ts < ?",
+            now_ms - int(self.raw_retention * 1000),
+            rollup=True
+        )
+        removed += self._expire(
+            conn,
+            "log_type != 'DEVICE_UPDATE' AND ts < ?",
+            now_ms - int(self.event_retention * 1000),
+            rollup=False
+        )
+        self._expire_rollups(conn, now_ms - int(self.rollup_retention * 1000))
+
+        self.runs += 1
+        self.last_run_ms = round((time.perf_counter() - start) * 1000, 3)
+        if removed:
+            logger.info(f"Retention pass expired {removed} log rows in {self.last_run_ms}ms")
+        return removed
+
+    def _connection(self):
+        with self._lock:
+            if self._conn is None:
+                self._conn = self.connect(self.database)
+            return self._conn
+
+    def _expire(self, conn, condition, cutoff_ms, rollup):
+        """Archive, optionally roll up, and delete matching rows batch by batch."""
+        query = (
+            f"SELECT {', '.join(LOG_COLUMNS)} FROM logs "
+            f"WHERE {condition} ORDER BY ts, id LIMIT ?"
+        )
+        removed = 0
+        while not self._stop.is_set():
+            with self._lock:
+                rows = load_payloads(conn, [
+                    dict(zip(LOG_COLUMNS, row))
+                    for row in conn.execute(query, (cutoff_ms, self.batch_size)).fetchall()
+                ])
+                if not rows:
+                    break
+
+                # Archive first: a crash before the delete commits can at
+                # worst archive a row twice, never lose it
+                self._archive(rows)
+                with conn:
+                    if rollup:
+                        conn.executemany(UPSERT_ROLLUP_SQL, rollup_rows(rows))
+                    conn.executemany('DELETE FROM logs WHERE id = ?', [(row['id'],) for row in rows])
+                    prune_payloads(conn, [row['payload_id'] for row in rows])
+
+            removed += len(rows)
+            self.deleted += len(rows)
+            if rollup:
+                self.rolled_up += len(rows)
+            if len(rows) < self.batch_size:
+                break
+            time.sleep(self.batch_pause)
+        return removed
+
+    def _expire_rollups(self, conn, cutoff_ms):
+        while not self._stop.is_set():
+            with self._lock, conn:
+                cursor = conn.execute(
+                    'DELETE FROM device_update_rollups WHERE (device, minute) IN '
+                    '(SELECT device, minute FROM device_update_rollups WHERE minute < ? LIMIT ?)',
+                    (cutoff_ms, self.batch_size)
+                )
+            self.rollups_deleted += cursor.rowcount
+            if cursor.rowcount < self.batch_size:
+                break
+            time.sleep(self.batch_pause)
+
+    def _archive(self, rows):
+        """Append rows to one gzip NDJSON file per UTC day of their ts."""
+        if not self.archive_dir:
+            return
+        os.makedirs(self.archive_dir, exist_ok=True)
+
+        by_day = {}
+        for row in rows:
+            day = datetime.fromtimestamp((row['ts'] or 0) / 1000, timezone.utc).strftime('%Y-%m-%d')
+            # payload_id means nothing outside this database
+            archived = {key: value for key, value in row.items() if key != 'payload_id'}
+            by_day.setdefault(day, []).append(json.dumps(archived) + '\n')
+
+        for day, lines in by_day.items():
+            # Appending adds a gzip member; gzip.open reads all members back
+            path = os.path.join(self.archive_dir, f'logs-{day}.ndjson.gz')
+            with gzip.open(path, 'at', encoding='utf-8') as f:
+                f.writelines(lines)
+        self.archived += len(rows)
+
+    # ==================== CLEAR ====================
+
+    def clear_logs(self, include_rollups=True):
+        """
+        Remove every row from the logs table (and every stored payload) by
+        dropping and recreating it.
+        Unlike DELETE FROM logs this skips the per-row index updates and
+        search-index trigger work. The table's pages are still freed, so the
+        time still grows with the table, but several times more slowly.
+        Args:
+            include_rollups: Also empty device_update_rollups
+        """
+        conn = self._connection()
+        with self._lock:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                recreate_logs_table(conn)
+                if include_rollups:
+                    conn.execute('DELETE FROM device_update_rollups')
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+    # ==================== BACKGROUND THREAD ====================
+
+    def start(self, interval=60.0):
+        """
+        Run a retention pass every interval seconds on a background thread.
+        Args:
+            interval: Seconds between passes
+        """
+        if self._thread is not None:
+            return
+        self._stop.clear()
+
+        def run():
+            while not self._stop.wait(interval):
+                try:
+                    self.run_once()
+                except Exception as e:
+                    self.errors += 1
+                    logger.error(f"Error running log retention: {e}")
+
+        self._thread = threading.Thread(target=run, name='log-retention', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5.0):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join(timeout)
+            self._thread = None
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def stats(self):
+        return {
+            'running': self._thread is not None and self._thread.is_alive(),
+            'runs': self.runs,
+            'rolled_up': self.rolled_up,
+            'archived': self.archived,
+            'deleted': self.deleted,
+            'rollups_deleted': self.rollups_deleted,
+            'errors': self.errors,
+            'last_run_ms': self.last_run_ms
+        }
@@ -0,0 +1,381 @@
+"""
+Smart Home Cybersecurity Training Platform - Rule Engine
+Attack detection rules declared as data (field predicates, topic patterns,
+severity and reason) and compiled into a dispatch table indexed by payload
+key, so each message is only checked against rules that could match it.
+"""
+
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Built-in rules used when no rules file exists.
+# Later rules override earlier ones when several match the same message.
+DEFAULT_RULES = [
+    {
+        'name': 'attack_flag',
+        'when': {'attack': {'equals': True}},
+        'severity': 'CRITICAL',
+        'reason': 'Unauthorized attack flag detected in payload'
+    },
+    {
+        'name': 'bypass_auth',
+        'when': {'bypass_auth': {'equals': True}},
+        'severity': 'CRITICAL',
+        'reason': 'Attempted to bypass authentication'
+    },
+    {
+        'name': 'rapid_fire',
+        'when': {'rapid_fire': {'truthy': True}},
+        'severity': 'WARNING',
+        'reason': 'Rapid fire command detected (potential DoS attack)'
+    }
+]
+
+SEVERITIES = ('INFO', 'WARNING', 'CRITICAL')
+
+# ==================== PREDICATES ====================
+
+def _hashable(value):
+    return not isinstance(value, (dict, list))
+
+
+def _equals(expected):
+    # `is` for booleans/None so that 1 does not match True (matches the
+    # original `data['attack'] is True` checks)
+    if expected is True or expected is False or expected is None:
+        return lambda value: value is expected
+    return lambda value: value == expected
+
+
+def _not_equals(expected):
+    check = _equals(expected)
+    return lambda value: not check(value)
+
+
+def _in(options):
+    allowed = frozenset(options)
+    return lambda value: _hashable(value) and value in allowed
+
+
+def _not_in(options):
+    denied = frozenset(options)
+    return lambda value: not (_hashable(value) and value in denied)
+
+
+def _regex(pattern):
+    compiled = re.compile(pattern)
+    return lambda value: isinstance(value, str) and compiled.search(value) is not None
+
+
+def _number(compare):
+    def build(expected):
+        def check(value):
+            return isinstance(value, (int, float)) and not isinstance(value, bool) and compare(value, expected)
+        return check
+    return build
+
+
+PREDICATES = {
+    'equals': _equals,
+    'not_equals': _not_equals,
+    'in': _in,
+    'not_in': _not_in,
+    'truthy': lambda expected: (lambda value: bool(value) is bool(expected)),
+    'exists': lambda expected: (lambda value: True),
+    'contains': lambda needle: (lambda value: isinstance(value, (str, list)) and needle in value),
+    'regex': _regex,
+    'gt': _number(lambda a, b: a > b),
+    'gte': _number(lambda a, b: a >= b),
+    'lt': _number(lambda a, b: a < b),
+    'lte': _number(lambda a, b: a <= b),
+    'max_length': lambda limit: (lambda value: isinstance(value, (str, list)) and len(value) <= limit),
+    'min_length': lambda limit: (lambda value: isinstance(value, (str, list)) and len(value) >= limit)
+}
+
+
+def compile_topic_pattern(pattern):
+    """
+    Compile an MQTT-style topic filter (supports + and #) into a matcher.
+    Returns None for patterns that match every topic.
+    """
+    if pattern in (None, '#'):
+        return None
+
+    parts = []
+    for level in pattern.split('/'):
+        if level == '#':
+            parts.append('.*')
+            break
+        parts.append('[^/]*' if level == '+' else re.escape(level))
+    # '/devices/#' should also match '/devices' itself
+    regex = '/'.join(parts)
+    if regex.endswith('/.*'):
+        regex = regex[:-3] + '(/.*)?'
+    return re.compile(f'^{regex}$').match
+
+# ==================== COMPILED RULES ====================
+
+class Rule:
+    """A compiled detection rule with its own match counters."""
+
+    def __init__(self, index, spec):
+        self.index = index
+        self.name = spec.get('name') or f'rule_{index}'
+        self.severity = spec.get('severity', 'WARNING')
+        self.reason = spec.get('reason', self.name)
+        self.topic = spec.get('topic')
+        self.enabled = spec.get('enabled', True)
+
+        if self.severity not in SEVERITIES:
+            raise ValueError(f"Rule {self.name}: unknown severity {self.severity!r}")
+
+        self.topic_match = compile_topic_pattern(self.topic)
+
+        # List of (field, [checks]) - every field must be present and pass
+        self.fields = []
+        for field, ops in (spec.get('when') or {}).items():
+            if not isinstance(ops, dict):
+                ops = {'equals': ops}
+            checks = []
+            for op, arg in ops.items():
+                if op not in PREDICATES:
+                    raise ValueError(f"Rule {self.name}: unknown operator {op!r} on {field!r}")
+                checks.append(PREDICATES[op](arg))
+            self.fields.append((field, checks))
+
+        self._lock = threading.Lock()
+        self.evaluations = 0
+        self.matches = 0
+        self.eval_time = 0.0
+
+    def check(self, topic, data):
+        if self.topic_match is not None and self.topic_match(topic) is None:
+            return False
+        for field, checks in self.fields:
+            if field not in data:
+                return False
+            value = data[field]
+            for check in checks:
+                if not check(value):
+                    return False
+        return True
+
+    def record(self, elapsed, matched):
+        with self._lock:
+            self.evaluations += 1
+            self.eval_time += elapsed
+            if matched:
+                self.matches += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'name': self.name,
+                'severity': self.severity,
+                'topic': self.topic,
+                'fields': [field for field, _ in self.fields],
+                'evaluations': self.evaluations,
+                'matches': self.matches,
+                'avg_eval_us': round(self.eval_time / self.evaluations * 1e6, 3) if self.evaluations else 0.0
+            }
+
+
+class RuleSet:
+    """
+    Immutable compiled rule set.
+    Each rule is indexed under one of its required payload keys (the one
+    shared by the fewest rules); rules without field predicates are checked
+    for every message.
+    """
+
+    def __init__(self, specs):
+        self.rules = [Rule(i, spec) for i, spec in enumerate(specs)]
+        self.by_key = {}
+        self.unkeyed = []
+
+        key_counts = {}
+        for rule in self.rules:
+            for field, _ in rule.fields:
+                key_counts[field] = key_counts.get(field, 0) + 1
+
+        for rule in self.rules:
+            if not rule.enabled:
+                continue
+            if not rule.fields:
+                self.unkeyed.append(rule)
+                continue
+            anchor = min((field for field, _ in rule.fields), key=lambda f: key_counts[f])
+            self.by_key.setdefault(anchor, []).append(rule)
+
+        # Quoted key names looked for in raw payload bytes by may_match_raw
+        self.tokens = tuple(json.dumps(key, ensure_ascii=False).encode() for key in self.by_key)
+
+    def may_match_raw(self, raw):
+        """
+        Cheap pre-scan of a raw JSON object payload.
+        False means no rule can match, because none of the indexed keys
+        appears in the bytes. Payloads containing a backslash are always
+        treated as suspicious, since an escaped key name (e.g. \\u0061ttack)
+        would hide from the scan, and so are payloads that are not plain
+        UTF-8 (NUL bytes or invalid sequences, e.g. UTF-16), whose key names
+        would not match the UTF-8 tokens.
+        """
+        if self.unkeyed or b'\\' in raw or b'\x00' in raw:
+            return True
+        if not raw.isascii():
+            try:
+                raw.decode('utf-8')
+            except UnicodeDecodeError:
+                return True
+        for token in self.tokens:
+            if token in raw:
+                return True
+        return False
+
+    def candidates(self, data):
+        """Rules that could match a payload with these keys."""
+        by_key = self.by_key
+        found = list(self.unkeyed)
+        if len(data) <= len(by_key):
+            for key in data:
+                rules = by_key.get(key)
+                if rules:
+                    found.extend(rules)
+        else:
+            for key, rules in by_key.items():
+                if key in data:
+                    found.extend(rules)
+        return found
+
+# ==================== ENGINE ====================
+
+class RuleEngine:
+    """
+    Loads, compiles and evaluates detection rules.
+    The active RuleSet is swapped atomically on reload, so workers evaluating
+    messages never see a half-built rule set.
+    """
+
+    def __init__(self, rules_file=None, observer=None):
+        """
+        Args:
+            rules_file: Path to a JSON rules file; DEFAULT_RULES are used if
+                        it is None or does not exist
+            observer: Optional callable(rule_name, seconds) called after each
+                      rule evaluation (e.g. a metrics histogram)
+        """
+        self.rules_file = rules_file
+        self.observer = observer
+        self._mtime = None
+        self._ruleset = RuleSet(DEFAULT_RULES)
+        self._watcher = None
+        self._stop = threading.Event()
+        self.reloads = 0
+        self.last_error = None
+
+    def load(self):
+        """
+        (Re)load rules from rules_file.
+        On error the previous rule set stays active.
+        Returns:
+            True if a new rule set was installed
+        """
+        if not self.rules_file or not os.path.exists(self.rules_file):
+            return False
+
+        try:
+            mtime = os.path.getmtime(self.rules_file)
+            with open(self.rules_file) as f:
+                document = json.load(f)
+            specs = document['rules'] if isinstance(document, dict) else document
+            ruleset = RuleSet(specs)
+        except Exception as e:
+            self.last_error = str(e)
+            logger.error(f"Failed to load rules from {self.rules_file}: {e}")
+            return False
+
+        self._ruleset = ruleset
+        self._mtime = mtime
+        self.reloads += 1
+        self.last_error = None
+        logger.info(f"Loaded {len(ruleset.rules)} detection rules from {self.rules_file}")
+        return True
+
+    def reload_if_changed(self):
+        """Reload the rules file if its modification time changed."""
+        if not self.rules_file:
+            return False
+        try:
+            mtime = os.path.getmtime(self.rules_file)
+        except OSError:
+            return False
+        if mtime == self._mtime:
+            return False
+        return self.load()
+
+    def start_watcher(self, interval=2.0):
+        """Poll the rules file in a background thread and hot-reload on change."""
+        if self._watcher is not None:
+            return
+
+        def watch():
+            while not self._stop.wait(interval):
+                self.reload_if_changed()
+
+        self._watcher = threading.Thread(target=watch, name='rule-watcher', daemon=True)
+        self._watcher.start()
+
+    def stop_watcher(self):
+        self._stop.set()
+        self._watcher = None
+
+    def may_match(self, raw):
+        """
+        Pre-scan raw JSON object bytes against the current rule set.
+        Returns False only if evaluate() would certainly find no match.
+        """
+        return self._ruleset.may_match_raw(raw)
+
+    def evaluate(self, topic, data):
+        """
+        Check a parsed payload against the rules that could match it.
+        Args:
+            topic: MQTT topic of the message
+            data: Parsed payload dict
+        Returns:
+            Matching rules in declaration order
+        """
+        matches = []
+        perf_counter = time.perf_counter
+        observer = self.observer
+        for rule in self._ruleset.candidates(data):
+            start = perf_counter()
+            matched = rule.check(topic, data)
+            elapsed = perf_counter() - start
+            rule.record(elapsed, matched)
+            if observer is not None:
+                observer(rule.name, elapsed)
+            if matched:
+                matches.append(rule)
+
+        if len(matches) > 1:
+            matches.sort(key=lambda rule: rule.index)
+        return matches
+
+    def stats(self):
+        """Per-rule counters plus dispatch table shape."""
+        ruleset = self._ruleset
+        return {
+            'rules_file': self.rules_file,
+            'reloads': self.reloads,
+            'last_error': self.last_error,
+            'rule_count': len(ruleset.rules),
+            'indexed_keys': sorted(ruleset.by_key),
+            'rules': [rule.stats() for rule in ruleset.rules]
+        }
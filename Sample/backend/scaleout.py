@@ -0,0 +1,370 @@
+"""
+Smart Home Cybersecurity Training Platform - Multi-process Scale-out
+Runs detection in N worker processes that join one MQTT v5 shared
+subscription group ($share/<group>//devices/#), so the broker spreads
+device messages across them and detection uses more than one core.
+
+The supervisor (this process) serves the HTTP API and owns the state the
+API reads: device shadows, /api/stats counters and the alert hub. Workers
+parse, detect and write their own log rows, and forward shadow updates,
+stats records, alerts and anomaly telemetry to the supervisor in batches. Rate detection
+uses SharedRateDetector, so token buckets stay per device across workers
+even though the broker does not route a device to a fixed worker.
+
+Run with:
+    BACKEND_MODE=scaleout SCALEOUT_WORKERS=4 python app.py
+"""
+
+import atexit
+import logging
+import multiprocessing
+import queue
+import signal
+import sys
+import threading
+import time
+
+import paho.mqtt.client as mqtt
+
+logger = logging.getLogger(__name__)
+
+# Seconds between worker liveness checks, and restart backoff bounds
+MONITOR_INTERVAL = 1.0
+RESTART_BACKOFF = 1.0
+MAX_RESTART_BACKOFF = 30.0
+
+# Effects forwarded per batch, and max seconds an effect waits
+FORWARD_BATCH_SIZE = 256
+FORWARD_MAX_DELAY = 0.05
+FORWARD_QUEUE_SIZE = 1000      # Batches buffered before workers drop effects
+
+
+# ==================== WORKER SIDE ====================
+
+class EffectForwarder:
+    """
+    Buffers effects produced by detection in a worker and sends them to
+    the supervisor in batches, one queue put (and pickle) per batch.
+    """
+
+    def __init__(self, effects, batch_size=FORWARD_BATCH_SIZE, max_delay=FORWARD_MAX_DELAY):
+        self.effects = effects
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.dropped = 0
+
+    def send(self, kind, args):
+        with self._lock:
+            self._buffer.append((kind, args))
+            full = len(self._buffer) >= self.batch_size
+        if full:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            batch, self._buffer = self._buffer, []
+        if not batch:
+            return
+        try:
+            self.effects.put(batch, timeout=1.0)
+        except queue.Full:
+            self.dropped += len(batch)
+            logger.warning(f"Supervisor not keeping up; dropped {len(batch)} effects")
+
+    def start(self):
+        def run():
+            while not self._stop.wait(self.max_delay):
+                self.flush()
+            self.flush()
+
+        self._thread = threading.Thread(target=run, name='effect-forwarder', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5.0):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(timeout)
+        self._thread = None
+
+
+class ForwardedShadows:
+    """Stands in for app.device_shadows in a worker."""
+
+    def __init__(self, forwarder):
+        self.forwarder = forwarder
+
+    def update(self, name, now, data):
+        self.forwarder.send('shadow', (name, now, data))
+
+
+class ForwardedStats:
+    """Stands in for app.event_stats in a worker."""
+
+    def __init__(self, forwarder):
+        self.forwarder = forwarder
+
+    def record(self, log_type, device=None, severity=None, category=None, ts=None):
+        self.forwarder.send('stats', (log_type, device, severity, category, ts or time.time()))
+
+
+class ForwardedAlerts:
+    """Stands in for app.alert_hub in a worker."""
+
+    def __init__(self, forwarder):
+        self.forwarder = forwarder
+
+    def publish(self, event):
+        self.forwarder.send('alert', event)
+
+
+class ForwardedTelemetry:
+    """Stands in for app.anomaly_detector in a worker."""
+
+    def __init__(self, forwarder):
+        self.forwarder = forwarder
+
+    def record(self, device, ts, action=None):
+        self.forwarder.send('telemetry', (device, ts, action))
+
+
+def setup_worker(effects, device_rates, client_rates, command_secret):
+    """
+    Turn this process's app module into a detection worker: shadows, stats,
+    alerts and anomaly telemetry are forwarded to the supervisor (which
+    scores all devices together), rate state is shared, and commands are
+    verified with the supervisor's command signing secret.
+    Returns:
+        The started EffectForwarder
+    """
+    import app
+
+    forwarder = EffectForwarder(effects)
+    app.device_shadows = ForwardedShadows(forwarder)
+    app.event_stats = ForwardedStats(forwarder)
+    app.alert_hub = ForwardedAlerts(forwarder)
+    app.anomaly_detector = ForwardedTelemetry(forwarder)
+    app.device_rates = device_rates
+    app.client_rates = client_rates
+    app.command_signer = app.CommandSigner(command_secret)
+
+    # Each worker batches its own log rows; WAL lets the writers take turns
+    app.log_sink.start()
+    app.rule_engine.load()
+    app.rule_engine.start_watcher(app.RULES_RELOAD_INTERVAL)
+    app.authz.load()
+    app.authz.start_watcher(app.POLICY_RELOAD_INTERVAL)
+    # Key names of shared buckets are only known to the workers that saw
+    # them, so each worker ends the quiet bursts it took part in
+    if app.RATE_REAP_INTERVAL:
+        app.rate_reaper.start(app.RATE_REAP_INTERVAL)
+    forwarder.start()
+    app.ingest_pipeline.start()
+    return forwarder
+
+
+def run_worker(index, effects, device_rates, client_rates, command_secret):
+    """
+    Entry point of one detection worker process.
+    Args:
+        index: Worker number (used in the MQTT client id)
+        effects: Queue of effect batches read by the supervisor
+        device_rates: SharedRateDetector keyed by device
+        client_rates: SharedRateDetector keyed by publishing client
+        command_secret: Key the supervisor signs published commands with
+    """
+    import app
+
+    # terminate() sends SIGTERM; exit normally so queued rows are flushed
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    forwarder = setup_worker(effects, device_rates, client_rates, command_secret)
+    shared_topic = f'$share/{app.MQTT_SHARE_GROUP}//devices/#'
+
+    def on_connect(client, userdata, flags, rc, properties=None):
+        if rc == 0:
+            logger.info(f"Worker {index} connected; subscribing to {shared_topic}")
+            client.subscribe(shared_topic)
+        else:
+            logger.error(f"Worker {index} failed to connect to MQTT broker with code {rc}")
+
+    def on_disconnect(client, userdata, rc, properties=None):
+        if rc != 0:
+            logger.warning(f"Worker {index} disconnected with code {rc}")
+
+    client_id = f'flask_backend-{index}'
+    try:
+        client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION1, client_id=client_id, protocol=mqtt.MQTTv5)
+    except AttributeError:
+        # paho-mqtt 1.x
+        client = mqtt.Client(client_id=client_id, protocol=mqtt.MQTTv5)
+    client.on_connect = on_connect
+    client.on_disconnect = on_disconnect
+    client.on_message = app.on_message
+
+    try:
+        # Keep retrying (with paho's reconnect backoff) while the broker is down
+        client.connect_async(app.MQTT_BROKER, app.MQTT_PORT, keepalive=60)
+        client.loop_forever(retry_first_connection=True)
+    finally:
+        app.ingest_pipeline.stop()
+        app.rate_reaper.stop()
+        forwarder.stop()
+        app.log_sink.stop()
+
+
+# ==================== SUPERVISOR SIDE ====================
+
+class Supervisor:
+    """Starts the detection workers, restarts any that die, and applies their effects."""
+
+    def __init__(self, backend, workers):
+        """
+        Args:
+            backend: The app module (whose shadows, stats and hub are updated)
+            workers: Number of worker processes
+        """
+        self.backend = backend
+        self.num_workers = workers
+        # spawn: workers must not inherit the supervisor's threads or
+        # SQLite connections, which fork would copy in a broken state
+        self.context = multiprocessing.get_context('spawn')
+        self.effects = self.context.Queue(maxsize=FORWARD_QUEUE_SIZE)
+
+        self._processes = [None] * workers
+        self._backoff = [RESTART_BACKOFF] * workers
+        self._next_start = [0.0] * workers
+        self._stop = threading.Event()
+        self._threads = []
+
+        self.restarts = 0
+        self.applied = 0
+
+    def start(self):
+        for index in range(self.num_workers):
+            self._start_worker(index)
+        for target, name in ((self._monitor, 'worker-monitor'), (self._apply_effects, 'effect-applier')):
+            thread = threading.Thread(target=target, name=name, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout=5.0):
+        self._stop.set()
+        for process in self._processes:
+            if process is not None and process.is_alive():
+                process.terminate()
+        for process in self._processes:
+            if process is not None:
+                process.join(timeout)
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def _start_worker(self, index):
+        backend = self.backend
+        process = self.context.Process(
+            target=run_worker,
+            args=(index, self.effects, backend.device_rates, backend.client_rates,
+                  backend.command_signer.secret),
+            name=f'detection-worker-{index}',
+            daemon=True
+        )
+        process.start()
+        self._processes[index] = process
+        logger.info(f"Started detection worker {index} (pid {process.pid})")
+
+    def _monitor(self):
+        while not self._stop.wait(MONITOR_INTERVAL):
+            now = time.time()
+            for index, process in enumerate(self._processes):
+                if process.is_alive():
+                    self._backoff[index] = RESTART_BACKOFF
+                    continue
+                if now < self._next_start[index]:
+                    continue
+                logger.warning(f"Detection worker {index} exited with code {process.exitcode}; restarting")
+                self.restarts += 1
+                self._start_worker(index)
+                # Back off if it keeps dying right after start
+                self._next_start[index] = now + self._backoff[index]
+                self._backoff[index] = min(self._backoff[index] * 2, MAX_RESTART_BACKOFF)
+
+    def _apply_effects(self):
+        backend = self.backend
+        while not self._stop.is_set():
+            try:
+                batch = self.effects.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            for kind, args in batch:
+                try:
+                    if kind == 'shadow':
+                        backend.device_shadows.update(*args)
+                    elif kind == 'stats':
+                        log_type, device, severity, category, ts = args
+                        backend.event_stats.record(log_type, device, severity, category, ts=ts)
+                    elif kind == 'alert':
+                        backend.alert_hub.publish(args)
+                    elif kind == 'telemetry':
+                        backend.anomaly_detector.record(*args)
+                except Exception as e:
+                    logger.error(f"Error applying worker effect {kind}: {e}")
+            self.applied += len(batch)
+
+    def stats(self):
+        return {
+            'workers': self.num_workers,
+            'alive': sum(1 for p in self._processes if p is not None and p.is_alive()),
+            'pids': [p.pid if p is not None else None for p in self._processes],
+            'restarts': self.restarts,
+            'effects_applied': self.applied
+        }
+
+
+def main(workers=None, host='0.0.0.0', port=5000):
+    """Start the supervisor, its detection workers and the HTTP API."""
+    import app as backend
+    from rate_limiter import SharedRateDetector
+
+    if backend.MQTT_TRANSPORT == 'embedded':
+        # Workers are separate processes and cannot reach an in-process broker
+        raise SystemExit("BACKEND_MODE=scaleout needs a real broker; unset MQTT_TRANSPORT=embedded")
+    workers = workers or backend.SCALEOUT_WORKERS
+    context = multiprocessing.get_context('spawn')
+
+    # Replace the in-process detectors before workers are started, so
+    # /health in the supervisor reports the shared counters
+    backend.device_rates = SharedRateDetector(
+        'device',
+        rate=backend.DEVICE_RATE_LIMIT,
+        burst=backend.DEVICE_RATE_BURST,
+        quiet_period=backend.RATE_QUIET_PERIOD,
+        max_keys=backend.RATE_MAX_KEYS,
+        context=context
+    )
+    backend.client_rates = SharedRateDetector(
+        'client',
+        rate=backend.CLIENT_RATE_LIMIT,
+        burst=backend.CLIENT_RATE_BURST,
+        quiet_period=backend.RATE_QUIET_PERIOD,
+        max_keys=backend.RATE_MAX_KEYS,
+        context=context
+    )
+
+    backend.start_services()
+
+    supervisor = Supervisor(backend, workers)
+    backend.supervisor = supervisor
+    supervisor.start()
+    atexit.register(supervisor.stop)
+
+    # The supervisor's own client only publishes control commands; it does
+    # not subscribe, or it would process every message a second time
+    backend.connect_mqtt()
+
+    logger.info(f"Scale-out backend with {workers} detection workers on {host}:{port}")
+    # No reloader: it would start a second supervisor
+    backend.app.run(host=host, port=port, debug=False, threaded=True)
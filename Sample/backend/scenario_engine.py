@@ -0,0 +1,602 @@
+"""
+Smart Home Cybersecurity Training Platform - Scenario Replay Engine
+Loads attack scenarios (timed publishes mixing normal telemetry with the
+Attack page's unauthorized_control, bypass_auth, rapid_fire and malformed
+patterns) and replays them against the broker at 1x or compressed speed.
+Live /devices/# traffic can be recorded into the same format so a session
+can be re-run deterministically.
+
+Scenario files come in two forms:
+  - JSON with "steps", each expanding into one or more publishes, e.g.
+        {"name": "demo", "seed": 7, "steps": [
+            {"at": 0, "pattern": "normal", "devices": {"prefix": "sensor", "count": 100},
+             "rate": 50, "duration": 30},
+            {"at": 10, "pattern": "rapid_fire", "device": "light1", "count": 5, "interval": 0.1},
+            {"at": 12, "topic": "/devices/lock", "payload": {"action": "unlocked"}}
+        ]}
+  - NDJSON (.ndjson/.jsonl) with an optional header line and one publish
+    per line: {"t": 0.125, "topic": "/devices/light1", "payload": "..."}
+    Non-UTF-8 payloads are stored as "payload_b64". This is what record
+    writes and expand produces.
+
+Usage:
+    python scenario_engine.py replay scenarios/training_mix.json --speed 10
+    python scenario_engine.py replay scenarios/flood_100k.json --speed 0 --broker localhost:1883
+    python scenario_engine.py record session.ndjson --duration 120
+    python scenario_engine.py expand scenarios/training_mix.json training_mix.ndjson
+    python scenario_engine.py simulate scenarios/training_mix.json --speed 0
+
+simulate runs the backend in this process on the embedded broker (no
+Mosquitto, no network) and reports what detection made of the scenario.
+"""
+
+import argparse
+import base64
+import bisect
+import json
+import logging
+import os
+import random
+import socket
+import struct
+import threading
+import time
+
+import paho.mqtt.client as mqtt
+
+from embedded_broker import EmbeddedClient
+
+logger = logging.getLogger(__name__)
+
+# Traffic patterns, mirroring the payloads built in frontend/src/components/Attack.js
+PATTERNS = ('normal', 'unauthorized_control', 'bypass_auth', 'rapid_fire', 'malformed')
+
+# Replay scheduling
+BATCH_WINDOW = 0.001           # Events due within this many seconds go out together
+SPIN_THRESHOLD = 0.002         # Below this, wait by spinning instead of sleeping
+MAX_BATCH = 4096               # Events per publisher call
+
+SEND_BUFFER_SIZE = 4 * 1024 * 1024
+
+
+class Event:
+    """One timed publish in a scenario."""
+
+    __slots__ = ('t', 'topic', 'payload', 'qos')
+
+    def __init__(self, t, topic, payload, qos=0):
+        self.t = t
+        self.topic = topic
+        self.payload = payload
+        self.qos = qos
+
+    def to_json(self):
+        record = {'t': round(self.t, 6), 'topic': self.topic}
+        try:
+            record['payload'] = self.payload.decode()
+        except UnicodeDecodeError:
+            record['payload_b64'] = base64.b64encode(self.payload).decode()
+        if self.qos:
+            record['qos'] = self.qos
+        return json.dumps(record, separators=(',', ':'))
+
+    @classmethod
+    def from_json(cls, record):
+        if 'payload_b64' in record:
+            payload = base64.b64decode(record['payload_b64'])
+        else:
+            payload = _encode_payload(record.get('payload', ''))
+        return cls(float(record['t']), record['topic'], payload, int(record.get('qos', 0)))
+
+
+class Scenario:
+    """A named, time-ordered list of Events."""
+
+    def __init__(self, name, events, description=''):
+        self.name = name
+        self.description = description
+        # Stable sort: publishes at the same instant keep their file order
+        self.events = sorted(events, key=lambda event: event.t)
+        self.times = [event.t for event in self.events]
+
+    @property
+    def duration(self):
+        return self.times[-1] if self.times else 0.0
+
+    def save(self, path):
+        """Write the scenario as NDJSON (the recording format)."""
+        with open(path, 'w') as f:
+            f.write(json.dumps({'scenario': self.name, 'description': self.description,
+                                'events': len(self.events)}) + '\n')
+            for event in self.events:
+                f.write(event.to_json() + '\n')
+
+
+# ==================== LOADING ====================
+
+def _encode_payload(payload):
+    if isinstance(payload, bytes):
+        return payload
+    if isinstance(payload, str):
+        return payload.encode()
+    return json.dumps(payload, separators=(',', ':')).encode()
+
+
+def _devices(step):
+    if 'device' in step:
+        return [step['device']]
+    devices = step.get('devices', ['light1'])
+    if isinstance(devices, dict):
+        return [f"{devices.get('prefix', 'sensor')}{i}" for i in range(devices['count'])]
+    return list(devices)
+
+
+def pattern_payload(pattern, sequence, device, rng):
+    """
+    Payload for one message of a traffic pattern.
+    Attack payloads match the Attack page, minus its wall-clock timestamp
+    so that expanded scenarios are byte-for-byte reproducible.
+    """
+    if pattern == 'normal':
+        return {'action': rng.choice(('on', 'off')), 'client_id': device, 'sequence': sequence}
+    if pattern == 'unauthorized_control':
+        return {'action': 'unlocked' if 'lock' in device else 'on', 'attack': True,
+                'user': 'unauthorized_attacker', 'sequence': sequence}
+    if pattern == 'bypass_auth':
+        return {'action': 'on', 'bypass_auth': True, 'user': 'attacker', 'sequence': sequence}
+    if pattern == 'rapid_fire':
+        return {'action': 'on' if sequence % 2 == 0 else 'off', 'rapid_fire': True, 'sequence': sequence}
+    if pattern == 'malformed':
+        return '{invalid json content @#$%}'
+    raise ValueError(f"Unknown traffic pattern {pattern!r}; choose from {', '.join(PATTERNS)}")
+
+
+def expand_step(step, rng):
+    """
+    Expand one scenario step into Events.
+    A step publishes either a pattern or a literal topic/payload, once or
+    repeatedly ("count" + "interval", or "rate" + "duration"), cycling
+    through its devices.
+    """
+    at = float(step.get('at', 0.0))
+    qos = int(step.get('qos', 0))
+    if 'rate' in step:
+        interval = 1.0 / float(step['rate'])
+        count = int(float(step['rate']) * float(step.get('duration', 1.0)))
+    else:
+        interval = float(step.get('interval', 0.1 if step.get('pattern') == 'rapid_fire' else 0.0))
+        count = int(step.get('count', 5 if step.get('pattern') == 'rapid_fire' else 1))
+
+    if 'topic' in step:
+        payload = _encode_payload(step.get('payload', ''))
+        return [Event(at + i * interval, step['topic'], payload, qos) for i in range(count)]
+
+    pattern = step['pattern']
+    devices = _devices(step)
+    events = []
+    for i in range(count):
+        device = devices[i % len(devices)]
+        payload = _encode_payload(pattern_payload(pattern, i, device, rng))
+        events.append(Event(at + i * interval, f'/devices/{device}', payload, qos))
+    return events
+
+
+def load_scenario(path):
+    """
+    Load a JSON step scenario or an NDJSON recording.
+    Returns:
+        Scenario
+    Raises:
+        ValueError: If the file is not a valid scenario
+    """
+    if path.endswith(('.ndjson', '.jsonl')):
+        name, description, events = path, '', []
+        with open(path) as f:
+            for line_number, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                record = json.loads(line)
+                if 'scenario' in record:
+                    name = record['scenario']
+                    description = record.get('description', '')
+                    continue
+                try:
+                    events.append(Event.from_json(record))
+                except (KeyError, ValueError) as e:
+                    raise ValueError(f"{path}:{line_number}: invalid event ({e})")
+        return Scenario(name, events, description)
+
+    with open(path) as f:
+        document = json.load(f)
+    if 'steps' not in document:
+        raise ValueError(f"{path}: scenario has no steps")
+    rng = random.Random(document.get('seed', 0))
+    events = []
+    for step in document['steps']:
+        events.extend(expand_step(step, rng))
+    return Scenario(document.get('name', path), events, document.get('description', ''))
+
+
+# ==================== PUBLISHERS ====================
+
+def _remaining_length(length):
+    encoded = bytearray()
+    while True:
+        byte, length = length % 128, length // 128
+        encoded.append(byte | 0x80 if length else byte)
+        if not length:
+            return bytes(encoded)
+
+
+def encode_publish(topic, payload):
+    """MQTT 3.1.1 QoS 0 PUBLISH packet."""
+    topic_bytes = topic.encode()
+    body = struct.pack('!H', len(topic_bytes)) + topic_bytes + payload
+    return b'\x30' + _remaining_length(len(body)) + body
+
+
+class RawPublisher:
+    """
+    QoS 0 publisher writing pre-encoded PUBLISH packets straight to the
+    broker socket: each batch is one sendall of concatenated packets.
+    This is what lets one process sustain 100k+ msgs/sec; paho's
+    per-message publish() path tops out well below that.
+    """
+
+    def __init__(self, host, port, client_id='scenario_replayer'):
+        self.host = host
+        self.port = port
+        self.client_id = client_id
+        self.sock = None
+
+    def connect(self, timeout=5.0):
+        sock = socket.create_connection((self.host, self.port), timeout=timeout)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SEND_BUFFER_SIZE)
+        client_id = self.client_id.encode()
+        # Clean session, keepalive 0: no PINGREQs needed while replaying
+        variable = b'\x00\x04MQTT\x04\x02\x00\x00'
+        payload = struct.pack('!H', len(client_id)) + client_id
+        sock.sendall(b'\x10' + _remaining_length(len(variable) + len(payload)) + variable + payload)
+        connack = b''
+        while len(connack) < 4:
+            chunk = sock.recv(4 - len(connack))
+            if not chunk:
+                break
+            connack += chunk
+        if len(connack) < 4 or connack[0] != 0x20 or connack[3] != 0:
+            sock.close()
+            raise ConnectionError(f"Broker refused connection (CONNACK {connack.hex()})")
+        sock.settimeout(None)
+        self.sock = sock
+
+    def prepare(self, events):
+        return [encode_publish(event.topic, event.payload) for event in events]
+
+    def send(self, packets):
+        self.sock.sendall(b''.join(packets))
+
+    def close(self):
+        if self.sock is not None:
+            try:
+                self.sock.sendall(b'\xe0\x00')  # DISCONNECT
+            finally:
+                self.sock.close()
+                self.sock = None
+
+
+class PahoPublisher:
+    """Publisher using a paho client; honours each event's QoS."""
+
+    def __init__(self, host, port, client_id='scenario_replayer', max_inflight=1000):
+        try:
+            self.client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION1, client_id=client_id)
+        except AttributeError:
+            # paho-mqtt 1.x
+            self.client = mqtt.Client(client_id=client_id)
+        self.client.max_inflight_messages_set(max_inflight)
+        self.host = host
+        self.port = port
+        self._last = None
+
+    def connect(self):
+        self.client.connect(self.host, self.port, keepalive=60)
+        self.client.loop_start()
+
+    def prepare(self, events):
+        return events
+
+    def send(self, events):
+        publish = self.client.publish
+        for event in events:
+            self._last = publish(event.topic, event.payload, qos=event.qos)
+
+    def close(self, timeout=10.0):
+        if self._last is not None and self._last.rc == mqtt.MQTT_ERR_SUCCESS:
+            self._last.wait_for_publish(timeout)
+        self.client.loop_stop()
+        self.client.disconnect()
+
+
+class EmbeddedPublisher:
+    """Publisher for the in-process embedded broker."""
+
+    def __init__(self, client_id='scenario_replayer', broker=None):
+        self.client = EmbeddedClient(client_id, broker=broker)
+
+    def connect(self):
+        self.client.connect()
+
+    def prepare(self, events):
+        return events
+
+    def send(self, events):
+        publish = self.client.publish
+        for event in events:
+            publish(event.topic, event.payload, qos=event.qos)
+
+    def close(self):
+        self.client.disconnect()
+
+
+# ==================== REPLAY ====================
+
+class Replayer:
+    """
+    Replays a scenario on an absolute schedule: every event is due at
+    start + t / speed, so delays never accumulate. Everything due within
+    BATCH_WINDOW is handed to the publisher in one call. Waits longer
+    than SPIN_THRESHOLD sleep; shorter ones spin for precision.
+    """
+
+    def __init__(self, publisher, speed=1.0, batch_window=BATCH_WINDOW, max_batch=MAX_BATCH):
+        """
+        Args:
+            publisher: Object with prepare(events) and send(items)
+            speed: Time compression factor (10 = ten times faster);
+                   0 publishes everything as fast as possible
+            batch_window: Seconds of (scaled) schedule sent per batch
+            max_batch: Upper bound on events per send()
+        """
+        self.publisher = publisher
+        self.speed = speed
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self._stop = threading.Event()
+
+    def stop(self):
+        self._stop.set()
+
+    def run(self, scenario, loops=1):
+        """
+        Replay scenario loops times.
+        Returns:
+            {'messages', 'batches', 'elapsed', 'rate', 'max_lag_ms', 'mean_lag_ms'}
+        """
+        items = self.publisher.prepare(scenario.events)
+        times = scenario.times
+        total = len(items)
+        speed = self.speed
+        perf_counter = time.perf_counter
+
+        sent = batches = 0
+        lag_sum = max_lag = 0.0
+        start = perf_counter()
+        for loop in range(loops):
+            loop_start = perf_counter()
+            i = 0
+            while i < total and not self._stop.is_set():
+                now = perf_counter() - loop_start
+                if speed > 0:
+                    due = times[i] / speed
+                    if due > now:
+                        wait = due - now
+                        if wait > SPIN_THRESHOLD:
+                            time.sleep(wait - SPIN_THRESHOLD)
+                        continue
+                    end = bisect.bisect_right(times, (now + self.batch_window) * speed, i)
+                    lag = now - due
+                    lag_sum += lag
+                    max_lag = max(max_lag, lag)
+                else:
+                    end = total
+                end = min(end, i + self.max_batch)
+                self.publisher.send(items[i:end])
+                sent += end - i
+                batches += 1
+                i = end
+
+        elapsed = perf_counter() - start
+        return {
+            'messages': sent,
+            'batches': batches,
+            'elapsed': round(elapsed, 3),
+            'rate': round(sent / elapsed, 1) if elapsed > 0 else None,
+            'max_lag_ms': round(max_lag * 1000, 3),
+            'mean_lag_ms': round(lag_sum / batches * 1000, 3) if batches and speed > 0 else 0.0
+        }
+
+
+# ==================== RECORDING ====================
+
+class Recorder:
+    """
+    Records live traffic on a topic filter into NDJSON scenario format,
+    with times relative to the first recorded message.
+    """
+
+    def __init__(self, path, host, port, topic='/devices/#', client_id='scenario_recorder'):
+        self.path = path
+        self.host = host
+        self.port = port
+        self.topic = topic
+        self.count = 0
+        self._file = None
+        self._first = None
+        self._lock = threading.Lock()
+        try:
+            self.client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION1, client_id=client_id)
+        except AttributeError:
+            # paho-mqtt 1.x
+            self.client = mqtt.Client(client_id=client_id)
+        self.client.on_connect = self._on_connect
+        self.client.on_message = self._on_message
+
+    def _on_connect(self, client, userdata, flags, rc):
+        if rc == 0:
+            client.subscribe(self.topic)
+        else:
+            logger.error(f"Recorder failed to connect to MQTT broker with code {rc}")
+
+    def _on_message(self, client, userdata, msg):
+        now = time.perf_counter()
+        with self._lock:
+            if self._file is None:
+                return
+            if self._first is None:
+                self._first = now
+            event = Event(now - self._first, msg.topic, msg.payload, msg.qos)
+            self._file.write(event.to_json() + '\n')
+            self.count += 1
+
+    def record(self, duration=None, max_messages=None, name=None):
+        """
+        Record until duration seconds pass, max_messages are captured or
+        KeyboardInterrupt.
+        Returns:
+            Number of messages recorded
+        """
+        self._file = open(self.path, 'w')
+        self._file.write(json.dumps({'scenario': name or self.path,
+                                     'description': f'Recorded from {self.topic}'}) + '\n')
+        self.client.connect(self.host, self.port, keepalive=60)
+        self.client.loop_start()
+        deadline = time.monotonic() + duration if duration else None
+        try:
+            while deadline is None or time.monotonic() < deadline:
+                if max_messages and self.count >= max_messages:
+                    break
+                time.sleep(0.1)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.client.loop_stop()
+            self.client.disconnect()
+            with self._lock:
+                self._file.close()
+                self._file = None
+        return self.count
+
+
+# ==================== OFFLINE SIMULATION ====================
+
+def simulate(scenario, speed=0.0, workdir=None, settle=1.0):
+    """
+    Replay a scenario into an in-process backend on the embedded broker.
+    Args:
+        scenario: Scenario to replay
+        speed: Time compression (0 = as fast as possible)
+        workdir: Directory for the backend database (default: current)
+        settle: Seconds to wait for the last alerts after the queues drain
+    Returns:
+        {'replay', 'pipeline', 'stats'} where stats is the /api/stats
+        snapshot of the longest window
+    """
+    if workdir:
+        os.makedirs(workdir, exist_ok=True)
+        os.chdir(workdir)
+
+    import app as backend
+    backend.MQTT_TRANSPORT = 'embedded'
+    backend.start_services()
+    backend.connect_mqtt()
+
+    publisher = EmbeddedPublisher()
+    publisher.connect()
+    try:
+        replay = Replayer(publisher, speed=speed).run(scenario)
+    finally:
+        publisher.close()
+
+    while backend.ingest_pipeline.stats()['queue_depth'] > 0:
+        time.sleep(0.01)
+    time.sleep(settle)
+    backend.log_sink.flush()
+
+    pipeline = backend.ingest_pipeline.stats()
+    windows = backend.event_stats.snapshot()
+    return {
+        'replay': replay,
+        'pipeline': {key: pipeline[key] for key in ('received', 'dropped')},
+        'stats': windows[list(windows)[-1]]
+    }
+
+
+# ==================== MAIN ====================
+
+def _broker_address(text):
+    host, _, port = text.partition(':')
+    return host, int(port or 1883)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    replay = commands.add_parser('replay', help='Replay a scenario against the broker')
+    replay.add_argument('scenario')
+    replay.add_argument('--broker', default='localhost:1883', help='host:port')
+    replay.add_argument('--speed', type=float, default=1.0, help='Time compression (0 = as fast as possible)')
+    replay.add_argument('--loops', type=int, default=1)
+    replay.add_argument('--client', choices=('raw', 'paho'), default='raw',
+                        help='raw: batched QoS 0 socket writes; paho: per-message, honours QoS')
+
+    record = commands.add_parser('record', help='Record live traffic into a scenario file')
+    record.add_argument('output')
+    record.add_argument('--broker', default='localhost:1883', help='host:port')
+    record.add_argument('--topic', default='/devices/#')
+    record.add_argument('--duration', type=float, help='Seconds to record (default: until Ctrl-C)')
+    record.add_argument('--max-messages', type=int)
+
+    expand = commands.add_parser('expand', help='Expand a step scenario into NDJSON events')
+    expand.add_argument('scenario')
+    expand.add_argument('output')
+
+    simulate_parser = commands.add_parser('simulate', help='Replay into an in-process backend (no broker)')
+    simulate_parser.add_argument('scenario')
+    simulate_parser.add_argument('--speed', type=float, default=0.0, help='Time compression (0 = as fast as possible)')
+    simulate_parser.add_argument('--workdir', help='Directory for the backend database')
+
+    parser.add_argument('--log-level', default='INFO')
+    args = parser.parse_args()
+    logging.basicConfig(level=getattr(logging, args.log_level))
+
+    if args.command == 'replay':
+        scenario = load_scenario(args.scenario)
+        host, port = _broker_address(args.broker)
+        publisher = (RawPublisher if args.client == 'raw' else PahoPublisher)(host, port)
+        publisher.connect()
+        logger.info(f"Replaying {scenario.name}: {len(scenario.events)} messages over "
+                    f"{scenario.duration:.1f}s at {args.speed:g}x")
+        try:
+            stats = Replayer(publisher, speed=args.speed).run(scenario, loops=args.loops)
+        finally:
+            publisher.close()
+        print(json.dumps(stats, indent=2))
+    elif args.command == 'simulate':
+        scenario = load_scenario(os.path.abspath(args.scenario))
+        results = simulate(scenario, speed=args.speed, workdir=args.workdir)
+        print(json.dumps(results, indent=2))
+    elif args.command == 'record':
+        host, port = _broker_address(args.broker)
+        recorder = Recorder(args.output, host, port, topic=args.topic)
+        count = recorder.record(duration=args.duration, max_messages=args.max_messages)
+        logger.info(f"Recorded {count} messages to {args.output}")
+    else:
+        scenario = load_scenario(args.scenario)
+        scenario.save(args.output)
+        logger.info(f"Wrote {len(scenario.events)} events to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,266 @@
+"""
+Smart Home Cybersecurity Training Platform - Session Store
+Server-side Flask sessions kept in an in-memory LRU cache with TTL
+expiry, written through to an indexed SQLite sessions table so they
+survive restarts. The Quart backend uses the same store (see
+asgi_app.AsyncStoreSessionInterface). Replaces Flask-Session's filesystem backend, which read
+(and often rewrote) one small file per authenticated request.
+"""
+
+import json
+import logging
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+from flask.sessions import SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+
+logger = logging.getLogger(__name__)
+
+
+class SessionStore:
+    """
+    Session data by session id.
+    Lookups are served from the LRU cache when possible (O(1)); misses
+    fall back to a primary-key lookup on a pooled read connection, made
+    without holding the cache lock. Every save is written through, so the
+    cache never holds anything the table does not.
+    """
+
+    def __init__(self, db, ttl=86400.0, cache_size=10000, sweep_batch=500):
+        """
+        Args:
+            db: db.Database the sessions table is read and written through
+            ttl: Seconds a session lives after its last save
+            cache_size: Sessions kept in memory (least recently used evicted)
+            sweep_batch: Expired rows deleted per transaction when sweeping
+        """
+        self.db = db
+        self.ttl = ttl
+        self.cache_size = cache_size
+        self.sweep_batch = sweep_batch
+
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        # Bumped by every save and delete, so a miss can tell whether the
+        # row it read may have changed before it reached the cache
+        self._generation = 0
+        self._conn = None
+        self._stop = threading.Event()
+        self._sweeper = None
+
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.expired = 0
+
+    def _connection(self):
+        # One write connection shared by request threads, serialized by _lock
+        if self._conn is None:
+            self._conn = self.db.connect()
+        return self._conn
+
+    def get(self, sid, now=None):
+        """
+        Return the session data for sid, or None if unknown or expired.
+        Returns:
+            (data, expires) or None
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            entry = self._cache.get(sid)
+            if entry is not None:
+                if entry[1] > now:
+                    self._cache.move_to_end(sid)
+                    self.hits += 1
+                    return entry
+                del self._cache[sid]
+                return None
+            self.misses += 1
+            generation = self._generation
+
+        with self.db.read() as conn:
+            row = conn.execute(
+                'SELECT data, expires FROM sessions WHERE sid = ? AND expires > ?',
+                (sid, now)
+            ).fetchone()
+        if row is None:
+            return None
+        entry = (json.loads(row[0]), row[1])
+
+        with self._lock:
+            cached = self._cache.get(sid)
+            if cached is not None:
+                # Saved (or read by another miss) meanwhile
+                return cached
+            if self._generation == generation:
+                self._put(sid, entry)
+        return entry
+
+    def save(self, sid, data, now=None):
+        """
+        Store session data and push its expiry to now + ttl.
+        Returns:
+            The new expiry time (epoch seconds)
+        """
+        now = time.time() if now is None else now
+        expires = now + self.ttl
+        payload = json.dumps(data)
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                conn.execute(
+                    'INSERT OR REPLACE INTO sessions (sid, data, expires) VALUES (?, ?, ?)',
+                    (sid, payload, expires)
+                )
+            self._put(sid, (dict(data), expires))
+            self._generation += 1
+            self.writes += 1
+        return expires
+
+    def delete(self, sid):
+        with self._lock:
+            self._cache.pop(sid, None)
+            conn = self._connection()
+            with conn:
+                conn.execute('DELETE FROM sessions WHERE sid = ?', (sid,))
+            self._generation += 1
+
+    def sweep(self, now=None):
+        """
+        Delete expired sessions from the cache and the table.
+        Rows go in small batches so request threads are not held up.
+        Returns:
+            Number of rows deleted from the table
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            for sid in [sid for sid, entry in self._cache.items() if entry[1] <= now]:
+                del self._cache[sid]
+
+        deleted = 0
+        while not self._stop.is_set():
+            with self._lock:
+                conn = self._connection()
+                with conn:
+                    cursor = conn.execute(
+                        'DELETE FROM sessions WHERE sid IN '
+                        '(SELECT sid FROM sessions WHERE expires <= ? LIMIT ?)',
+                        (now, self.sweep_batch)
+                    )
+            deleted += cursor.rowcount
+            if cursor.rowcount < self.sweep_batch:
+                break
+        self.expired += deleted
+        return deleted
+
+    def _put(self, sid, entry):
+        self._cache[sid] = entry
+        self._cache.move_to_end(sid)
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    # ==================== BACKGROUND SWEEPS ====================
+
+    def start_sweeper(self, interval=300.0):
+        """Sweep expired sessions every interval seconds on a background thread."""
+        if self._sweeper is not None:
+            return
+        self._stop.clear()
+
+        def run():
+            while not self._stop.wait(interval):
+                try:
+                    deleted = self.sweep()
+                    if deleted:
+                        logger.info(f"Expired {deleted} sessions")
+                except Exception as e:
+                    logger.error(f"Error sweeping sessions: {e}")
+
+        self._sweeper = threading.Thread(target=run, name='session-sweeper', daemon=True)
+        self._sweeper.start()
+
+    def stop_sweeper(self, timeout=5.0):
+        if self._sweeper is None:
+            return
+        self._stop.set()
+        self._sweeper.join(timeout)
+        self._sweeper = None
+
+    def stats(self):
+        with self._lock:
+            return {
+                'cached': len(self._cache),
+                'cache_size': self.cache_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'writes': self.writes,
+                'expired': self.expired
+            }
+
+
+class StoreSession(CallbackDict, SessionMixin):
+    """Session dict that remembers its id and whether it was changed."""
+
+    def __init__(self, initial=None, sid=None, new=False, expires=0.0):
+        def on_update(session):
+            session.modified = True
+
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.expires = expires
+        self.modified = False
+
+
+class StoreSessionInterface(SessionInterface):
+    """
+    Flask session interface backed by a SessionStore.
+    The cookie carries only a random session id. Sessions are written when
+    they change, or when less than half their TTL remains, rather than on
+    every request.
+    """
+
+    def __init__(self, store):
+        self.store = store
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid:
+            entry = self.store.get(sid)
+            if entry is not None:
+                data, expires = entry
+                return StoreSession(data, sid=sid, expires=expires)
+        return StoreSession(sid=secrets.token_urlsafe(32), new=True)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if not session:
+            if not session.new and session.modified:
+                # Cleared (e.g. logout): forget it server-side too
+                self.store.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        now = time.time()
+        refresh = session.expires - now < self.store.ttl / 2
+        if session.modified or session.new or refresh:
+            session.expires = self.store.save(session.sid, dict(session), now)
+        elif not self.should_set_cookie(app, session):
+            return
+
+        response.set_cookie(
+            name,
+            session.sid,
+            expires=self.get_expiration_time(app, session),
+            httponly=self.get_cookie_httponly(app),
+            domain=domain,
+            path=path,
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app)
+        )
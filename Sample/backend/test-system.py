@@ -35,7 +35,6 @@ print(f"\n{BLUE}[TEST 2/8]{RESET} Checking Installed Packages...")
 PACKAGES = {
     'flask': 'Flask',
     'flask_cors': 'Flask-CORS',
-    'flask_session': 'Flask-Session',
     'paho': 'paho-mqtt',
     'dotenv': 'python-dotenv'
 }
@@ -157,7 +156,6 @@ try:
         'Flask': 'Flask' in requirements,
         'paho-mqtt': 'paho-mqtt' in requirements,
         'Flask-CORS': 'Flask-CORS' in requirements,
-        'Flask-Session': 'Flask-Session' in requirements,
         'python-dotenv': 'python-dotenv' in requirements
     }
     
@@ -0,0 +1,65 @@
+"""
+Shared pytest setup: tests import backend modules the way app.py does
+(from the backend directory). The app module keeps relative paths for
+its database and config files, so app-level tests run it once per
+session in a scratch directory holding copies of rules.json and
+policy.json.
+"""
+
+import os
+import shutil
+import sys
+import time
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+
+@pytest.fixture(scope='session')
+def backend(tmp_path_factory):
+    """The app module with a fresh database, rules, policy and a running log sink."""
+    workdir = tmp_path_factory.mktemp('backend')
+    for name in ('rules.json', 'policy.json'):
+        shutil.copy(os.path.join(BACKEND_DIR, name), workdir / name)
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    import app
+    app.init_db()
+    app.rule_engine.load()
+    app.authz.load()
+    app.log_sink.start()
+    yield app
+    app.log_sink.stop()
+    app.db.close()
+    os.chdir(cwd)
+
+
+@pytest.fixture
+def client(backend):
+    """Flask test client logged in as user1."""
+    client = backend.app.test_client()
+    response = client.post('/api/login', json={'username': 'user1', 'password': 'demo'})
+    assert response.status_code == 200
+    return client
+
+
+@pytest.fixture(scope='session')
+def mqtt_backend(backend):
+    """backend connected to the embedded MQTT broker, with detection workers running."""
+    backend.MQTT_TRANSPORT = 'embedded'
+    backend.ingest_pipeline.start()
+    backend.connect_mqtt()
+    yield backend
+    backend.mqtt_client.disconnect()
+    backend.ingest_pipeline.stop()
+
+
+def drain(backend, timeout=5.0):
+    """Wait until queued MQTT messages are processed and their log rows written."""
+    deadline = time.monotonic() + timeout
+    while backend.ingest_pipeline.stats()['queue_depth'] and time.monotonic() < deadline:
+        time.sleep(0.01)
+    time.sleep(0.05)
+    backend.log_sink.flush()
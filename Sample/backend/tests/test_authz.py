@@ -0,0 +1,40 @@
+"""Wildcard grants stay within one topic level."""
+
+import pytest
+
+from authz import Policy, valid_device_name
+
+SPEC = {
+    'groups': {'lights': ['light*'], 'sensors': ['sensor?', 'door[!0]']},
+    'users': {'user1': ['@lights', '@sensors', 'lock'], 'user2': ['light1']}
+}
+
+
+@pytest.fixture
+def policy():
+    return Policy(SPEC, known_devices=('light1', 'light2', 'lock'))
+
+
+@pytest.mark.parametrize('device', ['light+', 'light#', 'light1/x/lock', 'light1/#', 'sensor/', 'door/', ''])
+def test_wildcards_do_not_cross_levels(policy, device):
+    assert not policy.allowed('user1', device)
+    assert policy.users_for(device) == []
+
+
+@pytest.mark.parametrize('device', ['light7', 'light_kitchen', 'sensor3', 'door1'])
+def test_wildcards_match_within_a_level(policy, device):
+    assert policy.allowed('user1', device)
+    assert not policy.allowed('user2', device)
+
+
+def test_exact_grants(policy):
+    assert policy.allowed('user1', 'lock')
+    assert policy.allowed('user2', 'light1')
+    assert not policy.allowed('user2', 'light2')
+    assert not policy.allowed('user1', 'door0')
+
+
+def test_valid_device_name():
+    assert valid_device_name('light1')
+    for name in ('', 'a/b', 'light+', 'light#', None, 7):
+        assert not valid_device_name(name)
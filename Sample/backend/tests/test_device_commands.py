@@ -0,0 +1,128 @@
+"""Device control through /api/control-device(s) and device_commands."""
+
+import asyncio
+import json
+
+import paho.mqtt.client as mqtt
+
+from authz import Policy
+from conftest import drain
+from device_commands import (plan_commands, publish_planned, publish_planned_async, audit_events,
+                             CommandSigner, BACKEND_CLIENT_ID, PUBLISHED, FAILED)
+
+
+def count_logs(backend, where, params=()):
+    with backend.db.read() as conn:
+        return conn.execute(f'SELECT COUNT(*) FROM logs WHERE {where}', params).fetchone()[0]
+
+
+def test_bulk_control_is_not_a_client_flood(mqtt_backend, client):
+    backend = mqtt_backend
+    devices = [f'light{i}' for i in range(backend.CLIENT_RATE_BURST + 10)]
+    floods_before = count_logs(backend, "log_type = 'ATTACK' AND message LIKE '%Message flood from client%'")
+
+    response = client.post('/api/control-devices', json={
+        'commands': [{'device': device, 'action': 'on'} for device in devices]
+    })
+    assert response.status_code == 200
+    assert response.get_json()['summary'] == {'published': len(devices)}
+    drain(backend)
+
+    assert count_logs(backend, "log_type = 'ATTACK' AND message LIKE '%Message flood from client%'") == floods_before
+    # Every echoed command is logged, none throttled
+    echoed = count_logs(backend, "log_type = 'DEVICE_UPDATE' AND message LIKE 'Device update: light%'")
+    assert echoed >= len(devices)
+    assert 'smart_home_backend' not in str(backend.client_rates.stats()['active_bursts'])
+
+
+def test_spoofed_backend_client_id_is_rate_limited(backend):
+    now = 4000.0
+    claimed = {'action': 'on', 'client_id': BACKEND_CLIENT_ID}
+    forged = dict(claimed, command_id=f'{int(now * 1000)}.0123456789abcdef.{"0" * 32}')
+    for i in range(backend.CLIENT_RATE_BURST + 10):
+        payload = json.dumps(forged if i % 2 else claimed).encode()
+        backend.process_message(f'/devices/spoof{i}', payload, now + i * 0.001)
+
+    assert BACKEND_CLIENT_ID in backend.client_rates.stats()['active_bursts']
+    backend.rate_reaper.reap(now + backend.RATE_QUIET_PERIOD + 1)
+
+
+def test_command_ids_verify_once_and_expire():
+    signer = CommandSigner(ttl=30.0)
+    command = json.loads(signer.payload('unlock', 'user1', now=100.0))
+    assert not signer.verify(dict(command, user='user2'), 100.5)
+    assert not CommandSigner().verify(command, 100.5)
+    assert signer.verify(command, 100.5)
+    # A replayed echo is charged like any other message
+    assert not signer.verify(command, 100.6)
+
+    late = json.loads(signer.payload('unlock', 'user1', now=100.0))
+    assert not signer.verify(late, 130.0)
+
+
+def test_topic_characters_in_device_names_are_invalid(mqtt_backend, client):
+    backend = mqtt_backend
+    response = client.post('/api/control-devices', json={'commands': [
+        {'device': 'light+', 'action': 'on'},
+        {'device': 'light#', 'action': 'on'},
+        {'device': 'light1/x/lock', 'action': 'unlock'},
+        {'device': 'light3', 'action': 'on'}
+    ]})
+    assert response.status_code == 200
+    body = response.get_json()
+    assert [r['status'] for r in body['results']] == ['invalid', 'invalid', 'invalid', 'published']
+    drain(backend)
+    assert count_logs(backend, "message = 'Device control command sent: light3 -> on'") >= 1
+
+    for device in ('light+', 'light1/x/lock', ''):
+        response = client.post('/api/control-device', json={'device': device, 'action': 'on'})
+        assert response.status_code == 400
+
+
+class RefusingClient:
+    """paho-like client that rejects one topic the way paho rejects wildcards."""
+
+    class Info:
+        rc = mqtt.MQTT_ERR_SUCCESS
+
+        def wait_for_publish(self, timeout):
+            pass
+
+        def is_published(self):
+            return True
+
+    def __init__(self, refuse):
+        self.refuse = refuse
+        self.topics = []
+
+    def publish(self, topic, payload, qos=0, **kwargs):
+        if topic == self.refuse:
+            raise ValueError('Publish topic cannot contain wildcards.')
+        self.topics.append(topic)
+        return self.Info()
+
+
+def planned(devices):
+    return plan_commands([{'device': d, 'action': 'on'} for d in devices], 'user1', Policy(
+        {'users': {'user1': ['light*']}}), CommandSigner())
+
+
+def test_publish_failure_is_per_command():
+    results = planned(['light1', 'light2', 'light3'])
+    client = RefusingClient('/devices/light2')
+    publish_planned(client, results)
+    assert [r['status'] for r in results] == [PUBLISHED, FAILED, PUBLISHED]
+    assert client.topics == ['/devices/light1', '/devices/light3']
+    assert len(audit_events('user1', results)) == 3
+
+
+def test_publish_failure_is_per_command_async():
+    class AsyncRefusingClient(RefusingClient):
+        def publish(self, topic, payload, qos=0, **kwargs):
+            super().publish(topic, payload, qos)
+            return asyncio.sleep(0)
+
+    results = planned(['light1', 'light2', 'light3'])
+    asyncio.run(publish_planned_async(AsyncRefusingClient('/devices/light2'), results))
+    assert [r['status'] for r in results] == [PUBLISHED, FAILED, PUBLISHED]
+    assert len(audit_events('user1', results)) == 3
@@ -0,0 +1,34 @@
+"""Device shadows are bounded however many device names the broker sees."""
+
+import sqlite3
+
+from device_shadow import DeviceShadowStore
+
+
+def test_new_devices_beyond_the_cap_are_untracked():
+    store = DeviceShadowStore(max_devices=3)
+    store.seed('light1', 'light', 'off')
+    for i in range(10):
+        store.update(f'spoofed{i}', 1000.0 + i, {'action': 'on'})
+    store.update('light1', 1010.0, {'action': 'on'})
+
+    names = [device['name'] for device in store.list_devices(1010.0)]
+    assert names == ['light1', 'spoofed0', 'spoofed1']
+    assert store.get('light1', 1010.0)['state'] == 'on'
+    assert store.get('spoofed9', 1010.0) is None
+    stats = store.stats()
+    assert (stats['devices'], stats['untracked']) == (3, 8)
+
+
+def test_load_respects_the_cap():
+    conn = sqlite3.connect(':memory:')
+    conn.execute('CREATE TABLE device_shadows (name TEXT PRIMARY KEY, type TEXT, state TEXT, '
+                 'last_seen REAL, message_count INTEGER)')
+    source = DeviceShadowStore()
+    for i in range(5):
+        source.update(f'light{i}', 1000.0, {'action': 'on'})
+    source.save(conn)
+
+    store = DeviceShadowStore(max_devices=2)
+    assert store.load(conn) == 2
+    assert len(store.list_devices(1000.0)) == 2
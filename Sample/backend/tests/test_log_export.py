@@ -0,0 +1,54 @@
+"""Columnar export keeps memory flat however many distinct payloads there are."""
+
+import json
+import tracemalloc
+
+from log_export import LogExport, export_logs
+from log_sink import INSERT_LOG_SQL
+from migrations import connect, migrate
+from payload_store import StoredPayload, resolve_payload_ids
+
+
+def populate(database, rows):
+    migrate(database)
+    conn = connect(database)
+    batch = []
+    for i in range(rows):
+        raw = json.dumps({'action': 'on', 'nonce': i, 'pad': 'x' * 200}).encode()
+        batch.append(('', i, f'Device update: light{i % 5}', 'DEVICE_UPDATE', '/devices/light1',
+                      f'light{i % 5}', None, 'INFO', StoredPayload(raw)))
+    batch.append(('', rows, 'No payload', 'SYSTEM', None, None, None, None, None))
+    with conn:
+        conn.execute('BEGIN IMMEDIATE')
+        conn.executemany(INSERT_LOG_SQL, resolve_payload_ids(conn, batch))
+    conn.close()
+
+
+def peak_export(tmp_path, rows):
+    database = str(tmp_path / f'{rows}.db')
+    populate(database, rows)
+    tracemalloc.start()
+    export_logs(database, str(tmp_path / f'{rows}.logs'), chunk_size=500)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def test_payloads_are_a_string_column(tmp_path):
+    database = str(tmp_path / 'logs.db')
+    populate(database, 1200)
+    manifest = export_logs(database, str(tmp_path / 'out.logs'), chunk_size=500)
+    assert manifest['columns']['payload'] == {'type': 'string'}
+
+    logs = LogExport(str(tmp_path / 'out.logs'))
+    payloads = logs.strings('payload')
+    assert len(payloads) == 1201
+    assert json.loads(payloads[777])['nonce'] == 777
+    assert payloads[-1] == ''
+    assert logs.dictionary('device') == [f'light{i}' for i in range(5)]
+
+
+def test_memory_does_not_grow_with_distinct_payloads(tmp_path):
+    small = peak_export(tmp_path, 2000)
+    large = peak_export(tmp_path, 20000)
+    assert large < small * 1.5, (small, large)
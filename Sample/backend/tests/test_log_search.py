@@ -0,0 +1,37 @@
+"""Payload fields that left logs.message stay searchable through the payload filters."""
+
+import json
+
+from payload_store import StoredPayload
+
+
+def log_attack(backend, client_id):
+    raw = json.dumps({'action': 'unlock', 'bypass_auth': True, 'client_id': client_id}).encode()
+    backend.log_event(
+        message='ATTACK DETECTED: Authentication bypass attempt. Device: lock',
+        log_type='ATTACK',
+        source='/devices/lock',
+        device='lock',
+        severity='CRITICAL',
+        payload=StoredPayload.from_raw(raw)
+    )
+
+
+def payload_clients(rows):
+    return {json.loads(row['payload'])['client_id'] for row in rows}
+
+
+def test_client_id_filter_on_every_log_endpoint(backend, client):
+    log_attack(backend, 'intruder_7f3a')
+    log_attack(backend, 'lab_laptop')
+    backend.log_sink.flush()
+
+    search = client.get('/api/logs/search?q=bypass&client_id=intruder_7f3a').get_json()['results']
+    logs = client.get('/api/logs?client_id=intruder_7f3a').get_json()['logs']
+    attacks = client.get('/api/logs/attack?client_id=intruder_7f3a').get_json()['attacks']
+    for rows in (search, logs, attacks):
+        assert rows
+        assert payload_clients(rows) == {'intruder_7f3a'}
+
+    assert client.get('/api/logs/search?q=bypass&client_id=nobody').get_json()['results'] == []
+    assert client.get('/api/logs/attack?flag=unknown').status_code == 400
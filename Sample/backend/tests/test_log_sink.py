@@ -0,0 +1,36 @@
+"""A stalled log writer must not hang the callers that flush or stop it."""
+
+import sqlite3
+import threading
+import time
+
+from log_sink import LogSink
+
+ROW = ('', 0, 'Device update: light1', 'DEVICE_UPDATE', None, 'light1', None, 'INFO', None)
+
+
+def test_flush_and_stop_give_up_on_a_full_queue(tmp_path):
+    release = threading.Event()
+
+    def stalled_connect(database):
+        release.wait()
+        conn = sqlite3.connect(database)
+        conn.execute('CREATE TABLE logs (timestamp, ts, message, log_type, source, device, user, '
+                     'severity, payload_id)')
+        return conn
+
+    sink = LogSink(str(tmp_path / 'logs.db'), max_queue=1, connect=stalled_connect)
+    sink.start()
+    assert sink.submit(ROW)
+
+    started = time.monotonic()
+    assert not sink.flush(timeout=0.1)
+    sink.stop(timeout=0.1)
+    assert time.monotonic() - started < 1.0
+    assert sink.is_running()
+
+    # Once the writer catches up, stopping again writes the queued row
+    release.set()
+    sink.stop()
+    assert not sink.is_running()
+    assert sink.stats()['written'] == 1
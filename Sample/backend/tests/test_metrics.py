@@ -0,0 +1,39 @@
+"""Metric shards of finished threads are folded, not kept."""
+
+import threading
+
+from metrics import Registry
+
+
+def run_threads(count, target):
+    for _ in range(count):
+        thread = threading.Thread(target=target)
+        thread.start()
+        thread.join()
+
+
+def test_short_lived_threads_do_not_accumulate_shards():
+    registry = Registry()
+    requests = registry.counter('requests_total', 'Requests', ('endpoint',))
+    latency = registry.histogram('latency_seconds', 'Latency', buckets=(0.1, 1.0))
+
+    def handler():
+        requests.inc(('logs',))
+        latency.observe(0.5)
+
+    run_threads(500, handler)
+    assert len(requests._shards) <= 1 and len(latency._shards) <= 1
+    assert requests.collect() == {('logs',): 500}
+    counts, total, count = latency.collect()[()]
+    assert (counts, total, count) == ([0, 500, 0], 250.0, 500)
+
+    # Live shards are still summed with the retired ones
+    requests.inc(('logs',), 2)
+    assert requests.collect() == {('logs',): 502}
+    assert 'requests_total{endpoint="logs"} 502' in registry.render()
+
+
+def test_topic_label_is_bounded(backend):
+    assert backend.topic_label('/devices/light1') == '/devices/light1'
+    assert backend.topic_label('/devices/spoofed-12345') == 'other'
+    assert backend.topic_label('/devices/light1/x') == 'other'
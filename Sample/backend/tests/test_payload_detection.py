@@ -0,0 +1,53 @@
+"""Payload decoding and the detection pre-scan must agree on what a payload says."""
+
+import os
+import time
+
+import pytest
+
+from conftest import BACKEND_DIR
+from payload_codec import parse_payload
+from rule_engine import RuleEngine
+
+ATTACK = '{"attack": true}'
+
+
+@pytest.fixture
+def rule_engine():
+    engine = RuleEngine(os.path.join(BACKEND_DIR, 'rules.json'))
+    engine.load()
+    return engine
+
+
+@pytest.mark.parametrize('encoding', ['utf-16-le', 'utf-16-be', 'utf-16', 'utf-32-le', 'utf-32'])
+def test_non_utf8_json_is_rejected(encoding):
+    raw = ATTACK.encode(encoding)
+    if raw[:1] == b'{':
+        with pytest.raises(ValueError):
+            parse_payload(raw)
+
+
+@pytest.mark.parametrize('raw', [
+    ATTACK.encode('utf-16-le'),
+    ATTACK.encode('utf-32-le'),
+    b'{"value": "\xff\xfe"}',
+    b'{"value": 1}\x00',
+])
+def test_prescan_runs_full_evaluation_for_non_utf8(rule_engine, raw):
+    assert rule_engine.may_match(raw)
+
+
+def test_prescan_skips_plain_utf8_without_rule_keys(rule_engine):
+    assert not rule_engine.may_match(b'{"action": "on"}')
+    assert not rule_engine.may_match('{"action": "café"}'.encode())
+    assert rule_engine.may_match(ATTACK.encode())
+
+
+def test_utf16_attack_is_not_logged_as_device_update(backend):
+    with backend.db.read() as conn:
+        before = conn.execute("SELECT COUNT(*) FROM logs WHERE log_type = 'DEVICE_UPDATE'").fetchone()[0]
+    backend.process_message('/devices/light1', ATTACK.encode('utf-16-le'), time.time())
+    backend.log_sink.flush()
+    with backend.db.read() as conn:
+        after = conn.execute("SELECT COUNT(*) FROM logs WHERE log_type = 'DEVICE_UPDATE'").fetchone()[0]
+    assert after == before
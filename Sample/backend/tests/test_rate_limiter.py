@@ -0,0 +1,115 @@
+"""Bursts end even when the flood stops outright."""
+
+import pytest
+
+from conftest import drain
+from rate_limiter import RateDetector, RateReaper, SharedRateDetector
+
+
+def flood(detector, key, now, count=50):
+    for i in range(count):
+        detector.hit(key, now + i * 0.001)
+
+
+@pytest.mark.parametrize('detector_class', [RateDetector, SharedRateDetector])
+def test_reaper_ends_quiet_bursts(detector_class):
+    detector = detector_class('device', rate=1.0, burst=5, quiet_period=5.0)
+    events = []
+    reaper = RateReaper(lambda: (detector,), on_event=lambda d, e: events.append((d, e)))
+    flood(detector, 'light1', 1000.0)
+
+    assert reaper.reap(1003.0) == 0
+    assert reaper.reap(1010.0) == 1
+    (owner, event), = events
+    assert owner is detector
+    assert (event.kind, event.key, event.count) == ('end', 'light1', 45)
+    assert reaper.reap(1020.0) == 0
+
+
+def test_app_reaper_logs_the_end_of_a_burst(backend):
+    before = backend.rate_reaper.stats()['events']
+    now = 2000.0
+    flood(backend.device_rates, 'reaper-light', now, count=backend.DEVICE_RATE_BURST + 5)
+    backend.rate_reaper.reap(now + backend.RATE_QUIET_PERIOD + 1)
+    drain(backend)
+
+    assert backend.rate_reaper.stats()['events'] == before + 1
+    with backend.db.read() as conn:
+        row = conn.execute(
+            "SELECT message FROM logs WHERE log_type = 'DEFENSE' AND device = 'reaper-light'"
+        ).fetchone()
+    assert row is not None and 'ended: 5 messages over the limit' in row[0]
+
+
+def test_rule_matches_in_a_flood_are_folded_into_the_burst(backend):
+    device = 'flood-light'
+    count = 500
+
+    def rows(where):
+        with backend.db.read() as conn:
+            return conn.execute(f"SELECT COUNT(*) FROM logs WHERE device = ? AND {where}", (device,)).fetchone()[0]
+
+    alerts = backend.alert_hub.stats()['published']
+    now = 3000.0
+    for i in range(count):
+        payload = b'{"action": "on", "rapid_fire": true, "user": "flooder"}'
+        backend.process_message(f'/devices/{device}', payload, now + i * 0.001)
+    backend.rate_reaper.reap(now + backend.RATE_QUIET_PERIOD + 1)
+    drain(backend)
+
+    # Messages up to the burst size are logged one by one; the rest only
+    # in the start and end rows of the burst
+    burst = backend.DEVICE_RATE_BURST
+    assert rows("log_type = 'ATTACK'") == burst + 1
+    # Plus the burst summary
+    assert rows("log_type = 'DEFENSE'") == burst + 2
+    # One flood alert for the device and one for the publishing client
+    assert backend.alert_hub.stats()['published'] - alerts == burst + 2
+    with backend.db.read() as conn:
+        summary = conn.execute(
+            "SELECT message FROM logs WHERE device = ? AND message LIKE 'DoS burst%'", (device,)
+        ).fetchone()[0]
+    assert f'matched rules: rapid_fire x{count - burst}' in summary
+
+
+def test_shared_matches_from_a_process_that_did_not_end_the_burst():
+    detector = SharedRateDetector('device', rate=1.0, burst=1, quiet_period=5.0)
+    other = SharedRateDetector.__new__(SharedRateDetector)
+    other.__setstate__(detector.__getstate__())  # a second worker's view
+
+    detector.hit('light1', 1000.0)
+    detector.hit('light1', 1000.1, 'bypass_auth')
+    other.hit('light1', 1000.2, 'bypass_auth')
+    other.hit('light1', 1000.3, 'attack_flag')
+
+    (end,) = detector.reap(1010.0)
+    assert (end.kind, end.count, dict(end.reasons)) == ('end', 3, {'bypass_auth': 1})
+    (matches,) = other.reap(1010.0)
+    assert (matches.kind, dict(matches.reasons)) == ('matches', {'bypass_auth': 1, 'attack_flag': 1})
+
+
+def ends_by_key(events):
+    return {event.key: event.count for event in events if event.kind == 'end'}
+
+
+def test_shared_slot_reuse_keeps_open_bursts():
+    detector = SharedRateDetector('device', rate=1.0, burst=2, quiet_period=5.0, max_keys=8, idle_ttl=10.0)
+    assert detector.blocks == 1
+    flood(detector, 'flooder', 0.0, count=5)
+    for i in range(detector.BLOCK_SLOTS - 1):
+        detector.hit(f'quiet{i}', 1.0)
+
+    # flooder is the least recently seen key, but its burst is still open
+    events = detector.hit('newcomer', 100.0)[1]
+    assert ends_by_key(events) == {'flooder': 3}
+
+
+def test_shared_slot_reuse_reports_the_burst_it_ends():
+    detector = SharedRateDetector('device', rate=1.0, burst=2, quiet_period=5.0, max_keys=8, idle_ttl=10.0)
+    keys = [f'flooder{i}' for i in range(detector.BLOCK_SLOTS)]
+    for key in keys:
+        flood(detector, key, 0.0, count=5)
+
+    # Every slot is bursting: the reused one reports its burst first
+    events = detector.hit('newcomer', 100.0)[1]
+    assert ends_by_key(events) == {key: 3 for key in keys}
@@ -0,0 +1,88 @@
+"""Sessions are read and written through the shared db.Database."""
+
+import asyncio
+from contextlib import contextmanager
+
+from session_store import SessionStore
+
+
+class RacingDatabase:
+    """db.Database stand-in that runs a callback as each read finishes."""
+
+    def __init__(self, db, after_read):
+        self.db = db
+        self.after_read = after_read
+
+    def connect(self):
+        return self.db.connect()
+
+    @contextmanager
+    def read(self):
+        with self.db.read() as conn:
+            yield conn
+        self.after_read()
+
+
+def test_cache_misses_use_the_read_pool(backend, client):
+    store = backend.session_store
+    assert store.db is backend.db
+    assert client.get('/api/session').get_json()['user'] == 'user1'
+
+    store._cache.clear()
+    borrowed = backend.db.stats()['borrowed']
+    misses = store.stats()['misses']
+    assert client.get('/api/session').get_json()['user'] == 'user1'
+    assert store.stats()['misses'] == misses + 1
+    assert backend.db.stats()['borrowed'] > borrowed
+
+
+def test_expired_sessions_are_swept(backend):
+    store = backend.session_store
+    store.save('stale-session', {'user': 'user2'}, now=1000.0)
+    assert store.get('stale-session', now=1001.0) is not None
+    assert store.sweep(now=1000.0 + store.ttl) >= 1
+    assert store.get('stale-session', now=1001.0) is None
+
+
+def test_cache_miss_reads_outside_the_lock(backend):
+    def delete_during_miss():
+        # Would deadlock (or fail here) if the miss still held the lock
+        assert store._lock.acquire(blocking=False)
+        store._lock.release()
+        store.delete('raced-session')
+
+    store = SessionStore(RacingDatabase(backend.db, delete_during_miss))
+    store.save('raced-session', {'user': 'user1'})
+    store._cache.clear()
+
+    # The row read before the delete is returned, but not cached over it
+    assert store.get('raced-session')[0] == {'user': 'user1'}
+    assert 'raced-session' not in store._cache
+    assert store.get('raced-session') is None
+    store._conn.close()
+
+
+def test_asgi_sessions_live_in_the_shared_store(backend):
+    from asgi_app import asgi
+
+    async def login():
+        client = asgi.test_client()
+        response = await client.post('/api/login', json={'username': 'user2', 'password': 'demo'})
+        assert response.status_code == 200
+        sid = response.headers['Set-Cookie'].split(';')[0].split('=', 1)[1]
+        assert (await client.get('/api/session')).status_code == 200
+        return client, sid
+
+    async def logout(client):
+        assert (await client.post('/api/logout')).status_code == 200
+
+    asgi_client, sid = asyncio.run(login())
+    assert backend.session_store.get(sid)[0]['user'] == 'user2'
+
+    # The cookie carries only the id, and the Flask app resolves it too
+    flask_client = backend.app.test_client()
+    flask_client.set_cookie(backend.app.config['SESSION_COOKIE_NAME'], sid)
+    assert flask_client.get('/api/session').get_json()['user'] == 'user2'
+
+    asyncio.run(logout(asgi_client))
+    assert backend.session_store.get(sid) is None
@@ -16,9 +16,9 @@ print()
 REQUIRED_PACKAGES = {
     'flask': ('Flask', '3.0.0'),
     'flask_cors': ('Flask-CORS', '4.0.0'),
-    'flask_session': ('Flask-Session', '0.5.0'),
     'paho': ('paho-mqtt', '2.1.0'),
     'dotenv': ('python-dotenv', '1.0.0'),
+    'numpy': ('numpy', '2.2.6'),
 }
 
 # Test results
@@ -53,7 +53,7 @@ try:
     
     # Filter for relevant packages
     for line in result.stdout.split('\n'):
-        if any(pkg in line.lower() for pkg in ['flask', 'paho', 'dotenv', 'werkzeug', 'click']):
+        if any(pkg in line.lower() for pkg in ['flask', 'paho', 'dotenv', 'werkzeug', 'click', 'numpy']):
             print(line)
 except Exception as e:
     print(f"Error running pip list: {e}")
@@ -10,23 +10,54 @@ function Dashboard({ user }) {
   const [recentAlerts, setRecentAlerts] = useState([]);
   const [mqttConnected, setMqttConnected] = useState(false);
   const [client, setClient] = useState(null);
+  const [stats, setStats] = useState(null);
 
   // Initialize MQTT connection and load data on component mount
   useEffect(() => {
     connectToMQTT();
     loadRecentAlerts();
+    loadStats();
 
-    // Refresh alerts every 5 seconds
-    const alertInterval = setInterval(loadRecentAlerts, 5000);
+    // Receive new alerts as they happen instead of polling
+    const alertStream = subscribeToAlerts();
 
     return () => {
-      clearInterval(alertInterval);
+      alertStream.close();
       if (client) {
         client.end();
       }
     };
   }, []);
 
+  /**
+   * Subscribe to pushed alerts via Server-Sent Events
+   * The browser reconnects on its own and resumes from the last alert id
+   */
+  const subscribeToAlerts = () => {
+    const alertStream = new EventSource('http://localhost:5000/api/alerts/stream', {
+      withCredentials: true
+    });
+
+    alertStream.addEventListener('alert', (event) => {
+      try {
+        const alert = JSON.parse(event.data);
+        setRecentAlerts(prevAlerts => [
+          { ...alert, id: `alert-${alert.id}` },
+          ...prevAlerts
+        ].slice(0, 10));
+        loadStats();
+      } catch (e) {
+        console.log('Could not parse alert event:', event.data);
+      }
+    });
+
+    alertStream.onerror = () => {
+      console.log('Alert stream disconnected, reconnecting...');
+    };
+
+    return alertStream;
+  };
+
   /**
    * Connect to MQTT broker via WebSocket
    */
@@ -115,6 +146,24 @@ function Dashboard({ user }) {
     }
   };
 
+  /**
+   * Load attack counts from the in-memory stats endpoint
+   */
+  const loadStats = async () => {
+    try {
+      const response = await fetch('http://localhost:5000/api/stats', {
+        credentials: 'include'
+      });
+
+      if (response.ok) {
+        const data = await response.json();
+        setStats(data.windows);
+      }
+    } catch (error) {
+      console.error('Failed to load stats:', error);
+    }
+  };
+
   /**
    * Format timestamp for display
    */
@@ -140,6 +189,12 @@ function Dashboard({ user }) {
           <p><strong>User:</strong> {user}</p>
           <p><strong>MQTT Broker:</strong> ws://localhost:9001</p>
           <p><strong>Connected Devices:</strong> {devices.length}</p>
+          {stats && (
+            <p>
+              <strong>Attacks:</strong> {stats['1m'].attacks.total} last minute,{' '}
+              {stats['1h'].attacks.total} last hour, {stats['24h'].attacks.total} last 24h
+            </p>
+          )}
         </div>
       </div>
 
@@ -10,16 +10,19 @@ function Defense({ onAlert }) {
   const [allLogs, setAllLogs] = useState([]);
   const [filterType, setFilterType] = useState('all');
   const [loading, setLoading] = useState(false);
+  const [stats, setStats] = useState(null);
 
   // Load logs on component mount and refresh periodically
   useEffect(() => {
     loadLogs();
     loadAttacks();
+    loadStats();
 
     // Auto-refresh every 3 seconds
     const interval = setInterval(() => {
       loadLogs();
       loadAttacks();
+      loadStats();
     }, 3000);
 
     return () => clearInterval(interval);
@@ -64,6 +67,24 @@ function Defense({ onAlert }) {
     }
   };
 
+  /**
+   * Load aggregate counts (last 1m/1h/24h) from the in-memory stats endpoint
+   */
+  const loadStats = async () => {
+    try {
+      const response = await fetch('http://localhost:5000/api/stats?top=3', {
+        credentials: 'include'
+      });
+
+      if (response.ok) {
+        const data = await response.json();
+        setStats(data.windows);
+      }
+    } catch (error) {
+      console.error('Failed to load stats:', error);
+    }
+  };
+
   /**
    * Clear all logs
    */
@@ -82,6 +103,7 @@ function Defense({ onAlert }) {
         setLogs([]);
         setAttacks([]);
         setAllLogs([]);
+        loadStats();
         onAlert('Logs cleared successfully', 'success');
       }
     } catch (error) {
@@ -130,6 +152,7 @@ function Defense({ onAlert }) {
             onClick={() => {
               loadLogs();
               loadAttacks();
+              loadStats();
             }}
             disabled={loading}
             style={{ fontSize: '0.85rem', padding: '0.5rem 1rem' }}
@@ -142,17 +165,27 @@ function Defense({ onAlert }) {
             {/* Total Attacks */}
             <div style={{ padding: '1rem', backgroundColor: '#f8d7da', borderRadius: '4px', textAlign: 'center' }}>
               <div style={{ fontSize: '1.8rem', fontWeight: 'bold', color: '#721c24' }}>
-                {attacks.length}
+                {stats ? stats['24h'].attacks.total : attacks.length}
               </div>
-              <div style={{ color: '#721c24', fontWeight: '500' }}>Attacks Detected</div>
+              <div style={{ color: '#721c24', fontWeight: '500' }}>Attacks Detected (24h)</div>
+              {stats && stats['24h'].top_devices.length > 0 && (
+                <small style={{ color: '#721c24' }}>
+                  Top: {stats['24h'].top_devices.map(d => `${d.device} (${d.attacks})`).join(', ')}
+                </small>
+              )}
             </div>
 
             {/* Total Events */}
             <div style={{ padding: '1rem', backgroundColor: '#d1ecf1', borderRadius: '4px', textAlign: 'center' }}>
               <div style={{ fontSize: '1.8rem', fontWeight: 'bold', color: '#0c5460' }}>
-                {allLogs.length}
+                {stats ? stats['24h'].events : allLogs.length}
               </div>
-              <div style={{ color: '#0c5460', fontWeight: '500' }}>Total Events</div>
+              <div style={{ color: '#0c5460', fontWeight: '500' }}>Total Events (24h)</div>
+              {stats && (
+                <small style={{ color: '#0c5460' }}>
+                  {stats['1m'].events} in the last minute
+                </small>
+              )}
             </div>
 
             {/* System Status */}
@@ -308,6 +341,11 @@ function Defense({ onAlert }) {
                       </td>
                       <td style={{ fontSize: '0.9rem' }}>
                         {log.message}
+                        {log.payload && (
+                          <div style={{ fontFamily: 'monospace', fontSize: '0.8rem', color: '#555', wordBreak: 'break-all' }}>
+                            {log.payload}
+                          </div>
+                        )}
                       </td>
                     </tr>
                   ))}